@@ -302,8 +302,21 @@ def evaluate_network(_, config, **kwargs):
     is_flag=True,
     help="Saves as a .csv file. Default is False.",
 )
+@click.option(
+    "--motion_threshold",
+    "motion_threshold",
+    default=None,
+    type=float,
+    help="Skip the inference of frames in which nothing moves. Default is None.",
+)
+@click.option(
+    "--server",
+    "server",
+    default=None,
+    help="Socket path of a running model server (see 'serve') to send the job to.",
+)
 @click.pass_context
-def analyze_videos(_, *args, **kwargs):
+def analyze_videos(_, config, videos, server, **kwargs):
 
     """Makes prediction.\n
         CONFIG: Full path of the "config.yaml" file in the train directory of a project.\n
@@ -315,9 +328,15 @@ def analyze_videos(_, *args, **kwargs):
     python3 dlc.py analyze_videos /home/project/reaching/config.yaml /home/project/reaching/newVideo/1.avi
 
     """
+    if server is not None:
+        from deeplabcut.pose_estimation_tensorflow.server import ModelClient
+
+        ModelClient(server).analyze_videos(config, list(videos), **kwargs)
+        return
+
     from deeplabcut.pose_estimation_tensorflow import predict_videos
 
-    predict_videos.analyze_videos(*args, **kwargs)
+    predict_videos.analyze_videos(config, videos, **kwargs)
 
     # for video in videos:
     #     predict.predict_video(config, video,**kwargs)
@@ -649,3 +668,30 @@ def export_model(_, *args, **kwargs):
 
 
 ###########################################################################################################################
+
+
+@main.command(context_settings=CONTEXT_SETTINGS)
+@click.argument("address")
+@click.option(
+    "-c",
+    "--capacity",
+    "capacity",
+    default=2,
+    type=int,
+    help="Maximum number of networks kept loaded. Default is 2.",
+)
+@click.pass_context
+def serve(_, address, capacity):
+    """Starts a model server keeping networks loaded across analysis jobs.\n
+        ADDRESS: Path of the Unix socket to listen on.\n
+
+    Example\n
+    ----------
+
+    python3 dlc.py serve /tmp/dlc.sock\n
+    python3 dlc.py analyze_videos /home/project/reaching/config.yaml /home/project/reaching/newVideo/1.avi --server /tmp/dlc.sock
+
+    """
+    from deeplabcut.pose_estimation_tensorflow.server import ModelServer
+
+    ModelServer(address, capacity=capacity).serve_forever()
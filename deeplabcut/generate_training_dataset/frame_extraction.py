@@ -61,6 +61,155 @@ def select_cropping_area(config, videos=None):
     return cfg
 
 
+def _extract_frames_from_video(
+    video,
+    output_path,
+    coords,
+    numframes2pick,
+    start,
+    stop,
+    algo="kmeans",
+    cluster_step=1,
+    cluster_resizewidth=30,
+    cluster_color=False,
+    opencv=True,
+):
+    """
+    Select frames from a single video and save them as PNG images.
+
+    Helper function for ``extract_frames``; it is defined at the module level so that
+    it can be dispatched to worker processes.
+
+    Returns
+    -------
+    is_valid : list of bool or None
+        Whether each selected frame could be read; empty if the video could not be
+        opened, and None if frame selection failed.
+    """
+    import numpy as np
+    from multiprocessing.pool import ThreadPool
+    from skimage import io
+    from skimage.util import img_as_ubyte
+    from deeplabcut.utils import frameselectiontools
+
+    crop = coords is not None
+    if opencv:
+        from deeplabcut.utils.auxfun_videos import VideoReader
+
+        cap = VideoReader(video)
+        nframes = len(cap)
+    else:
+        from moviepy.editor import VideoFileClip
+
+        # Moviepy:
+        clip = VideoFileClip(video)
+        fps = clip.fps
+        nframes = int(np.ceil(clip.duration * 1.0 / fps))
+    if not nframes:
+        print("Video could not be opened. Skipping...")
+        return []
+
+    indexlength = int(np.ceil(np.log10(nframes)))
+
+    if crop and not opencv:
+        clip = clip.crop(
+            y1=int(coords[2]), y2=int(coords[3]), x1=int(coords[0]), x2=int(coords[1]),
+        )
+
+    print("Extracting frames based on %s ..." % algo)
+    if algo == "uniform":
+        if opencv:
+            frames2pick = frameselectiontools.UniformFramescv2(
+                cap, numframes2pick, start, stop
+            )
+        else:
+            frames2pick = frameselectiontools.UniformFrames(
+                clip, numframes2pick, start, stop
+            )
+    elif algo == "kmeans":
+        if opencv:
+            frames2pick = frameselectiontools.KmeansbasedFrameselectioncv2(
+                cap,
+                numframes2pick,
+                start,
+                stop,
+                crop,
+                coords,
+                step=cluster_step,
+                resizewidth=cluster_resizewidth,
+                color=cluster_color,
+            )
+        else:
+            frames2pick = frameselectiontools.KmeansbasedFrameselection(
+                clip,
+                numframes2pick,
+                start,
+                stop,
+                step=cluster_step,
+                resizewidth=cluster_resizewidth,
+                color=cluster_color,
+            )
+    else:
+        print(
+            "Please implement this method yourself and send us a pull request! Otherwise, choose 'uniform' or 'kmeans'."
+        )
+        frames2pick = []
+
+    if not len(frames2pick):
+        return
+
+    is_valid = []
+    if opencv:
+        # Frames are read in increasing order, grabbing (rather than seeking)
+        # over short gaps, while PNG encoding is offloaded to a pool of threads.
+        found = dict()
+        indices = sorted(set(frames2pick))
+        with ThreadPool() as pool:
+            writes = []
+            for index, frame in zip(indices, cap.read_frames(indices)):
+                found[index] = frame is not None
+                if frame is None:
+                    continue
+                image = img_as_ubyte(frame)
+                if crop:
+                    # y1 = int(coords[2]),y2 = int(coords[3]),x1 = int(coords[0]), x2 = int(coords[1]
+                    image = image[
+                        int(coords[2]) : int(coords[3]),
+                        int(coords[0]) : int(coords[1]),
+                        :,
+                    ]
+                img_name = (
+                    str(output_path) + "/img" + str(index).zfill(indexlength) + ".png"
+                )
+                writes.append(pool.apply_async(io.imsave, (img_name, image)))
+            for write in writes:
+                write.get()
+        cap.close()
+        for index in frames2pick:
+            if not found[index]:
+                print("Frame", index, " not found!")
+            is_valid.append(found[index])
+    else:
+        for index in frames2pick:
+            try:
+                image = img_as_ubyte(clip.get_frame(index * 1.0 / clip.fps))
+                img_name = (
+                    str(output_path) + "/img" + str(index).zfill(indexlength) + ".png"
+                )
+                io.imsave(img_name, image)
+                if np.var(image) == 0:  # constant image
+                    print(
+                        "Seems like black/constant images are extracted from your video. Perhaps consider using opencv under the hood, by setting: opencv=True"
+                    )
+                is_valid.append(True)
+            except FileNotFoundError:
+                print("Frame # ", index, " does not exist.")
+                is_valid.append(False)
+        clip.close()
+        del clip
+    return is_valid
+
+
 def extract_frames(
     config,
     mode="automatic",
@@ -75,6 +224,7 @@ def extract_frames(
     config3d=None,
     extracted_cam=0,
     videos_list=None,
+    n_workers=1,
 ):
     """Extracts frames from the project videos.
 
@@ -171,6 +321,13 @@ def extract_frames(
         this is left as ``None`` all videos specified in the config file will have
         frames extracted. Otherwise one can select a subset by passing those paths.
 
+    n_workers: int, default: 1
+        Number of processes used to extract frames from several videos in parallel
+        during ``"automatic"`` mode. By default, videos are processed one after the
+        other. Extraction stops at the first video whose frame selection fails;
+        with several workers, the videos processed concurrently are interrupted,
+        but some of their frames may already have been saved.
+
     Returns
     -------
     None
@@ -254,11 +411,11 @@ def extract_frames(
     import sys
     import re
     import glob
-    import numpy as np
+    import multiprocessing
+    from functools import partial
     from pathlib import Path
     from skimage import io
     from skimage.util import img_as_ubyte
-    from deeplabcut.utils import frameselectiontools
     from deeplabcut.utils import auxiliaryfunctions
 
     if mode == "manual":
@@ -290,12 +447,8 @@ def extract_frames(
             videos = cfg.get("video_sets_original") or cfg["video_sets"]
         else: #filter video_list by the ones in the config file
             videos = [v for v in cfg["video_sets"] if v in videos_list]
-            
-        if opencv:
-            from deeplabcut.utils.auxfun_videos import VideoReader
-        else:
-            from moviepy.editor import VideoFileClip
 
+        jobs = []
         has_failed = []
         for video in videos:
             if userfeedback:
@@ -317,20 +470,6 @@ def extract_frames(
                 or askuser == "ouais"
             ):  # multilanguage support :)
 
-                if opencv:
-                    cap = VideoReader(video)
-                    nframes = len(cap)
-                else:
-                    # Moviepy:
-                    clip = VideoFileClip(video)
-                    fps = clip.fps
-                    nframes = int(np.ceil(clip.duration * 1.0 / fps))
-                if not nframes:
-                    print("Video could not be opened. Skipping...")
-                    continue
-
-                indexlength = int(np.ceil(np.log10(nframes)))
-
                 fname = Path(video)
                 output_path = Path(config).parents[0] / "labeled-data" / fname.stem
 
@@ -354,122 +493,47 @@ def extract_frames(
                     coords = cfg["video_sets"][video]["crop"].split(",")
                 except KeyError:
                     coords = cfg["video_sets_original"][video]["crop"].split(",")
-
-                if crop and not opencv:
-                    clip = clip.crop(
-                        y1=int(coords[2]),
-                        y2=int(coords[3]),
-                        x1=int(coords[0]),
-                        x2=int(coords[1]),
-                    )
-                elif not crop:
+                if not crop:
                     coords = None
 
-                print("Extracting frames based on %s ..." % algo)
-                if algo == "uniform":
-                    if opencv:
-                        frames2pick = frameselectiontools.UniformFramescv2(
-                            cap, numframes2pick, start, stop
-                        )
-                    else:
-                        frames2pick = frameselectiontools.UniformFrames(
-                            clip, numframes2pick, start, stop
-                        )
-                elif algo == "kmeans":
-                    if opencv:
-                        frames2pick = frameselectiontools.KmeansbasedFrameselectioncv2(
-                            cap,
-                            numframes2pick,
-                            start,
-                            stop,
-                            crop,
-                            coords,
-                            step=cluster_step,
-                            resizewidth=cluster_resizewidth,
-                            color=cluster_color,
-                        )
-                    else:
-                        frames2pick = frameselectiontools.KmeansbasedFrameselection(
-                            clip,
-                            numframes2pick,
-                            start,
-                            stop,
-                            step=cluster_step,
-                            resizewidth=cluster_resizewidth,
-                            color=cluster_color,
-                        )
-                else:
-                    print(
-                        "Please implement this method yourself and send us a pull request! Otherwise, choose 'uniform' or 'kmeans'."
-                    )
-                    frames2pick = []
-
-                if not len(frames2pick):
-                    print("Frame selection failed...")
-                    return
-
-                output_path = (
-                    Path(config).parents[0] / "labeled-data" / Path(video).stem
-                )
-                is_valid = []
-                if opencv:
-                    for index in frames2pick:
-                        cap.set_to_frame(index)  # extract a particular frame
-                        frame = cap.read_frame()
-                        if frame is not None:
-                            image = img_as_ubyte(frame)
-                            img_name = (
-                                str(output_path)
-                                + "/img"
-                                + str(index).zfill(indexlength)
-                                + ".png"
-                            )
-                            if crop:
-                                io.imsave(
-                                    img_name,
-                                    image[
-                                        int(coords[2]) : int(coords[3]),
-                                        int(coords[0]) : int(coords[1]),
-                                        :,
-                                    ],
-                                )  # y1 = int(coords[2]),y2 = int(coords[3]),x1 = int(coords[0]), x2 = int(coords[1]
-                            else:
-                                io.imsave(img_name, image)
-                            is_valid.append(True)
-                        else:
-                            print("Frame", index, " not found!")
-                            is_valid.append(False)
-                    cap.close()
-                else:
-                    for index in frames2pick:
-                        try:
-                            image = img_as_ubyte(clip.get_frame(index * 1.0 / clip.fps))
-                            img_name = (
-                                str(output_path)
-                                + "/img"
-                                + str(index).zfill(indexlength)
-                                + ".png"
-                            )
-                            io.imsave(img_name, image)
-                            if np.var(image) == 0:  # constant image
-                                print(
-                                    "Seems like black/constant images are extracted from your video. Perhaps consider using opencv under the hood, by setting: opencv=True"
-                                )
-                            is_valid.append(True)
-                        except FileNotFoundError:
-                            print("Frame # ", index, " does not exist.")
-                            is_valid.append(False)
-                    clip.close()
-                    del clip
-
-                if not any(is_valid):
-                    has_failed.append(True)
-                else:
-                    has_failed.append(False)
+                jobs.append((video, str(output_path), coords))
 
             else:  # NO!
                 has_failed.append(False)
 
+        func = partial(
+            _extract_frames_from_video,
+            numframes2pick=numframes2pick,
+            start=start,
+            stop=stop,
+            algo=algo,
+            cluster_step=cluster_step,
+            cluster_resizewidth=cluster_resizewidth,
+            cluster_color=cluster_color,
+            opencv=opencv,
+        )
+        # Videos are independent of one another, so they are processed in parallel;
+        # with a single worker (default), everything runs in the current process.
+        # Results are collected in order, so that extraction stops at the first
+        # video whose frame selection failed.
+        pool = None
+        if n_workers > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(min(n_workers, len(jobs)))
+            pending = [pool.apply_async(func, job) for job in jobs]
+            results = (result.get() for result in pending)
+        else:
+            results = (func(*job) for job in jobs)
+        try:
+            for is_valid in results:
+                if is_valid is None:
+                    print("Frame selection failed...")
+                    return
+                if is_valid:
+                    has_failed.append(not any(is_valid))
+        finally:
+            if pool is not None:
+                pool.terminate()
+
         if all(has_failed):
             print("Frame extraction failed. Video files must be corrupted.")
             return
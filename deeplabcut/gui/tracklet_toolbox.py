@@ -3,9 +3,10 @@ import matplotlib.pyplot as plt
 import matplotlib.transforms as mtransforms
 import numpy as np
 import pandas as pd
-from threading import Event, Thread
+import time
+from threading import Event, Thread, current_thread, main_thread
 from deeplabcut.refine_training_dataset.tracklets import TrackletManager
-from deeplabcut.utils.auxfun_videos import VideoReader
+from deeplabcut.utils.auxfun_videos import FrameCache, VideoReader
 from deeplabcut.utils.auxiliaryfunctions import attempttomakefolder
 from matplotlib.path import Path
 from matplotlib.widgets import Slider, LassoSelector, Button, CheckButtons
@@ -180,19 +181,28 @@ class BackgroundPlayer:
         self.speed = "F"
 
     def run(self):
+        next_time = time.perf_counter()
         while self.running:
-            self.can_run.wait()
+            if not self.can_run.is_set():
+                self.can_run.wait()
+                next_time = time.perf_counter()
+            # Play at the native frame rate, skipping frames when lagging behind
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            n_frames = 1 + max(int(-delay * self.viz.video.fps), 0)
+            next_time += n_frames / self.viz.video.fps
             i = self.viz.curr_frame
             if "F" in self.speed:
                 if len(self.speed) == 1:
-                    i += 1
+                    i += n_frames
                 else:
-                    i += 2 * (len(self.speed) - 1)
+                    i += 2 * (len(self.speed) - 1) * n_frames
             elif "R" in self.speed:
                 if len(self.speed) == 1:
-                    i -= 1
+                    i -= n_frames
                 else:
-                    i -= 2 * (len(self.speed) - 1)
+                    i -= 2 * (len(self.speed) - 1) * n_frames
             if i > self.viz.manager.nframes:
                 i = 0
             elif i < 0:
@@ -285,7 +295,7 @@ class PointSelector:
 
 
 class TrackletVisualizer:
-    def __init__(self, manager, videoname, trail_len=50):
+    def __init__(self, manager, videoname, trail_len=50, proxy_shrink=1):
         self.manager = manager
         self.cmap = plt.cm.get_cmap(
             manager.cfg["colormap"], len(set(manager.tracklet2id))
@@ -293,6 +303,8 @@ class TrackletVisualizer:
         self.videoname = videoname
         self.video = VideoReader(videoname)
         self.nframes = len(self.video)
+        # Frames around the current one are decoded ahead of time in the background
+        self.frames = FrameCache(videoname, proxy_shrink=proxy_shrink)
         # Take into consideration imprecise OpenCV estimation of total number of frames
         if abs(self.nframes - manager.nframes) >= 0.05 * manager.nframes:
             print(
@@ -343,7 +355,7 @@ class TrackletVisualizer:
         self.colors = self.cmap(manager.tracklet2id)
         self.colors[:, -1] = self.alpha
 
-        img = self.video.read_frame()
+        img = self.frames.read(0)
         self.im = self.ax1.imshow(img)
         self.scat = self.ax1.scatter([], [], s=self.dotsize ** 2, picker=True)
         self.scat.set_offsets(manager.xy[:, 0])
@@ -420,6 +432,10 @@ class TrackletVisualizer:
         self.fig.canvas.mpl_connect("key_press_event", self.on_press)
         self.fig.canvas.mpl_connect("button_press_event", self.on_click)
         self.fig.canvas.mpl_connect("close_event", self.player.terminate)
+        self.fig.canvas.mpl_connect("close_event", self.frames.close)
+        self._refresh_timer = self.fig.canvas.new_timer(interval=50)
+        self._refresh_timer.single_shot = True
+        self._refresh_timer.add_callback(self._refresh_frame)
 
         self.selector = PointSelector(self, self.ax1, self.scat, self.alpha)
         self.lasso_toggle = CheckButtons(self.ax_lasso, ["Lasso"])
@@ -574,9 +590,7 @@ class TrackletVisualizer:
             if len(self.cuts) > 1:
                 self.cuts.sort()
                 if self.picked_pair:
-                    self.manager.tracklet_swaps[self.picked_pair][
-                        self.cuts
-                    ] = ~self.manager.tracklet_swaps[self.picked_pair][self.cuts]
+                    self.manager.invert_swaps(*self.picked_pair, self.cuts)
                     self.fill_shaded_areas()
                     self.cuts = []
                     self.ax_slider.lines.clear()
@@ -776,8 +790,18 @@ class TrackletVisualizer:
 
     def on_change(self, val):
         self.curr_frame = int(val)
-        self.video.set_to_frame(self.curr_frame)
-        img = self.video.read_frame()
+        img = self.frames.get(self.curr_frame)
+        if (
+            img is None
+            and self.frames.proxy_shrink > 1
+            and current_thread() is main_thread()
+        ):
+            # While scrubbing, preview the frame at low resolution until decoded
+            img = self.frames.get(self.curr_frame, proxy=True)
+            if img is not None:
+                self._refresh_timer.start()
+        if img is None:
+            img = self.frames.read(self.curr_frame)
         if img is not None:
             # Automatically disable the draggable points
             if self.draggable:
@@ -788,6 +812,15 @@ class TrackletVisualizer:
             self.display_trails(self.curr_frame)
             self.update_vlines(self.curr_frame)
 
+    def _refresh_frame(self):
+        if self.curr_frame not in self.frames:
+            self._refresh_timer.start()
+            return
+        img = self.frames.get(self.curr_frame)
+        if img is not None:
+            self.im.set_array(img)
+            self.fig.canvas.draw_idle()
+
     def update_dotsize(self, val):
         self.dotsize = val
         self.scat.set_sizes([self.dotsize ** 2])
@@ -900,6 +933,7 @@ def refine_tracklets(
     min_tracklet_len=2,
     max_gap=2,
     trail_len=0,
+    proxy_shrink=1,
 ):
     """
     Refine tracklets stored either in pickle or h5 format.
@@ -948,6 +982,11 @@ def refine_tracklets(
 
     trail_len : int, optional (default=0)
         Number of trailing points. None by default, to accelerate visualization.
+
+    proxy_shrink : int, optional (default=1)
+        If greater than 1, frames downsampled by that factor are also cached,
+        and displayed while scrubbing through the video until the full resolution
+        frames are decoded. Disabled by default.
     """
     manager = TrackletManager(config, min_swap_len, min_tracklet_len, max_gap)
     if pickle_or_h5_file.endswith("pickle"):
@@ -955,6 +994,6 @@ def refine_tracklets(
     else:
         manager.load_tracklets_from_hdf(pickle_or_h5_file)
     manager.find_swapping_bodypart_pairs()
-    viz = TrackletVisualizer(manager, video, trail_len)
+    viz = TrackletVisualizer(manager, video, trail_len, proxy_shrink)
     viz.show()
     return manager, viz
@@ -9,8 +9,10 @@ Licensed under GNU Lesser General Public License v3.0
 """
 
 import glob
+import multiprocessing
 import os
 import pickle
+from functools import partial
 from pathlib import Path
 
 import cv2
@@ -18,14 +20,67 @@ import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.axes._axes import _log as matplotlib_axes_logger
+from tqdm import tqdm
 
 from deeplabcut.utils import auxiliaryfunctions
 from deeplabcut.utils import auxiliaryfunctions_3d
 
 matplotlib_axes_logger.setLevel("ERROR")
 
+# Termination criteria of the sub-pixel refinement of the corners
+CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
-def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
+
+def _file_signature(fname):
+    stat = os.stat(fname)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _find_corners(fname, cbrow, cbcol, detection_size=None, path_corners=None):
+    """Detect the chessboard corners of a calibration image and refine them.
+
+    With ``detection_size``, the board is searched for on the image downscaled so
+    that its longest side is that many pixels, and the corners found are refined at
+    full resolution. If ``path_corners`` is given, the corners found are drawn on the
+    image saved there. Returns whether the board was found, the corners and the
+    image's shape.
+    """
+    img = cv2.imread(fname)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    pattern = (cbcol, cbrow)
+    scale = max(gray.shape) / detection_size if detection_size else 1
+    if scale > 1:
+        small = cv2.resize(
+            gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA
+        )
+        ret, corners = cv2.findChessboardCorners(small, pattern, None)
+        if ret:
+            corners = cv2.cornerSubPix(small, corners, (5, 5), (-1, -1), CRITERIA)
+            # Back to the pixel coordinates of the full resolution image
+            corners = ((corners + 0.5) * scale - 0.5).astype(np.float32)
+    else:
+        ret, corners = cv2.findChessboardCorners(gray, pattern, None)
+    if ret:
+        corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), CRITERIA)
+        if path_corners is not None:
+            img = cv2.drawChessboardCorners(img, pattern, corners, ret)
+            cv2.imwrite(
+                os.path.join(path_corners, Path(fname).stem + "_corner.jpg"), img
+            )
+    else:
+        corners = None
+    return bool(ret), corners, gray.shape
+
+
+def calibrate_cameras(
+    config,
+    cbrow=8,
+    cbcol=6,
+    calibrate=False,
+    alpha=0.4,
+    n_processes=None,
+    detection_size=None,
+):
     """This function extracts the corners points from the calibration images, calibrates the camera and stores the calibration files in the project folder (defined in the config file).
     
     Make sure you have around 20-60 pairs of calibration images. The function should be used iteratively to select the right set of calibration images. 
@@ -36,6 +91,9 @@ def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
     In such a case, remove those pairs of images and re-run this function. Once the right number of calibration images are selected, 
     use the parameter ``calibrate=True`` to calibrate the cameras.
 
+    With more than two cameras, every camera is stereo-calibrated with the first one, so that
+    the predictions of all the views can be triangulated together (see ``triangulate``).
+
     Parameters
     ----------
     config : string
@@ -55,7 +113,20 @@ def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
         Floating point number between 0 and 1 specifying the free scaling parameter. When alpha = 0, the rectified images with only valid pixels are stored 
         i.e. the rectified images are zoomed in. When alpha = 1, all the pixels from the original images are retained. 
         For more details: https://docs.opencv.org/2.4/modules/calib3d/doc/camera_calibration_and_3d_reconstruction.html
-        
+
+    n_processes: int or None, optional, default=None
+        Number of processes across which the corners of the images are detected.
+        If ``None``, all available cores are used. The corners found are cached in
+        the corners folder, so that re-running the function (e.g. with
+        ``calibrate=True`` after removing images) only processes new images.
+
+    detection_size: int or None, optional, default=None
+        If given, corners are first detected on the images downscaled so that their
+        longest side is ``detection_size`` pixels (e.g. 1000), and then refined at full
+        resolution, which is much faster on high resolution images, especially on
+        those where no board is found. The board must then be large enough to be
+        detected at that size. By default, corners are detected at full resolution.
+
     Example
     --------
     Linux/MacOs/Windows
@@ -65,9 +136,6 @@ def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
     >>> deeplabcut.calibrate_camera(config,calibrate=True)
 
     """
-    # Termination criteria
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-
     # Prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(6,5,0)
     objp = np.zeros((cbrow * cbcol, 3), np.float32)
     objp[:, :2] = np.mgrid[0:cbcol, 0:cbrow].T.reshape(-1, 2)
@@ -120,32 +188,59 @@ def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
             "No calibration images found. Make sure the calibration images are saved as .jpg and with prefix as the camera name as specified in the config.yaml file."
         )
 
+    # Detect the corners of the images not processed with these settings before,
+    # in parallel, and cache them so that calibrating after pruning the images
+    # does not repeat the detection.
+    cache_file = os.path.join(str(path_corners), "corners.pickle")
+    settings = (cbrow, cbcol, detection_size)
+    try:
+        cache = auxiliaryfunctions.read_pickle(cache_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        cache = {}
+    results = {}
+    jobs = []
+    keys = []
+    for fname in images:
+        if not any(cam in fname for cam in cam_names):
+            continue
+        key = (Path(fname).name, _file_signature(fname), settings)
+        keys.append(key)
+        result = cache.get(key)
+        corner_file = os.path.join(str(path_corners), Path(fname).stem + "_corner.jpg")
+        if result is None or (result[0] and not os.path.isfile(corner_file)):
+            jobs.append((fname, key))
+        else:
+            results[fname] = result
+    func = partial(
+        _find_corners,
+        cbrow=cbrow,
+        cbcol=cbcol,
+        detection_size=detection_size,
+        path_corners=str(path_corners),
+    )
+    fnames = [fname for fname, _ in jobs]
+    if n_processes == 1 or len(jobs) < 2:
+        detected = [func(fname) for fname in tqdm(fnames)]
+    else:
+        with multiprocessing.Pool(n_processes) as pool:
+            detected = list(tqdm(pool.imap(func, fnames), total=len(fnames)))
+    for (fname, key), result in zip(jobs, detected):
+        results[fname] = cache[key] = result
+    keys = set(keys)
+    auxiliaryfunctions.write_pickle(
+        cache_file, {key: result for key, result in cache.items() if key in keys}
+    )
+
+    image_shape = None
     skip_images = []
     for fname in images:
         for cam in cam_names:
             if cam in fname and Path(fname).name not in skip_images:
-                filename = Path(fname).stem
-                img = cv2.imread(fname)
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-                # Find the chess board corners
-                ret, corners = cv2.findChessboardCorners(
-                    gray, (cbcol, cbrow), None
-                )  #  (8,6) pattern (dimensions = common points of black squares)
-                # If found, add object points, image points (after refining them)
-
-                if ret == True:
-                    img_shape[cam] = gray.shape[::-1]
+                ret, corners, image_shape = results[fname]
+                if ret:
+                    img_shape[cam] = image_shape[::-1]
                     objpoints[cam].append(objp)
-                    corners = cv2.cornerSubPix(
-                        gray, corners, (11, 11), (-1, -1), criteria
-                    )
                     imgpoints[cam].append(corners)
-                    # Draw the corners and store the images
-                    img = cv2.drawChessboardCorners(img, (cbcol, cbrow), corners, ret)
-                    cv2.imwrite(
-                        os.path.join(str(path_corners), filename + "_corner.jpg"), img
-                    )
                 else:
                     print("Corners not found for the image %s" % Path(fname).name)
                     for new_cam in cam_names:
@@ -157,12 +252,11 @@ def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
                         if new_cam != cam:
                             skip_images.append(remove_fname)
 
-    try:
-        h, w = img.shape[:2]
-    except:
+    if image_shape is None:
         raise Exception(
             "It seems that the name of calibration images does not match with the camera names in the config file. Please make sure that the calibration images are named with camera names as specified in the config.yaml file."
         )
+    h, w = image_shape
 
     # Perform calibration for each cameras and store the matrices as a pickle file
     if calibrate == True:
@@ -206,10 +300,11 @@ def calibrate_cameras(config, cbrow=8, cbcol=6, calibrate=False, alpha=0.4):
                 % (cam, mean_error / len(objpoints[cam]))
             )
 
-        # Compute stereo calibration for each pair of cameras
-        camera_pair = [[cam_names[0], cam_names[1]]]
+        # Compute stereo calibration for each pair of cameras; the cameras of rigs
+        # with more than two cameras are all paired with the first one.
+        camera_pair = [[cam_names[0], cam] for cam in cam_names[1:]]
         for pair in camera_pair:
-            print("Computing stereo calibration for " % pair)
+            print("Computing stereo calibration for %s-%s" % tuple(pair))
             (
                 retval,
                 cameraMatrix1,
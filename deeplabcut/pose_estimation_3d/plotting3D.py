@@ -10,8 +10,14 @@ Licensed under GNU Lesser General Public License v3.0
 
 import glob
 import os
+import queue
+import shutil
+import subprocess
+import threading
+from multiprocessing import Pool
 from pathlib import Path
 
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -26,11 +32,15 @@ from deeplabcut.utils.auxfun_videos import VideoReader
 
 matplotlib_axes_logger.setLevel("ERROR")
 from matplotlib import gridspec
-from matplotlib.animation import FFMpegWriter
 from matplotlib.collections import LineCollection
 from mpl_toolkits.mplot3d.art3d import Line3DCollection
 from tqdm import tqdm
 
+# Before matplotlib 3.4, 3D artists required the renderer to be projected
+_PROJECTION_NEEDS_RENDERER = tuple(
+    int(v) for v in matplotlib.__version__.split(".")[:2]
+) < (3, 4)
+
 
 def set_up_grid(figsize, xlim, ylim, zlim, view):
     gs = gridspec.GridSpec(1, 3, width_ratios=[1, 1, 1])
@@ -53,6 +63,221 @@ def set_up_grid(figsize, xlim, ylim, zlim, view):
     return fig, axes1, axes2, axes3
 
 
+def _prefetch(iterable, buffer_size=16):
+    """Iterate over ``iterable`` (e.g. decoded video frames) in a background thread,
+    up to ``buffer_size`` items ahead of the consumer."""
+    items = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        finally:
+            items.put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _open_ffmpeg(filename, width, height, fps):
+    """Start an ffmpeg process encoding the raw RGBA frames written to its stdin."""
+    command = [
+        matplotlib.rcParams["animation.ffmpeg_path"],
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgba",
+        "-s",
+        f"{width}x{height}",
+        "-r",
+        str(fps),
+        "-i",
+        "-",
+        "-vf",
+        "pad=ceil(iw/2)*2:ceil(ih/2)*2",  # Even dimensions, as yuv420p requires
+        "-vcodec",
+        matplotlib.rcParams["animation.codec"],
+        "-pix_fmt",
+        "yuv420p",
+        filename,
+    ]
+    return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+
+def _concatenate_videos(filenames, output_filename):
+    """Losslessly concatenate videos encoded with the same settings."""
+    list_file = os.path.join(os.path.dirname(filenames[0]), "segments.txt")
+    with open(list_file, "w") as file:
+        for filename in filenames:
+            file.write(f"file '{os.path.abspath(filename)}'\n")
+    subprocess.run(
+        [
+            matplotlib.rcParams["animation.ffmpeg_path"],
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_file,
+            "-c",
+            "copy",
+            output_filename,
+        ],
+        check=True,
+    )
+    os.remove(list_file)
+
+
+def _render_frames(
+    output_filename,
+    videos,
+    frames,
+    offset,
+    xy1,
+    xy2,
+    xyz,
+    colors,
+    ind_links,
+    trailpoints,
+    draw_skeleton,
+    skeleton_color,
+    marker_size,
+    alpha,
+    figsize,
+    xlim,
+    ylim,
+    zlim,
+    view,
+    fps,
+    dpi,
+    progress=True,
+):
+    """Render the frames of a 3D labeled video into ``output_filename``.
+
+    The figure and its artists are created once; for every frame, only the
+    images, points and skeletons are redrawn over the cached static background
+    (blitting), and the canvas is piped to ffmpeg. ``xy1``, ``xy2`` and ``xyz``
+    hold the data from frame ``offset`` on.
+    """
+    vid_cam1, vid_cam2 = (VideoReader(video) for video in videos)
+    fig, axes1, axes2, axes3 = set_up_grid(figsize, xlim, ylim, zlim, view)
+    fig.set_dpi(dpi)
+    process = frames_cam1 = frames_cam2 = None
+    try:
+        n_points = xyz.shape[1]
+        im1 = axes1.imshow(np.zeros((vid_cam1.height, vid_cam1.width, 3), np.uint8))
+        im2 = axes2.imshow(np.zeros((vid_cam2.height, vid_cam2.width, 3), np.uint8))
+        points_2d1 = axes1.scatter(
+            *np.zeros((2, n_points)), s=marker_size, alpha=alpha,
+        )
+        points_2d2 = axes2.scatter(
+            *np.zeros((2, n_points)), s=marker_size, alpha=alpha,
+        )
+        points_3d = axes3.scatter(
+            *np.zeros((3, n_points)), s=marker_size, alpha=alpha,
+        )
+        artists = [(axes1, im1), (axes2, im2)]
+        if draw_skeleton:
+            # Set up skeleton LineCollections
+            segs = np.zeros((2, len(ind_links), 2))
+            coll1 = LineCollection(segs, colors=skeleton_color)
+            coll2 = LineCollection(segs, colors=skeleton_color)
+            axes1.add_collection(coll1)
+            axes2.add_collection(coll2)
+            segs = np.zeros((2, len(ind_links), 3))
+            coll_3d = Line3DCollection(segs, colors=skeleton_color)
+            axes3.add_collection(coll_3d)
+            artists += [(axes1, coll1), (axes2, coll2), (axes3, coll_3d)]
+        artists += [(axes1, points_2d1), (axes2, points_2d2), (axes3, points_3d)]
+        for _, artist in artists:
+            artist.set_animated(True)
+
+        # Draw everything but the animated artists once, as the background
+        canvas = fig.canvas
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+        width, height = canvas.get_width_height()
+        process = _open_ffmpeg(output_filename, width, height, fps)
+        frames_cam1 = _prefetch(vid_cam1.read_frames(frames))
+        frames_cam2 = _prefetch(vid_cam2.read_frames(frames))
+        for k, frame_cam1, frame_cam2 in zip(
+            tqdm(frames, disable=not progress), frames_cam1, frames_cam2
+        ):
+            if frame_cam1 is None or frame_cam2 is None:
+                raise IOError("A video frame is empty.")
+            im1.set_data(frame_cam1)
+            im2.set_data(frame_cam2)
+
+            i = k - offset
+            sl = slice(max(0, i - trailpoints), i + 1)
+            colors_trail = np.tile(colors, (sl.stop - sl.start, 1))
+            points_3d._offsets3d = xyz[sl].reshape((-1, 3)).T
+            points_3d.set_color(colors_trail)
+            points_2d1.set_offsets(xy1[sl, :, :2].reshape((-1, 2)))
+            points_2d1.set_color(colors_trail)
+            points_2d2.set_offsets(xy2[sl, :, :2].reshape((-1, 2)))
+            points_2d2.set_color(colors_trail)
+            if draw_skeleton:
+                coll_3d.set_segments(xyz[i][tuple([ind_links])].swapaxes(0, 1))
+                coll1.set_segments(xy1[i, :, :2][tuple([ind_links])].swapaxes(0, 1))
+                coll2.set_segments(xy2[i, :, :2][tuple([ind_links])].swapaxes(0, 1))
+
+            canvas.restore_region(background)
+            for ax, artist in artists:
+                if ax is axes3:
+                    # Normally done by Axes3D.draw, with the view's projection
+                    if _PROJECTION_NEEDS_RENDERER:
+                        artist.do_3d_projection(canvas.get_renderer())
+                    else:
+                        artist.do_3d_projection()
+                ax.draw_artist(artist)
+            process.stdin.write(canvas.buffer_rgba())
+    finally:
+        for frames_cam in (frames_cam1, frames_cam2):
+            if frames_cam is not None:
+                frames_cam.close()
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+        plt.close(fig)
+        vid_cam1.close()
+        vid_cam2.close()
+    if process.returncode:
+        raise RuntimeError(f"ffmpeg failed to write {output_filename}.")
+
+
+def _render_segment(kwargs):
+    return _render_frames(progress=False, **kwargs)
+
+
 def create_labeled_video_3d(
     config,
     path,
@@ -70,6 +295,7 @@ def create_labeled_video_3d(
     figsize=(20, 8),
     fps=30,
     dpi=300,
+    n_processes=1,
 ):
     """
     Creates a video with views from the two cameras and the 3d reconstruction for a selected number of frames.
@@ -117,6 +343,10 @@ def create_labeled_video_3d(
         Coloring rule. By default, each bodypart is colored differently.
         If set to 'individual', points belonging to a single individual are colored the same.
 
+    n_processes : int or None, optional (default=1)
+        Number of processes rendering ranges of frames in parallel, whose videos are
+        then concatenated. If ``None``, all available cores are used.
+
     Example
     -------
     Linux/MacOs
@@ -254,10 +484,11 @@ def create_labeled_video_3d(
             if end is None:
                 end = len(df_3d)  # All the frames
             end = min(end, min(len(vid_cam1), len(vid_cam2)))
+            vid_cam1.close()
+            vid_cam2.close()
             frames = list(range(start, end))
 
             output_folder = Path(os.path.join(path_h5_file, "temp_" + file_name))
-            output_folder.mkdir(parents=True, exist_ok=True)
 
             # Flatten the list of bodyparts to connect
             bodyparts2plot = list(
@@ -305,59 +536,61 @@ def create_labeled_video_3d(
                 mid_z = np.mean(minmax[2])
                 zlim = mid_z - minmax_range, mid_z + minmax_range
 
-            # Set up the matplotlib figure beforehand
-            fig, axes1, axes2, axes3 = set_up_grid(figsize, xlim, ylim, zlim, view)
-            points_2d1 = axes1.scatter(
-                *np.zeros((2, len(bodyparts2plot))), s=markerSize, alpha=alphaValue,
-            )
-            im1 = axes1.imshow(np.zeros((vid_cam1.height, vid_cam1.width)))
-            points_2d2 = axes2.scatter(
-                *np.zeros((2, len(bodyparts2plot))), s=markerSize, alpha=alphaValue,
-            )
-            im2 = axes2.imshow(np.zeros((vid_cam2.height, vid_cam2.width)))
-            points_3d = axes3.scatter(
-                *np.zeros((3, len(bodyparts2plot))), s=markerSize, alpha=alphaValue,
+            render_kwargs = dict(
+                videos=(cam1_view_video, cam2_view_video),
+                colors=colors,
+                ind_links=ind_links,
+                trailpoints=trailpoints,
+                draw_skeleton=draw_skeleton,
+                skeleton_color=skeleton_color,
+                marker_size=markerSize,
+                alpha=alphaValue,
+                figsize=figsize,
+                xlim=xlim,
+                ylim=ylim,
+                zlim=zlim,
+                view=view,
+                fps=fps,
+                dpi=dpi,
             )
-            if draw_skeleton:
-                # Set up skeleton LineCollections
-                segs = np.zeros((2, len(ind_links), 2))
-                coll1 = LineCollection(segs, colors=skeleton_color)
-                coll2 = LineCollection(segs, colors=skeleton_color)
-                axes1.add_collection(coll1)
-                axes2.add_collection(coll2)
-                segs = np.zeros((2, len(ind_links), 3))
-                coll_3d = Line3DCollection(segs, colors=skeleton_color)
-                axes3.add_collection(coll_3d)
-
-            writer = FFMpegWriter(fps=fps)
-            with writer.saving(fig, videooutname, dpi=dpi):
-                for k in tqdm(frames):
-                    vid_cam1.set_to_frame(k)
-                    vid_cam2.set_to_frame(k)
-                    frame_cam1 = vid_cam1.read_frame()
-                    frame_cam2 = vid_cam2.read_frame()
-                    if frame_cam1 is None or frame_cam2 is None:
-                        raise IOError("A video frame is empty.")
-
-                    im1.set_data(frame_cam1)
-                    im2.set_data(frame_cam2)
-
-                    sl = slice(max(0, k - trailpoints), k + 1)
-                    coords3d = xyz[sl]
-                    coords1 = xy1[sl, :, :2]
-                    coords2 = xy2[sl, :, :2]
-                    points_3d._offsets3d = coords3d.reshape((-1, 3)).T
-                    points_3d.set_color(colors)
-                    points_2d1.set_offsets(coords1.reshape((-1, 2)))
-                    points_2d1.set_color(colors)
-                    points_2d2.set_offsets(coords2.reshape((-1, 2)))
-                    points_2d2.set_color(colors)
-                    if draw_skeleton:
-                        segs3d = xyz[k][tuple([ind_links])].swapaxes(0, 1)
-                        coll_3d.set_segments(segs3d)
-                        segs1 = xy1[k, :, :2][tuple([ind_links])].swapaxes(0, 1)
-                        coll1.set_segments(segs1)
-                        segs2 = xy2[k, :, :2][tuple([ind_links])].swapaxes(0, 1)
-                        coll2.set_segments(segs2)
-
-                    writer.grab_frame()
+            # Contiguous ranges of frames are rendered in parallel, and the
+            # resulting segments concatenated (without re-encoding them).
+            n_segments = max(min(n_processes or os.cpu_count(), len(frames)), 1)
+            if n_segments == 1:
+                _render_frames(
+                    videooutname,
+                    frames=frames,
+                    offset=0,
+                    xy1=xy1,
+                    xy2=xy2,
+                    xyz=xyz,
+                    **render_kwargs,
+                )
+            else:
+                output_folder.mkdir(parents=True, exist_ok=True)
+                jobs = []
+                for n, inds in enumerate(np.array_split(frames, n_segments)):
+                    first = max(inds[0] - trailpoints, 0)
+                    sl = slice(first, inds[-1] + 1)
+                    jobs.append(
+                        dict(
+                            output_filename=str(output_folder / f"segment{n}.mp4"),
+                            frames=inds.tolist(),
+                            offset=first,
+                            xy1=xy1[sl],
+                            xy2=xy2[sl],
+                            xyz=xyz[sl],
+                            **render_kwargs,
+                        )
+                    )
+                with Pool(n_segments) as pool:
+                    list(
+                        tqdm(
+                            pool.imap_unordered(_render_segment, jobs),
+                            total=len(jobs),
+                        )
+                    )
+                _concatenate_videos(
+                    [job["output_filename"] for job in jobs], videooutname
+                )
+                shutil.rmtree(output_folder)
@@ -9,6 +9,7 @@ Licensed under GNU Lesser General Public License v3.0
 """
 
 import os
+import warnings
 from pathlib import Path
 
 import cv2
@@ -33,11 +34,17 @@ def triangulate(
     destfolder=None,
     save_as_csv=False,
     track_method="",
+    identity_window=None,
 ):
     """
-    This function triangulates the detected DLC-keypoints from the two camera views
+    This function triangulates the detected DLC-keypoints from the camera views
     using the camera matrices (derived from calibration) to calculate 3D predictions.
 
+    All the views of a rig are triangulated together, weighting each view by the
+    likelihood of its predictions. The 3D coordinates are in the rectified frame of
+    the first camera pair. The reprojection error of every 3D point (in pixels,
+    averaged over the views) is saved in a "_reprojection.h5" file next to them.
+
     Parameters
     ----------
     config : string
@@ -46,7 +53,8 @@ def triangulate(
     video_path : string/list of list
         Full path of the directory where videos are saved. If the user wants to analyze
         only a pair of videos, the user needs to pass them as a list of list of videos,
-        i.e. [['video1-camera-1.avi','video1-camera-2.avi']]
+        i.e. [['video1-camera-1.avi','video1-camera-2.avi']]; with more cameras, each
+        list holds one video per camera, in the order of ``camera_names``.
 
     videotype: string, optional
         Checks for the extension of the video in case the input to the video is a directory.\n Only videos with this extension are analyzed.
@@ -70,6 +78,17 @@ def triangulate(
     save_as_csv: bool, optional
         Saves the predictions in a .csv file. The default is ``False``
 
+    track_method: string, optional
+        Tracker of the multi-animal predictions to triangulate ('box', 'skeleton' or
+        'ellipse'); taken from the config.yaml file of the 2D project if none is given.
+
+    identity_window: int, optional
+        For multi-animal projects, the individuals of every view are matched to those
+        of the first view with the epipolar constraint, once for the whole video by
+        default. If given, they are matched anew in every window of that many frames
+        (1 matching them in every frame), which handles identity swaps of the 2D
+        tracks at the cost of noisier matches.
+
     Example
     -------
     Linux/MacOS
@@ -88,6 +107,7 @@ def triangulate(
     >>> deeplabcut.triangulate(config,[['C:\\yourusername\\rig-95\\Videos\\video1-camera-1.avi','C:\\yourusername\\rig-95\\Videos\\video1-camera-2.avi'],['C:\\yourusername\\rig-95\\Videos\\video2-camera-1.avi','C:\\yourusername\\rig-95\\Videos\\video2-camera-2.avi']])
     """
     from deeplabcut.pose_estimation_tensorflow import predict_videos
+    from deeplabcut.pose_estimation_tensorflow.server import SessionCache
     from deeplabcut.post_processing import filtering
 
     cfg_3d = auxiliaryfunctions.read_config(config)
@@ -131,134 +151,165 @@ def triangulate(
     print("List of pairs:", video_list)
     scorer_name = {}
     run_triangulate = False
-    for i in range(len(video_list)):
-        dataname = []
-        for j in range(len(video_list[i])):  # looping over cameras
-            if cam_names[j] not in video_list[i][j]:
-                raise ValueError(
-                    f"Camera name '{cam_names[j]}' "
-                    f"not found in video list '{video_list[i][j]}'."
-                )
-            else:
-                print(
-                    "Analyzing video %s using %s"
-                    % (video_list[i][j], str("config_file_" + cam_names[j]))
-                )
+    # The networks of all cameras stay loaded across the videos
+    session_cache = SessionCache(capacity=len(cam_names))
+    try:
+        for i in range(len(video_list)):
+            videos_to_filter = []
+            dataname = []
+            for j in range(len(video_list[i])):  # looping over cameras
+                if cam_names[j] not in video_list[i][j]:
+                    raise ValueError(
+                        f"Camera name '{cam_names[j]}' "
+                        f"not found in video list '{video_list[i][j]}'."
+                    )
+                else:
+                    print(
+                        "Analyzing video %s using %s"
+                        % (video_list[i][j], str("config_file_" + cam_names[j]))
+                    )
 
-                config_2d = snapshots[cam_names[j]]
-                cfg = auxiliaryfunctions.read_config(config_2d)
+                    config_2d = snapshots[cam_names[j]]
+                    cfg = auxiliaryfunctions.read_config(config_2d)
 
-                # Get track_method and do related checks
-                track_method = auxfun_multianimal.get_track_method(
-                    cfg, track_method=track_method
-                )
-                if len(cfg.get("multianimalbodyparts", [])) == 1 and track_method != "box":
-                    warnings.warn(
-                        "Switching to `box` tracker for single point tracking..."
+                    # Get track_method and do related checks
+                    track_method = auxfun_multianimal.get_track_method(
+                        cfg, track_method=track_method
                     )
-                    track_method = "box"
+                    if len(cfg.get("multianimalbodyparts", [])) == 1 and track_method != "box":
+                        warnings.warn(
+                            "Switching to `box` tracker for single point tracking..."
+                        )
+                        track_method = "box"
 
-                # Get track method suffix
-                tr_method_suffix = TRACK_METHODS.get(track_method, "")
+                    # Get track method suffix
+                    tr_method_suffix = TRACK_METHODS.get(track_method, "")
+
+                    shuffle = cfg_3d[str("shuffle_" + cam_names[j])]
+                    trainingsetindex = cfg_3d[str("trainingsetindex_" + cam_names[j])]
+                    trainFraction = cfg["TrainingFraction"][trainingsetindex]
+                    if flag == True:
+                        video = os.path.join(video_path, video_list[i][j])
+                    else:
+                        video_path = str(Path(video_list[i][j]).parents[0])
+                        video = os.path.join(video_path, video_list[i][j])
+
+                    if destfolder is None:
+                        destfolder = str(Path(video).parents[0])
+
+                    vname = Path(video).stem
+                    prefix = str(vname).split(cam_names[j])[0]
+                    suffix = str(vname).split(cam_names[j])[-1]
+                    if prefix == "":
+                        pass
+                    elif prefix[-1] == "_" or prefix[-1] == "-":
+                        prefix = prefix[:-1]
 
-                shuffle = cfg_3d[str("shuffle_" + cam_names[j])]
-                trainingsetindex = cfg_3d[str("trainingsetindex_" + cam_names[j])]
-                trainFraction = cfg["TrainingFraction"][trainingsetindex]
-                if flag == True:
-                    video = os.path.join(video_path, video_list[i][j])
-                else:
-                    video_path = str(Path(video_list[i][j]).parents[0])
-                    video = os.path.join(video_path, video_list[i][j])
-
-                if destfolder is None:
-                    destfolder = str(Path(video).parents[0])
-
-                vname = Path(video).stem
-                prefix = str(vname).split(cam_names[j])[0]
-                suffix = str(vname).split(cam_names[j])[-1]
-                if prefix == "":
-                    pass
-                elif prefix[-1] == "_" or prefix[-1] == "-":
-                    prefix = prefix[:-1]
-
-                if suffix == "":
-                    pass
-                elif suffix[0] == "_" or suffix[0] == "-":
-                    suffix = suffix[1:]
-
-                if prefix == "":
-                    output_file = os.path.join(destfolder, suffix)
-                else:
                     if suffix == "":
-                        output_file = os.path.join(destfolder, prefix)
+                        pass
+                    elif suffix[0] == "_" or suffix[0] == "-":
+                        suffix = suffix[1:]
+
+                    if prefix == "":
+                        output_file = os.path.join(destfolder, suffix)
                     else:
-                        output_file = os.path.join(destfolder, prefix + "_" + suffix)
-
-                output_filename = os.path.join(
-                    output_file + "_" + scorer_3d
-                )  # Check if the videos are already analyzed for 3d
-                if os.path.isfile(output_filename + ".h5"):
-                    if save_as_csv is True and not os.path.exists(
-                        output_filename + ".csv"
-                    ):
-                        # In case user adds save_as_csv is True after triangulating
-                        pd.read_hdf(output_filename + ".h5").to_csv(
-                            str(output_filename + ".csv")
+                        if suffix == "":
+                            output_file = os.path.join(destfolder, prefix)
+                        else:
+                            output_file = os.path.join(destfolder, prefix + "_" + suffix)
+
+                    output_filename = os.path.join(
+                        output_file + "_" + scorer_3d
+                    )  # Check if the videos are already analyzed for 3d
+                    if os.path.isfile(output_filename + ".h5"):
+                        if save_as_csv is True and not os.path.exists(
+                            output_filename + ".csv"
+                        ):
+                            # In case user adds save_as_csv is True after triangulating
+                            pd.read_hdf(output_filename + ".h5").to_csv(
+                                str(output_filename + ".csv")
+                            )
+
+                        print(
+                            "Already analyzed...Checking the meta data for any change in the camera matrices and/or scorer names",
+                            vname,
+                        )
+                        pickle_file = str(output_filename + "_meta.pickle")
+                        metadata_ = auxiliaryfunctions_3d.LoadMetadata3d(pickle_file)
+                        (
+                            img_path,
+                            path_corners,
+                            path_camera_matrix,
+                            path_undistort,
+                            _,
+                        ) = auxiliaryfunctions_3d.Foldernames3Dproject(cfg_3d)
+                        path_stereo_file = os.path.join(
+                            path_camera_matrix, "stereo_params.pickle"
+                        )
+                        stereo_file = auxiliaryfunctions.read_pickle(path_stereo_file)
+                        cam_pair = str(cam_names[0] + "-" + cam_names[1])
+                        is_video_analyzed = False  # variable to keep track if the video was already analyzed
+                        # Check for the camera matrix
+                        for k in metadata_["stereo_matrix"].keys():
+                            if np.all(
+                                metadata_["stereo_matrix"][k] == stereo_file[cam_pair][k]
+                            ):
+                                pass
+                            else:
+                                run_triangulate = True
+
+                        # Check for scorer names in the pickle file of 3d output
+                        DLCscorer, DLCscorerlegacy = auxiliaryfunctions.get_scorer_name(
+                            cfg, shuffle, trainFraction, trainingsiterations="unknown"
                         )
 
-                    print(
-                        "Already analyzed...Checking the meta data for any change in the camera matrices and/or scorer names",
-                        vname,
-                    )
-                    pickle_file = str(output_filename + "_meta.pickle")
-                    metadata_ = auxiliaryfunctions_3d.LoadMetadata3d(pickle_file)
-                    (
-                        img_path,
-                        path_corners,
-                        path_camera_matrix,
-                        path_undistort,
-                        _,
-                    ) = auxiliaryfunctions_3d.Foldernames3Dproject(cfg_3d)
-                    path_stereo_file = os.path.join(
-                        path_camera_matrix, "stereo_params.pickle"
-                    )
-                    stereo_file = auxiliaryfunctions.read_pickle(path_stereo_file)
-                    cam_pair = str(cam_names[0] + "-" + cam_names[1])
-                    is_video_analyzed = False  # variable to keep track if the video was already analyzed
-                    # Check for the camera matrix
-                    for k in metadata_["stereo_matrix"].keys():
-                        if np.all(
-                            metadata_["stereo_matrix"][k] == stereo_file[cam_pair][k]
-                        ):
-                            pass
+                        if (
+                            metadata_["scorer_name"][cam_names[j]] == DLCscorer
+                        ):  # TODO: CHECK FOR BOTH?
+                            is_video_analyzed = True
+                        elif metadata_["scorer_name"][cam_names[j]] == DLCscorerlegacy:
+                            is_video_analyzed = True
                         else:
+                            is_video_analyzed = False
                             run_triangulate = True
 
-                    # Check for scorer names in the pickle file of 3d output
-                    DLCscorer, DLCscorerlegacy = auxiliaryfunctions.get_scorer_name(
-                        cfg, shuffle, trainFraction, trainingsiterations="unknown"
-                    )
-
-                    if (
-                        metadata_["scorer_name"][cam_names[j]] == DLCscorer
-                    ):  # TODO: CHECK FOR BOTH?
-                        is_video_analyzed = True
-                    elif metadata_["scorer_name"][cam_names[j]] == DLCscorerlegacy:
-                        is_video_analyzed = True
-                    else:
-                        is_video_analyzed = False
-                        run_triangulate = True
-
-                    if is_video_analyzed:
-                        print("This file is already analyzed!")
-                        dataname.append(
-                            os.path.join(
-                                destfolder, vname + DLCscorer + tr_method_suffix + ".h5"
+                        if is_video_analyzed:
+                            print("This file is already analyzed!")
+                            dataname.append(
+                                os.path.join(
+                                    destfolder, vname + DLCscorer + tr_method_suffix + ".h5"
+                                )
                             )
-                        )
-                        scorer_name[cam_names[j]] = DLCscorer
-                    else:
-                        # Analyze video if score name is different
+                            scorer_name[cam_names[j]] = DLCscorer
+                        else:
+                            # Analyze video if score name is different
+                            DLCscorer = predict_videos.analyze_videos(
+                                config_2d,
+                                [video],
+                                videotype=videotype,
+                                shuffle=shuffle,
+                                trainingsetindex=trainingsetindex,
+                                gputouse=gputouse,
+                                destfolder=destfolder,
+                                session_cache=session_cache,
+                            )
+                            scorer_name[cam_names[j]] = DLCscorer
+                            is_video_analyzed = False
+                            run_triangulate = True
+                            suffix = tr_method_suffix
+                            if filterpredictions:
+                                videos_to_filter.append(
+                                    (config_2d, shuffle, trainingsetindex, video)
+                                )
+                                suffix += "_filtered"
+
+                            dataname.append(
+                                os.path.join(
+                                    destfolder, vname + DLCscorer + suffix + ".h5"
+                                )
+                            )
+
+                    else:  # need to do the whole jam.
                         DLCscorer = predict_videos.analyze_videos(
                             config_2d,
                             [video],
@@ -267,233 +318,217 @@ def triangulate(
                             trainingsetindex=trainingsetindex,
                             gputouse=gputouse,
                             destfolder=destfolder,
+                            session_cache=session_cache,
                         )
                         scorer_name[cam_names[j]] = DLCscorer
-                        is_video_analyzed = False
                         run_triangulate = True
+                        print(destfolder, vname, DLCscorer)
                         suffix = tr_method_suffix
                         if filterpredictions:
-                            filtering.filterpredictions(
-                                config_2d,
-                                [video],
-                                videotype=videotype,
-                                shuffle=shuffle,
-                                trainingsetindex=trainingsetindex,
-                                filtertype=filtertype,
-                                destfolder=destfolder,
+                            videos_to_filter.append(
+                                (config_2d, shuffle, trainingsetindex, video)
                             )
                             suffix += "_filtered"
-
                         dataname.append(
                             os.path.join(
                                 destfolder, vname + DLCscorer + suffix + ".h5"
                             )
                         )
 
-                else:  # need to do the whole jam.
-                    DLCscorer = predict_videos.analyze_videos(
-                        config_2d,
-                        [video],
-                        videotype=videotype,
-                        shuffle=shuffle,
-                        trainingsetindex=trainingsetindex,
-                        gputouse=gputouse,
-                        destfolder=destfolder,
-                    )
-                    scorer_name[cam_names[j]] = DLCscorer
-                    run_triangulate = True
-                    print(destfolder, vname, DLCscorer)
-                    suffix = tr_method_suffix
-                    if filterpredictions:
-                        filtering.filterpredictions(
-                            config_2d,
-                            [video],
-                            videotype=videotype,
-                            shuffle=shuffle,
-                            trainingsetindex=trainingsetindex,
-                            filtertype=filtertype,
-                            destfolder=destfolder,
-                        )
-                        suffix += "_filtered"
-                    dataname.append(
-                        os.path.join(
-                            destfolder, vname + DLCscorer + suffix + ".h5"
-                        )
+            # Filtering waits for all views to be analyzed: PyTables does not
+            # support reading and writing HDF5 files from several threads.
+            # Every view is filtered with the model it was analyzed with.
+            for config_2d, shuffle, trainingsetindex, video in videos_to_filter:
+                filtering.filterpredictions(
+                    config_2d,
+                    video,
+                    videotype=videotype,
+                    shuffle=shuffle,
+                    trainingsetindex=trainingsetindex,
+                    filtertype=filtertype,
+                    destfolder=destfolder,
+                )
+
+            if run_triangulate:
+                #        if len(dataname)>0:
+                # undistort points for these views
+                print("Undistorting...")
+                (
+                    dataFrames_undistort,
+                    projection_matrices,
+                    stereo_file,
+                    path_stereo_file,
+                ) = undistort_views_points(config, dataname, cam_names)
+                stereomatrix = stereo_file[str(cam_names[0] + "-" + cam_names[1])]
+                num_frames = min(len(df) for df in dataFrames_undistort)
+                if any(len(df) != num_frames for df in dataFrames_undistort):
+                    warnings.warn(
+                        "The number of frames do not match in the videos. Please make sure that your videos have same number of frames and then retry! Excluding the extra frames from the longer videos."
                     )
+                    dataFrames_undistort = [
+                        df[:num_frames] for df in dataFrames_undistort
+                    ]
 
-        if run_triangulate:
-            #        if len(dataname)>0:
-            # undistort points for this pair
-            print("Undistorting...")
-            (
-                dataFrame_camera1_undistort,
-                dataFrame_camera2_undistort,
-                stereomatrix,
-                path_stereo_file,
-            ) = undistort_points(
-                config, dataname, str(cam_names[0] + "-" + cam_names[1])
-            )
-            if len(dataFrame_camera1_undistort) != len(dataFrame_camera2_undistort):
-                import warnings
+                bodyparts = dataFrames_undistort[0].columns.get_level_values(
+                    "bodyparts"
+                ).unique()
+
+                print("Computing the triangulation...")
+
+                ### Assign nan to [X,Y] of low likelihood predictions ###
+                for df in dataFrames_undistort:
+                    # Convert the data to a np array to easily mask out the low likelihood predictions
+                    data_tmp = df.to_numpy().reshape((num_frames, -1, 3))
+                    # Assign [X,Y] = nan to low likelihood predictions
+                    data_tmp[data_tmp[..., 2] < pcutoff, :2] = np.nan
+                    # put data back to the dataframes
+                    df[:] = data_tmp.reshape((num_frames, -1))
+
+                if cfg.get("multianimalproject"):
+                    # Check individuals are the same in all views
+                    individuals_views = [
+                        df.columns.get_level_values("individuals").unique().to_list()
+                        for df in dataFrames_undistort
+                    ]
+                    if any(inds != individuals_views[0] for inds in individuals_views):
+                        raise ValueError(
+                            "The individuals do not match between the DataFrames"
+                        )
 
-                warnings.warn(
-                    "The number of frames do not match in the two videos. Please make sure that your videos have same number of frames and then retry! Excluding the extra frames from the longer video."
-                )
-                if len(dataFrame_camera1_undistort) > len(dataFrame_camera2_undistort):
-                    dataFrame_camera1_undistort = dataFrame_camera1_undistort[
-                        : len(dataFrame_camera2_undistort)
+                    # Cross-view match individuals, pairing every view with the first one
+                    n_individuals = len(individuals_views[0])
+                    views_points = [
+                        df.to_numpy().reshape((num_frames, n_individuals, -1, 3))
+                        for df in dataFrames_undistort
                     ]
-                if len(dataFrame_camera2_undistort) > len(dataFrame_camera1_undistort):
-                    dataFrame_camera2_undistort = dataFrame_camera2_undistort[
-                        : len(dataFrame_camera1_undistort)
+                    matches = [np.tile(np.arange(n_individuals), (num_frames, 1))]
+                    for cam, points in zip(cam_names[1:], views_points[1:]):
+                        F = stereo_file[str(cam_names[0] + "-" + cam)]["F"]
+                        matches.append(
+                            auxiliaryfunctions_3d.cross_view_match(
+                                views_points[0][..., :2],
+                                points[..., :2],
+                                F,
+                                window=identity_window,
+                            )
+                        )
+                else:
+                    # Create a dummy variables for single-animal
+                    individuals_views = [["indie"]]
+                    views_points = [
+                        df.to_numpy().reshape((num_frames, 1, -1, 3))
+                        for df in dataFrames_undistort
                     ]
-            #                raise Exception("The number of frames do not match in the two videos. Please make sure that your videos have same number of frames and then retry!")
-            scorer_cam1 = dataFrame_camera1_undistort.columns.get_level_values(0)[0]
-            scorer_cam2 = dataFrame_camera2_undistort.columns.get_level_values(0)[0]
+                    matches = [np.zeros((num_frames, 1), dtype=int)] * len(views_points)
 
-            bodyparts = dataFrame_camera1_undistort.columns.get_level_values(
-                "bodyparts"
-            ).unique()
+                # Cleaner variable (since inds view1 == inds of the other views)
+                individuals = individuals_views[0]
 
-            P1 = stereomatrix["P1"]
-            P2 = stereomatrix["P2"]
-            F = stereomatrix["F"]
-
-            print("Computing the triangulation...")
-
-            num_frames = dataFrame_camera1_undistort.shape[0]
-            ### Assign nan to [X,Y] of low likelihood predictions ###
-            # Convert the data to a np array to easily mask out the low likelihood predictions
-            data_cam1_tmp = dataFrame_camera1_undistort.to_numpy().reshape(
-                (num_frames, -1, 3)
-            )
-            data_cam2_tmp = dataFrame_camera2_undistort.to_numpy().reshape(
-                (num_frames, -1, 3)
-            )
-            # Assign [X,Y] = nan to low likelihood predictions
-            data_cam1_tmp[data_cam1_tmp[..., 2] < pcutoff, :2] = np.nan
-            data_cam2_tmp[data_cam2_tmp[..., 2] < pcutoff, :2] = np.nan
-
-            # Reshape data back to original shape
-            data_cam1_tmp = data_cam1_tmp.reshape(num_frames, -1)
-            data_cam2_tmp = data_cam2_tmp.reshape(num_frames, -1)
-
-            # put data back to the dataframes
-            dataFrame_camera1_undistort[:] = data_cam1_tmp
-            dataFrame_camera2_undistort[:] = data_cam2_tmp
-
-            if cfg.get("multianimalproject"):
-                # Check individuals are the same in both views
-                individuals_view1 = (
-                    dataFrame_camera1_undistort.columns.get_level_values("individuals")
-                    .unique()
-                    .to_list()
-                )
-                individuals_view2 = (
-                    dataFrame_camera2_undistort.columns.get_level_values("individuals")
-                    .unique()
-                    .to_list()
+                # Reshape: (num_views, num_frames, num_individuals, num_bodyparts, 3),
+                # with the individuals of every view in the order of view 1
+                all_points = np.stack(
+                    [
+                        np.take_along_axis(points, match[:, :, None, None], axis=1)
+                        for points, match in zip(views_points, matches)
+                    ]
                 )
-                if individuals_view1 != individuals_view2:
-                    raise ValueError(
-                        "The individuals do not match between the two DataFrames"
-                    )
 
-                # Cross-view match individuals
-                _, voting = auxiliaryfunctions_3d.cross_view_match_dataframes(
-                    dataFrame_camera1_undistort, dataFrame_camera2_undistort, F
-                )
-            else:
-                # Create a dummy variables for single-animal
-                individuals_view1 = ["indie"]
-                voting = {0: 0}
-
-            # Cleaner variable (since inds view1 == inds view2)
-            individuals = individuals_view1
-
-            # Reshape: (num_framex, num_individuals, num_bodyparts , 2)
-            all_points_cam1 = dataFrame_camera1_undistort.to_numpy().reshape(
-                (num_frames, len(individuals), -1, 3)
-            )[..., :2]
-            all_points_cam2 = dataFrame_camera2_undistort.to_numpy().reshape(
-                (num_frames, len(individuals), -1, 3)
-            )[..., :2]
-
-            # Triangulate data
-            triangulate = []
-            for i, _ in enumerate(individuals):
-                # i is individual in view 1
-                # voting[i] is the matched individual in view 2
-
-                pts_indv_cam1 = all_points_cam1[:, i].reshape((-1, 2)).T
-                pts_indv_cam2 = all_points_cam2[:, voting[i]].reshape((-1, 2)).T
-
-                indv_points_3d = auxiliaryfunctions_3d.triangulatePoints(
-                    P1, P2, pts_indv_cam1, pts_indv_cam2
+                # Triangulate data, weighting the views by the likelihoods of the predictions
+                triangulate = auxiliaryfunctions_3d.triangulate_views(
+                    projection_matrices, all_points[..., :2], weights=all_points[..., 2]
                 )
-
-                indv_points_3d = indv_points_3d[:3].T.reshape((num_frames, -1, 3))
-
-                triangulate.append(indv_points_3d)
-
-            triangulate = np.asanyarray(triangulate)
-            metadata = {}
-            metadata["stereo_matrix"] = stereomatrix
-            metadata["stereo_matrix_file"] = path_stereo_file
-            metadata["scorer_name"] = {
-                cam_names[0]: scorer_name[cam_names[0]],
-                cam_names[1]: scorer_name[cam_names[1]],
-            }
-
-            # Create 3D DataFrame column and row indices
-            axis_labels = ("x", "y", "z")
-            if cfg.get("multianimalproject"):
-                columns = pd.MultiIndex.from_product(
-                    [[scorer_3d], individuals, bodyparts, axis_labels],
-                    names=["scorer", "individuals", "bodyparts", "coords"],
+                errors = auxiliaryfunctions_3d.reprojection_errors(
+                    projection_matrices, triangulate, all_points[..., :2]
                 )
+                # Average over the views that saw each point
+                n_views = np.isfinite(errors).sum(axis=0)
+                errors = np.nansum(errors, axis=0) / np.maximum(n_views, 1)
+                errors[n_views == 0] = np.nan
+
+                metadata = {}
+                metadata["stereo_matrix"] = stereomatrix
+                metadata["stereo_matrix_file"] = path_stereo_file
+                metadata["scorer_name"] = {cam: scorer_name[cam] for cam in cam_names}
+                if np.isfinite(errors).any():
+                    metadata["mean_reprojection_error"] = np.nanmean(errors)
+                    print(
+                        "Mean reprojection error: %.2f pixels"
+                        % metadata["mean_reprojection_error"]
+                    )
 
-            else:
-                columns = pd.MultiIndex.from_product(
-                    [[scorer_3d], bodyparts, axis_labels],
-                    names=["scorer", "bodyparts", "coords"],
-                )
+                # Create 3D DataFrame column and row indices
+                axis_labels = ("x", "y", "z")
+                if cfg.get("multianimalproject"):
+                    columns = pd.MultiIndex.from_product(
+                        [[scorer_3d], individuals, bodyparts, axis_labels],
+                        names=["scorer", "individuals", "bodyparts", "coords"],
+                    )
 
-            inds = range(num_frames)
+                else:
+                    columns = pd.MultiIndex.from_product(
+                        [[scorer_3d], bodyparts, axis_labels],
+                        names=["scorer", "bodyparts", "coords"],
+                    )
 
-            # Swap num_animals with num_frames axes to ensure well-behaving reshape
-            triangulate = triangulate.swapaxes(0, 1).reshape((num_frames, -1))
+                inds = range(num_frames)
 
-            # Fill up 3D dataframe
-            df_3d = pd.DataFrame(triangulate, columns=columns, index=inds)
+                # Fill up 3D dataframe
+                df_3d = pd.DataFrame(
+                    triangulate.reshape((num_frames, -1)), columns=columns, index=inds
+                )
 
-            df_3d.to_hdf(
-                str(output_filename + ".h5"),
-                "df_with_missing",
-                format="table",
-                mode="w",
-            )
+                df_3d.to_hdf(
+                    str(output_filename + ".h5"),
+                    "df_with_missing",
+                    format="table",
+                    mode="w",
+                )
 
-            # Reorder 2D dataframe in view 2 to match order of view 1
-            if cfg.get("multianimalproject"):
-                df_2d_view2 = pd.read_hdf(dataname[1])
-                individuals_order = [individuals[i] for i in list(voting.values())]
-                df_2d_view2 = auxfun_multianimal.reorder_individuals_in_df(df_2d_view2, individuals_order)
-                df_2d_view2.to_hdf(dataname[1], "tracks", format="table", mode="w",)
+                # Save the reprojection error of every triangulated point (in pixels)
+                df_errors = pd.DataFrame(
+                    errors.reshape((num_frames, -1)),
+                    columns=columns.droplevel("coords").unique(),
+                    index=inds,
+                )
+                df_errors.to_hdf(
+                    str(output_filename + "_reprojection.h5"),
+                    "df_with_missing",
+                    format="table",
+                    mode="w",
+                )
 
-            auxiliaryfunctions_3d.SaveMetadata3d(
-                str(output_filename + "_meta.pickle"), metadata
-            )
+                # Reorder 2D dataframes in the other views to match order of view 1
+                if cfg.get("multianimalproject"):
+                    for filename, match in zip(dataname[1:], matches[1:]):
+                        df_2d_view = pd.read_hdf(filename)
+                        data = df_2d_view.to_numpy().reshape(
+                            (len(df_2d_view), len(individuals), -1)
+                        )
+                        # Individuals are matched frame by frame
+                        data[:num_frames] = np.take_along_axis(
+                            data[:num_frames], match[:, :, None], axis=1
+                        )
+                        df_2d_view = pd.DataFrame(
+                            data.reshape((len(df_2d_view), -1)),
+                            columns=df_2d_view.columns,
+                            index=df_2d_view.index,
+                        )
+                        df_2d_view.to_hdf(filename, "tracks", format="table", mode="w",)
 
-            if save_as_csv:
-                df_3d.to_csv(str(output_filename + ".csv"))
+                auxiliaryfunctions_3d.SaveMetadata3d(
+                    str(output_filename + "_meta.pickle"), metadata
+                )
 
-            print("Triangulated data for video", video_list[i])
-            print("Results are saved under: ", destfolder)
-            # have to make the dest folder none so that it can be updated for a new pair of videos
-            if destfolder == str(Path(video).parents[0]):
-                destfolder = None
+                if save_as_csv:
+                    df_3d.to_csv(str(output_filename + ".csv"))
 
+                print("Triangulated data for video", video_list[i])
+                print("Results are saved under: ", destfolder)
+                # have to make the dest folder none so that it can be updated for a new pair of videos
+                if destfolder == str(Path(video).parents[0]):
+                    destfolder = None
+    finally:
+        session_cache.clear()
     if len(video_list) > 0:
         print("All videos were analyzed...")
         print("Now you can create 3D video(s) using deeplabcut.create_labeled_video_3d")
@@ -575,3 +610,49 @@ def undistort_points(config, dataframe, camera_pair):
         stereo_file[camera_pair],
         path_stereo_file,
     )
+
+
+def undistort_views_points(config, dataframes, cam_names):
+    """
+    Undistorts the 2D predictions of all the camera views.
+
+    The first two views are undistorted and rectified as by ``undistort_points``.
+    Every other camera, stereo-calibrated with the first one, is undistorted in its
+    own pixel coordinates and projected from the rectified frame of the first pair.
+
+    Returns the undistorted DataFrames, the projection matrices of the views, the
+    stereo parameters and the path to their file.
+    """
+    if len(dataframes) != len(cam_names):
+        raise ValueError(
+            f"Expected one data frame per camera {cam_names}, but got {dataframes}."
+        )
+    camera_pair = str(cam_names[0] + "-" + cam_names[1])
+    df_cam1, df_cam2, stereomatrix, path_stereo_file = undistort_points(
+        config, dataframes[:2], camera_pair
+    )
+    stereo_file = auxiliaryfunctions.read_pickle(path_stereo_file)
+    dfs = [df_cam1, df_cam2]
+    projection_matrices = [stereomatrix["P1"], stereomatrix["P2"]]
+    # Rotation from the first camera's coordinates to the rectified frame
+    R1 = stereomatrix["R1"]
+    for filename, cam in zip(dataframes[2:], cam_names[2:]):
+        camera_pair = str(cam_names[0] + "-" + cam)
+        if camera_pair not in stereo_file:
+            raise ValueError(
+                f"No stereo calibration found for the cameras {camera_pair}. Please re-run calibrate_cameras."
+            )
+        params = stereo_file[camera_pair]
+        df_view = pd.read_hdf(filename)
+        pts_undist = _undistort_points(
+            df_view.to_numpy(),
+            params["cameraMatrix2"],
+            params["distCoeffs2"],
+            params["cameraMatrix2"],
+            None,
+        )
+        dfs.append(pd.DataFrame(pts_undist, df_view.index, df_view.columns))
+        projection_matrices.append(
+            params["cameraMatrix2"] @ np.c_[params["R"] @ R1.T, params["T"]]
+        )
+    return dfs, np.stack(projection_matrices), stereo_file, path_stereo_file
@@ -0,0 +1,199 @@
+"""
+DeepLabCut2.0 Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+https://github.com/DeepLabCut/DeepLabCut
+Please see AUTHORS for contributors.
+
+https://github.com/DeepLabCut/DeepLabCut/blob/master/AUTHORS
+Licensed under GNU Lesser General Public License v3.0
+
+Choice of the inference batch size, used by ``analyze_videos(..., batchsize="auto")``.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from deeplabcut.utils import auxiliaryfunctions
+
+CANDIDATE_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def device_name(sess):
+    """Name of the device a session runs on, as used in the cache keys."""
+    from deeplabcut.pose_estimation_tensorflow.core.onnx.session import ONNXSession
+    from deeplabcut.pose_estimation_tensorflow.core.openvino.session import (
+        OpenVINOSession,
+    )
+
+    if isinstance(sess, OpenVINOSession):
+        return f"OpenVINO-{sess.device}"
+    if isinstance(sess, ONNXSession):
+        return f"onnxruntime-CPU{os.cpu_count()}"
+    gpus = tf.config.list_physical_devices("GPU")
+    if gpus:
+        details = tf.config.experimental.get_device_details(gpus[0])
+        return details.get("device_name", "GPU")
+    return f"CPU{os.cpu_count()}"
+
+
+def read_frames(video, n_frames, cropping=None):
+    """Read (at most) the first n_frames RGB frames of a video.
+
+    cropping : (x1, x2, y1, y2), optional
+    """
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < n_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if cropping is not None:
+            x1, x2, y1, y2 = cropping
+            frame = frame[y1:y2, x1:x2]
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise IOError(f"No frame could be read from {video}.")
+    return np.stack(frames)
+
+
+def _reset_gpu_memory_stats():
+    try:
+        tf.config.experimental.reset_memory_stats("GPU:0")
+    except (ValueError, RuntimeError):
+        pass
+
+
+def _peak_gpu_memory():
+    try:
+        return tf.config.experimental.get_memory_info("GPU:0")["peak"]
+    except (ValueError, RuntimeError):
+        return None
+
+
+def benchmark_batch_sizes(
+    sess, inputs, outputs, frames, candidates=CANDIDATE_BATCH_SIZES, n_runs=3,
+    min_gain=0.05,
+):
+    """Measure the inference throughput (in frames/s) for increasing batch sizes.
+
+    Batches are filled with the given frames, repeated if necessary. The search
+    stops once doubling the batch size twice in a row gains less than ``min_gain``,
+    or when the device runs out of memory. Backends report allocation failures
+    with their own exceptions (TensorFlow, onnxruntime and OpenVINO all differ),
+    so any error at a batch size larger than the first candidate ends the search;
+    at the first candidate, only out-of-memory errors are swallowed.
+
+    Returns
+    -------
+    dict
+        Batch size -> {"fps": throughput, "peak_memory": GPU bytes or None}.
+    """
+    results = {}
+    best_fps = 0
+    n_stalled = 0
+    for i, batchsize in enumerate(candidates):
+        batch = frames[np.arange(batchsize) % len(frames)]
+        _reset_gpu_memory_stats()
+        try:
+            sess.run(outputs, feed_dict={inputs: batch})  # Warm-up
+            times = []
+            for _ in range(n_runs):
+                start = time.perf_counter()
+                sess.run(outputs, feed_dict={inputs: batch})
+                times.append(time.perf_counter() - start)
+        except (tf.errors.ResourceExhaustedError, MemoryError):
+            print(f"Batch size {batchsize} exceeds the available memory.")
+            break
+        except Exception as e:
+            if i == 0:
+                raise
+            print(f"Inference failed with a batch size of {batchsize} ({e!r}).")
+            break
+        fps = batchsize / np.median(times)
+        results[batchsize] = {"fps": float(fps), "peak_memory": _peak_gpu_memory()}
+        if fps > best_fps * (1 + min_gain):
+            n_stalled = 0
+        else:
+            n_stalled += 1
+            if n_stalled == 2:
+                break
+        best_fps = max(best_fps, fps)
+    return results
+
+
+def pick_batch_size(results, tolerance=0.05):
+    """Knee of the throughput curve: the smallest batch size reaching at least
+    (1 - tolerance) of the best throughput. Smaller batches use less memory and
+    have a lower latency."""
+    best_fps = max(res["fps"] for res in results.values())
+    return min(
+        batchsize
+        for batchsize, res in results.items()
+        if res["fps"] >= (1 - tolerance) * best_fps
+    )
+
+
+class BatchSizeTuner:
+    """Pick, and cache, the batch size maximizing the throughput of a model.
+
+    Choices are cached in a YAML file per (model, resolution, device), so
+    calibration only runs for the first video of a given resolution.
+    """
+
+    def __init__(self, sess, inputs, outputs, cache_file, model):
+        self.sess = sess
+        self.inputs = inputs
+        self.outputs = outputs
+        self.cache_file = cache_file
+        self.model = model
+        self.device = device_name(sess)
+
+    def _load_cache(self):
+        if os.path.isfile(self.cache_file):
+            return auxiliaryfunctions.read_plainconfig(self.cache_file) or {}
+        return {}
+
+    def tune(self, video, cropping=None, n_frames=16):
+        """Return the batch size to analyze a video with, and the details of the
+        calibration (which are logged in the metadata).
+
+        Calibration batches are made of the first ``n_frames`` frames of the video.
+        """
+        if cropping is not None:
+            x1, x2, y1, y2 = cropping
+            height, width = y2 - y1, x2 - x1
+        else:
+            cap = cv2.VideoCapture(video)
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            cap.release()
+        key = f"{self.model}|{height}x{width}|{self.device}"
+        cache = self._load_cache()
+        if key in cache:
+            info = dict(cache[key])
+            info["cached"] = True
+            print(f"Using the cached batch size {info['batch_size']} for {key}.")
+            return info["batch_size"], info
+
+        print("Calibrating the batch size on the first frames of", video)
+        frames = read_frames(video, n_frames, cropping)
+        results = benchmark_batch_sizes(self.sess, self.inputs, self.outputs, frames)
+        if not results:
+            raise MemoryError("Inference failed even with a batch size of 1.")
+        batchsize = pick_batch_size(results)
+        for b, res in results.items():
+            print(f"  batch size {b}: {res['fps']:.1f} frames/s")
+        print(f"Selected batch size: {batchsize}")
+        info = {
+            "batch_size": batchsize,
+            "fps": {b: res["fps"] for b, res in results.items()},
+            "peak_memory": {b: res["peak_memory"] for b, res in results.items()},
+        }
+        cache[key] = info
+        auxiliaryfunctions.write_plainconfig(self.cache_file, cache)
+        return batchsize, dict(info, cached=False)
@@ -491,6 +491,53 @@ def return_evaluate_network_data(
             return results
 
 
+def _read_images_by_shape(project_path, image_paths, scale=1):
+    """Read the labeled images (rescaled by ``scale``) once, grouped by shape so that
+    images of the same size can be evaluated in batches.
+
+    Returns a dict mapping every image shape to the indices of its images in
+    ``image_paths`` and the images stacked in a uint8 array.
+    """
+    from deeplabcut.utils.auxfun_videos import imread, imresize
+
+    groups = {}
+    for imageindex, imagename in enumerate(tqdm(image_paths, desc="Reading images")):
+        image = imread(os.path.join(project_path, *imagename), mode="skimage")
+        if scale != 1:
+            image = imresize(image, scale)
+        groups.setdefault(image.shape, []).append((imageindex, image))
+    return {
+        shape: (np.array([i for i, _ in group]), np.stack([im for _, im in group]))
+        for shape, group in groups.items()
+    }
+
+
+def _predict_images(images_by_shape, n_images, dlc_cfg, sess, inputs, outputs):
+    """Predict the pose in every image, ``dlc_cfg["batch_size"]`` same-size images
+    at a time; the last batch of every size is padded with copies of its last image.
+    """
+    from deeplabcut.pose_estimation_tensorflow.core import predict
+
+    batch_size = dlc_cfg["batch_size"]
+    poses = np.zeros((n_images, 3 * len(dlc_cfg["all_joints_names"])))
+    with tqdm(total=n_images) as pbar:
+        for inds, images in images_by_shape.values():
+            for start in range(0, len(inds), batch_size):
+                batch = images[start : start + batch_size]
+                n = len(batch)
+                if n < batch_size:
+                    batch = np.concatenate(
+                        (batch, np.repeat(batch[-1:], batch_size - n, axis=0))
+                    )
+                outputs_np = sess.run(outputs, feed_dict={inputs: batch})
+                scmap, locref = predict.extract_cnn_outputmulti(outputs_np, dlc_cfg)
+                # Maximum scoring location of every heatmap, assuming 1 animal
+                pose = predict.batched_pose_predict(scmap, locref, dlc_cfg["stride"])
+                poses[inds[start : start + n]] = pose[:n]
+                pbar.update(n)
+    return poses
+
+
 def evaluate_network(
     config,
     Shuffles=[1],
@@ -501,6 +548,8 @@ def evaluate_network(
     gputouse=None,
     rescale=False,
     modelprefix="",
+    precision="float32",
+    batch_size=1,
 ):
     """Evaluates the network.
 
@@ -554,6 +603,20 @@ def evaluate_network(
         Directory containing the deeplabcut models to use when evaluating the network.
         By default, the models are assumed to exist in the project folder.
 
+    precision: str, optional, default="float32"
+        Evaluate a reduced precision ONNX export of the snapshots, ``"int8"``
+        (experimental, see ``deeplabcut.export_model``), with ONNX Runtime. The models are exported next to the snapshots if they do not exist.
+        The float32 model is evaluated first (unless already done) and its errors
+        are reported alongside, so that the accuracy cost can be assessed.
+        Results are stored under the scorer name suffixed with the precision.
+        Single animal projects only.
+
+    batch_size: int, optional, default=1
+        Number of images of the same size evaluated at once. Note that MobileNet and
+        EfficientNet backbones (and the multi-stage decoder of DLCRNet) normalize
+        their activations with batch statistics, so their predictions depend on the
+        images batched together; the default of 1 keeps them reproducible.
+
     Returns
     -------
     None
@@ -597,6 +660,11 @@ def evaluate_network(
     if cfg.get("multianimalproject", False):
         from .evaluate_multianimal import evaluate_multianimal_full
 
+        if precision != "float32":
+            raise ValueError(
+                "Reduced precision evaluation is only available for single animal projects."
+            )
+
         # TODO: Make this code not so redundant!
         evaluate_multianimal_full(
             config=config,
@@ -606,9 +674,9 @@ def evaluate_network(
             comparisonbodyparts=comparisonbodyparts,
             gputouse=gputouse,
             modelprefix=modelprefix,
+            batch_size=batch_size,
         )
     else:
-        from deeplabcut.utils.auxfun_videos import imread, imresize
         from deeplabcut.pose_estimation_tensorflow.core import predict
         from deeplabcut.pose_estimation_tensorflow.config import load_config
         from deeplabcut.pose_estimation_tensorflow.datasets.utils import data_to_input
@@ -618,6 +686,19 @@ def evaluate_network(
         # If a string was passed in, auto-convert to True for backward compatibility
         plotting = bool(plotting)
 
+        if precision != "float32":
+            # The reference errors of the float32 model are needed for the report
+            evaluate_network(
+                config,
+                Shuffles=Shuffles,
+                trainingsetindex=trainingsetindex,
+                show_errors=False,
+                comparisonbodyparts=comparisonbodyparts,
+                gputouse=gputouse,
+                rescale=rescale,
+                modelprefix=modelprefix,
+            )
+
         if "TF_CUDNN_USE_AUTOTUNE" in os.environ:
             del os.environ[
                 "TF_CUDNN_USE_AUTOTUNE"
@@ -667,6 +748,9 @@ def evaluate_network(
         auxiliaryfunctions.attempttomakefolder(
             str(cfg["project_path"] + "/evaluation-results/")
         )
+        # Images are read once for all shuffles and snapshots evaluated at a scale
+        images_by_shape = None
+        images_scale = None
         for shuffle in Shuffles:
             for trainFraction in TrainingFractions:
                 ##################################################
@@ -703,8 +787,8 @@ def evaluate_network(
                         % (shuffle, trainFraction)
                     )
 
-                # change batch size, if it was edited during analysis!
-                dlc_cfg["batch_size"] = 1  # in case this was edited for analysis.
+                # Images of the same size are evaluated in batches
+                dlc_cfg["batch_size"] = batch_size if precision == "float32" else 1
 
                 # Create folder structure to store results.
                 evaluationfolder = os.path.join(
@@ -772,6 +856,9 @@ def evaluate_network(
                 ##################################################
                 # Compute predictions over images
                 ##################################################
+                # The network is built once, and only the weights of every
+                # snapshot are restored into it.
+                sess = restorer = None
                 for snapindex in snapindices:
                     dlc_cfg["init_weights"] = os.path.join(
                         str(modelfolder), "train", Snapshots[snapindex]
@@ -790,6 +877,19 @@ def evaluate_network(
                         trainingsiterations,
                         modelprefix=modelprefix,
                     )
+                    if precision != "float32":
+                        (
+                            _,
+                            resultsfilename_ref,
+                            DLCscorer_ref,
+                        ) = auxiliaryfunctions.check_if_not_evaluated(
+                            str(evaluationfolder),
+                            DLCscorer,
+                            DLCscorerlegacy,
+                            Snapshots[snapindex],
+                        )
+                        DLCscorer += "_" + precision
+                        DLCscorerlegacy += "_" + precision
                     print(
                         "Running ",
                         DLCscorer,
@@ -807,41 +907,49 @@ def evaluate_network(
                         Snapshots[snapindex],
                     )
                     if notanalyzed:
+                        if images_by_shape is None or images_scale != scale:
+                            images_by_shape = _read_images_by_shape(
+                                cfg["project_path"], Data.index, scale
+                            )
+                            images_scale = scale
                         # Specifying state of model (snapshot / training state)
-                        sess, inputs, outputs = predict.setup_pose_prediction(dlc_cfg)
-                        Numimages = len(Data.index)
-                        PredicteData = np.zeros(
-                            (Numimages, 3 * len(dlc_cfg["all_joints_names"]))
-                        )
-                        print("Running evaluation ...")
-                        for imageindex, imagename in tqdm(enumerate(Data.index)):
-                            image = imread(
-                                os.path.join(cfg["project_path"], *imagename),
-                                mode="skimage",
+                        if precision != "float32":
+                            sess, inputs, outputs = predict.setup_onnx_pose_prediction(
+                                dlc_cfg, precision=precision
                             )
-                            if scale != 1:
-                                image = imresize(image, scale)
-
-                            image_batch = data_to_input(image)
-                            # Compute prediction with the CNN
-                            outputs_np = sess.run(
-                                outputs, feed_dict={inputs: image_batch}
+                        elif sess is None:
+                            sess, inputs, outputs = predict.setup_pose_prediction(
+                                dlc_cfg
                             )
-                            scmap, locref = predict.extract_cnn_output(
-                                outputs_np, dlc_cfg
+                            restorer = tf.compat.v1.train.Saver()
+                        else:
+                            restorer.restore(sess, dlc_cfg["init_weights"])
+                        Numimages = len(Data.index)
+                        print("Running evaluation ...")
+                        if precision != "float32":
+                            PredicteData = np.zeros(
+                                (Numimages, 3 * len(dlc_cfg["all_joints_names"]))
                             )
-
-                            # Extract maximum scoring location from the heatmap, assume 1 person
-                            pose = predict.argmax_pose_predict(
-                                scmap, locref, dlc_cfg["stride"]
+                            for inds, images in images_by_shape.values():
+                                for imageindex, image in zip(inds, tqdm(images)):
+                                    # The ONNX model decodes the pose as y, x, likelihood
+                                    pose = sess.run(
+                                        outputs[0],
+                                        feed_dict={inputs: data_to_input(image)},
+                                    )
+                                    pose = pose[:, [1, 0, 2]]
+                                    PredicteData[imageindex] = pose.flatten()
+                            sess.close()
+                        else:
+                            # NOTE: thereby cfg_test['all_joints_names'] should be same order as bodyparts!
+                            PredicteData = _predict_images(
+                                images_by_shape,
+                                Numimages,
+                                dlc_cfg,
+                                sess,
+                                inputs,
+                                outputs,
                             )
-                            PredicteData[
-                                imageindex, :
-                            ] = (
-                                pose.flatten()
-                            )  # NOTE: thereby     cfg_test['all_joints_names'] should be same order as bodyparts!
-
-                        sess.close()  # closes the current tf session
 
                         index = pd.MultiIndex.from_product(
                             [
@@ -925,6 +1033,35 @@ def evaluate_network(
                             print(
                                 "Thereby, the errors are given by the average distances between the labels by DLC and the scorer."
                             )
+                            if precision != "float32":
+                                DataReference = pd.read_hdf(resultsfilename_ref)
+                                conversioncode.guarantee_multiindex_rows(DataReference)
+                                RMSE_ref, _ = pairwisedistances(
+                                    pd.concat(
+                                        [Data.T, DataReference.T], axis=0, sort=False
+                                    ).T,
+                                    cfg["scorer"],
+                                    DLCscorer_ref,
+                                    cfg["pcutoff"],
+                                    comparisonbodyparts,
+                                )
+                                print(
+                                    "The float32 model has a train error of",
+                                    np.round(
+                                        np.nanmean(
+                                            RMSE_ref.iloc[trainIndices].values.flatten()
+                                        ),
+                                        2,
+                                    ),
+                                    "pixels and a test error of",
+                                    np.round(
+                                        np.nanmean(
+                                            RMSE_ref.iloc[testIndices].values.flatten()
+                                        ),
+                                        2,
+                                    ),
+                                    "pixels.",
+                                )
 
                         if plotting:
                             print("Plotting...")
@@ -945,7 +1082,6 @@ def evaluate_network(
                                 foldername,
                             )  # Rescaling coordinates to have figure in original size!
 
-                        tf.compat.v1.reset_default_graph()
                         # print(final_result)
                     else:
                         DataMachine = pd.read_hdf(resultsfilename)
@@ -974,6 +1110,10 @@ def evaluate_network(
                                 foldername,
                             )
 
+                if sess is not None and precision == "float32":
+                    sess.close()  # closes the current tf session
+                    tf.compat.v1.reset_default_graph()
+
                 if len(final_result) > 0:  # Only append if results were calculated
                     make_results_file(final_result, evaluationfolder, DLCscorer)
                     print(
@@ -96,6 +96,128 @@ def _calc_train_test_error(data, metadata, pcutoff=0.3):
     return error_train, error_test, error_train_cut, error_test_cut
 
 
+def _batches_by_shape(project_path, image_paths, batch_size, image_shape=None):
+    """Split the images into batches of at most ``batch_size`` images of the same
+    shape, as lists of indices into ``image_paths``.
+
+    Image shapes are read from the file headers only; if ``image_shape`` is given,
+    all images are assumed to have that shape (e.g., after resizing).
+    """
+    from PIL import Image
+
+    groups = {}
+    for imageindex, imagename in enumerate(image_paths):
+        shape = image_shape
+        if shape is None:
+            with Image.open(os.path.join(project_path, *imagename)) as image:
+                shape = image.size
+        groups.setdefault(shape, []).append(imageindex)
+    return [
+        inds[start : start + batch_size]
+        for inds in groups.values()
+        for start in range(0, len(inds), batch_size)
+    ]
+
+
+def _ground_truth_layout(Data, joints, all_bpts):
+    """Ground truth (individual, body part) rows of the annotations, sorted like the
+    joints, as in ``Data.iloc[i].unstack("coords").reindex(joints, level="bodyparts")``.
+
+    Returns the rows' index, the positions of the rows among the (x, y) pairs of a
+    row of Data, and, for every joint, its index, its rows, and their columns in
+    the distance tables.
+    """
+    index_gt = Data.iloc[0].unstack("coords").reindex(joints, level="bodyparts").index
+    row_pairs = Data.columns.get_indexer([(*row, "x") for row in index_gt]) // 2
+    bpts_gt = index_gt.get_level_values("bodyparts").to_numpy()
+    rows_per_joint = []
+    for bpt in pd.unique(bpts_gt):
+        rows = np.flatnonzero(bpts_gt == bpt)
+        cols = np.flatnonzero(all_bpts == bpt)[: len(rows)]
+        rows_per_joint.append((joints.index(bpt), rows, cols))
+    return index_gt, row_pairs, rows_per_joint
+
+
+def _predict_batch(dlc_cfg, frames, xy_gt, bpts_gt, sess, inputs, outputs, batch_size):
+    """Predict the peaks and costs of a batch of images, and the costs of their
+    ground truth ``xy_gt``, of shape (n_images, n_rows, 2).
+
+    A batch smaller than ``batch_size`` is padded with its last image; only the
+    predictions of the actual images are returned.
+    """
+    from deeplabcut.pose_estimation_tensorflow.core import (
+        predict_multianimal as predictma,
+    )
+
+    joints = dlc_cfg["all_joints_names"]
+    stride = dlc_cfg["stride"]
+    # Form 2D array of shape (n_rows, 4) where the last dimension
+    # is (sample_index, peak_y, peak_x, bpt_index) to slice the PAFs.
+    samples, inds = np.nonzero(~np.isnan(xy_gt).any(axis=2))
+    peaks_gt = np.c_[
+        samples,
+        (xy_gt[samples, inds, ::-1] - stride // 2) / stride,
+        [joints.index(bpt) for bpt in bpts_gt[inds]],
+    ]
+    n_frames = len(frames)
+    if n_frames < batch_size:
+        frames = np.concatenate(
+            (frames, np.repeat(frames[-1:], batch_size - n_frames, axis=0))
+        )
+    preds = predictma.predict_batched_peaks_and_costs(
+        dlc_cfg, frames, sess, inputs, outputs, peaks_gt.astype(int),
+    )
+    return preds[:n_frames]
+
+
+def _match_to_ground_truth(pred, xy_gt, identity_gt, rows_per_joint, n_bpts):
+    """Match the predictions of an image to its ground truth ``xy_gt``, of shape
+    (n_rows, 2).
+
+    Returns the ground truth identities and coordinates, as stored in the
+    _full.pickle data, and the distances to (and confidences of) the closest
+    predictions, in the columns of the distance tables.
+    """
+    coords_pred = pred["coordinates"][0]
+    probs_pred = pred["confidence"]
+    # FIXME Is having an empty array vs nan really that necessary?!
+    found_gt = ~np.isnan(xy_gt).any(axis=1)
+    groundtruthidentity = [
+        np.array([identity], dtype=object) if found else np.array([], dtype=str)
+        for identity, found in zip(identity_gt, found_gt)
+    ]
+    groundtruthcoordinates = [
+        coords[np.newaxis] if found else np.empty((0, 2), dtype=float)
+        for coords, found in zip(xy_gt, found_gt)
+    ]
+    dist = np.full(n_bpts, np.nan)
+    conf = np.full(n_bpts, np.nan)
+    for n_joint, rows, cols in rows_per_joint:
+        inds_gt = np.flatnonzero(found_gt[rows])
+        xy = coords_pred[n_joint]
+        if inds_gt.size and xy.size:
+            # Pick the predictions closest to ground truth,
+            # rather than the ones the model has most confident in
+            xy_gt_values = xy_gt[rows[inds_gt]]
+            neighbors = _find_closest_neighbors(xy_gt_values, xy, k=3)
+            found = neighbors != -1
+            sl = cols[inds_gt[found]]
+            dist[sl] = np.linalg.norm(
+                xy_gt_values[found] - xy[neighbors[found]], axis=1
+            )
+            conf[sl] = probs_pred[n_joint][neighbors[found]].squeeze()
+    return groundtruthidentity, groundtruthcoordinates, dist, conf
+
+
+def _in_image_order(PredicteData, image_names):
+    """Key the evaluation data, collected batch by batch, by image name, in the
+    order of the images in the dataset."""
+    return {
+        image_names[imageindex]: PredicteData[imageindex]
+        for imageindex in sorted(PredicteData)
+    }
+
+
 def evaluate_multianimal_full(
     config,
     Shuffles=[1],
@@ -105,11 +227,9 @@ def evaluate_multianimal_full(
     comparisonbodyparts="all",
     gputouse=None,
     modelprefix="",
+    batch_size=1,
 ):
-    from deeplabcut.pose_estimation_tensorflow.core import (
-        predict,
-        predict_multianimal as predictma,
-    )
+    from deeplabcut.pose_estimation_tensorflow.core import predict
     from deeplabcut.utils import (
         auxiliaryfunctions,
         auxfun_multianimal,
@@ -160,6 +280,9 @@ def evaluate_multianimal_full(
         len(cfg["individuals"]) * cfg["multianimalbodyparts"] + cfg["uniquebodyparts"]
     )
     colors = visualization.get_cmap(len(comparisonbodyparts), name=cfg["colormap"])
+    # Human annotations of all images at once, as (x, y) pairs in column order
+    xy_all = Data.to_numpy().reshape((len(Data), -1, 2))
+    has_gt = np.any((xy_all != 0) & ~np.isnan(xy_all), axis=(1, 2))
     # Make folder for evaluation
     auxiliaryfunctions.attempttomakefolder(
         str(cfg["project_path"] + "/evaluation-results/")
@@ -206,14 +329,28 @@ def evaluate_multianimal_full(
                 width, height = pre_resize
                 pipeline.add(iaa.Resize({"height": height, "width": width}))
 
-            # TODO: IMPLEMENT for different batch sizes?
-            dlc_cfg["batch_size"] = 1  # due to differently sized images!!!
+            # Differently sized images are batched separately
+            dlc_cfg["batch_size"] = batch_size
+            batches = _batches_by_shape(
+                cfg["project_path"],
+                Data.index[has_gt],
+                batch_size,
+                tuple(pre_resize) if pre_resize else None,
+            )
+            batches = [np.flatnonzero(has_gt)[batch] for batch in batches]
 
-            stride = dlc_cfg["stride"]
             # Ignore best edges possibly defined during a prior evaluation
             _ = dlc_cfg.pop("paf_best", None)
             joints = dlc_cfg["all_joints_names"]
 
+            # Ground truth (individual, body part) rows, sorted like the joints;
+            # row_pairs maps them to the (x, y) pairs of xy_all.
+            index_gt, row_pairs, rows_per_joint = _ground_truth_layout(
+                Data, joints, all_bpts
+            )
+            identity_gt = index_gt.get_level_values("individuals").to_numpy()
+            bpts_gt = index_gt.get_level_values("bodyparts").to_numpy()
+
             # Create folder structure to store results.
             evaluationfolder = os.path.join(
                 cfg["project_path"],
@@ -260,6 +397,9 @@ def evaluate_multianimal_full(
                 ##################################################
                 # Compute predictions over images
                 ##################################################
+                # The network is built once, and only the weights of every
+                # snapshot are restored into it.
+                sess = restorer = None
                 for snapindex in snapindices:
                     dlc_cfg["init_weights"] = os.path.join(
                         str(modelfolder), "train", Snapshots[snapindex]
@@ -310,143 +450,120 @@ def evaluate_multianimal_full(
                         print("Model already evaluated.", resultsfilename)
                     else:
 
-                        (sess, inputs, outputs,) = predict.setup_pose_prediction(
-                            dlc_cfg
-                        )
+                        if sess is None:
+                            sess, inputs, outputs = predict.setup_pose_prediction(
+                                dlc_cfg
+                            )
+                            restorer = tf.compat.v1.train.Saver()
+                        else:
+                            restorer.restore(sess, dlc_cfg["init_weights"])
 
                         PredicteData = {}
                         dist = np.full((len(Data), len(all_bpts)), np.nan)
                         conf = np.full_like(dist, np.nan)
                         print("Network Evaluation underway...")
-                        for imageindex, imagename in tqdm(enumerate(Data.index)):
-                            image_path = os.path.join(cfg["project_path"], *imagename)
-                            frame = auxfun_videos.imread(image_path, mode="skimage")
-
-                            GT = Data.iloc[imageindex]
-                            if not GT.any():
-                                continue
-
-                            # Pass the image and the keypoints through the resizer;
+                        pbar = tqdm(total=sum(map(len, batches)))
+                        for batch in batches:
+                            pbar.update(len(batch))
+                            image_paths = [
+                                os.path.join(cfg["project_path"], *Data.index[i])
+                                for i in batch
+                            ]
+                            frames = [
+                                auxfun_videos.imread(image_path, mode="skimage")
+                                for image_path in image_paths
+                            ]
+                            # Pass the images and the keypoints through the resizer;
                             # this has no effect if no augmenters were added to it.
-                            keypoints = [GT.to_numpy().reshape((-1, 2)).astype(float)]
-                            frame_, keypoints = pipeline(
-                                images=[frame], keypoints=keypoints
+                            frames, keypoints = pipeline(
+                                images=frames, keypoints=list(xy_all[batch])
                             )
-                            frame = frame_[0]
-                            GT[:] = keypoints[0].flatten()
+                            frames = np.stack(frames)
 
-                            df = GT.unstack("coords").reindex(joints, level="bodyparts")
-
-                            # FIXME Is having an empty array vs nan really that necessary?!
-                            groundtruthidentity = list(
-                                df.index.get_level_values("individuals")
-                                .to_numpy()
-                                .reshape((-1, 1))
-                            )
-                            groundtruthcoordinates = list(df.values[:, np.newaxis])
-                            for i, coords in enumerate(groundtruthcoordinates):
-                                if np.isnan(coords).any():
-                                    groundtruthcoordinates[i] = np.empty(
-                                        (0, 2), dtype=float
-                                    )
-                                    groundtruthidentity[i] = np.array([], dtype=str)
-
-                            # Form 2D array of shape (n_rows, 4) where the last dimension
-                            # is (sample_index, peak_y, peak_x, bpt_index) to slice the PAFs.
-                            temp = df.reset_index(level="bodyparts").dropna()
-                            temp["bodyparts"].replace(
-                                dict(zip(joints, range(len(joints)))), inplace=True,
-                            )
-                            temp["sample"] = 0
-                            peaks_gt = temp.loc[
-                                :, ["sample", "y", "x", "bodyparts"]
-                            ].to_numpy()
-                            peaks_gt[:, 1:3] = (peaks_gt[:, 1:3] - stride // 2) / stride
-
-                            pred = predictma.predict_batched_peaks_and_costs(
+                            # The last batch of a shape is padded with its last image
+                            xy_gt = np.stack(keypoints)[:, row_pairs]
+                            preds = _predict_batch(
                                 dlc_cfg,
-                                np.expand_dims(frame, axis=0),
+                                frames,
+                                xy_gt,
+                                bpts_gt,
                                 sess,
                                 inputs,
                                 outputs,
-                                peaks_gt.astype(int),
+                                batch_size,
                             )
 
-                            if not pred:
-                                continue
-                            else:
-                                pred = pred[0]
-
-                            PredicteData[imagename] = {}
-                            PredicteData[imagename]["index"] = imageindex
-                            PredicteData[imagename]["prediction"] = pred
-                            PredicteData[imagename]["groundtruth"] = [
-                                groundtruthidentity,
-                                groundtruthcoordinates,
-                                GT,
-                            ]
-
-                            coords_pred = pred["coordinates"][0]
-                            probs_pred = pred["confidence"]
-                            for bpt, xy_gt in df.groupby(level="bodyparts"):
-                                inds_gt = np.flatnonzero(
-                                    np.all(~np.isnan(xy_gt), axis=1)
+                            for n, pred in enumerate(preds):
+                                imageindex = batch[n]
+                                imagename = Data.index[imageindex]
+                                coords_pred = pred["coordinates"][0]
+                                probs_pred = pred["confidence"]
+                                if not any(map(len, coords_pred)):
+                                    continue
+
+                                GT = pd.Series(
+                                    keypoints[n].flatten(),
+                                    index=Data.columns,
+                                    name=imagename,
                                 )
-                                n_joint = joints.index(bpt)
-                                xy = coords_pred[n_joint]
-                                if inds_gt.size and xy.size:
-                                    # Pick the predictions closest to ground truth,
-                                    # rather than the ones the model has most confident in
-                                    xy_gt_values = xy_gt.iloc[inds_gt].values
-                                    neighbors = _find_closest_neighbors(
-                                        xy_gt_values, xy, k=3
+                                (
+                                    groundtruthidentity,
+                                    groundtruthcoordinates,
+                                    dist[imageindex],
+                                    conf[imageindex],
+                                ) = _match_to_ground_truth(
+                                    pred,
+                                    xy_gt[n],
+                                    identity_gt,
+                                    rows_per_joint,
+                                    len(all_bpts),
+                                )
+
+                                PredicteData[imageindex] = {}
+                                PredicteData[imageindex]["index"] = imageindex
+                                PredicteData[imageindex]["prediction"] = pred
+                                PredicteData[imageindex]["groundtruth"] = [
+                                    groundtruthidentity,
+                                    groundtruthcoordinates,
+                                    GT,
+                                ]
+
+                                if plotting == "bodypart":
+                                    temp_xy = GT.unstack("bodyparts")[joints].values
+                                    gt = temp_xy.reshape(
+                                        (-1, 2, temp_xy.shape[1])
+                                    ).T.swapaxes(1, 2)
+                                    h, w, _ = np.shape(frames[n])
+                                    fig.set_size_inches(w / 100, h / 100)
+                                    ax.set_xlim(0, w)
+                                    ax.set_ylim(0, h)
+                                    ax.invert_yaxis()
+                                    ax = visualization.make_multianimal_labeled_image(
+                                        frames[n],
+                                        gt,
+                                        coords_pred,
+                                        probs_pred,
+                                        colors,
+                                        cfg["dotsize"],
+                                        cfg["alphavalue"],
+                                        cfg["pcutoff"],
+                                        ax=ax,
                                     )
-                                    found = neighbors != -1
-                                    min_dists = np.linalg.norm(
-                                        xy_gt_values[found] - xy[neighbors[found]],
-                                        axis=1,
+                                    visualization.save_labeled_frame(
+                                        fig,
+                                        image_paths[n],
+                                        foldername,
+                                        imageindex in trainIndices,
                                     )
-                                    inds = np.flatnonzero(all_bpts == bpt)
-                                    sl = imageindex, inds[inds_gt[found]]
-                                    dist[sl] = min_dists
-                                    conf[sl] = probs_pred[n_joint][
-                                        neighbors[found]
-                                    ].squeeze()
-
-                            if plotting == "bodypart":
-                                temp_xy = GT.unstack("bodyparts")[joints].values
-                                gt = temp_xy.reshape(
-                                    (-1, 2, temp_xy.shape[1])
-                                ).T.swapaxes(1, 2)
-                                h, w, _ = np.shape(frame)
-                                fig.set_size_inches(w / 100, h / 100)
-                                ax.set_xlim(0, w)
-                                ax.set_ylim(0, h)
-                                ax.invert_yaxis()
-                                ax = visualization.make_multianimal_labeled_image(
-                                    frame,
-                                    gt,
-                                    coords_pred,
-                                    probs_pred,
-                                    colors,
-                                    cfg["dotsize"],
-                                    cfg["alphavalue"],
-                                    cfg["pcutoff"],
-                                    ax=ax,
-                                )
-                                visualization.save_labeled_frame(
-                                    fig,
-                                    image_path,
-                                    foldername,
-                                    imageindex in trainIndices,
-                                )
-                                visualization.erase_artists(ax)
+                                    visualization.erase_artists(ax)
+                        pbar.close()
 
-                        sess.close()  # closes the current tf session
+                        # Images were evaluated grouped by shape; store them in order
+                        PredicteData = _in_image_order(PredicteData, Data.index)
 
                         # Compute all distance statistics
-                        df_dist = pd.DataFrame(dist, columns=df.index)
-                        df_conf = pd.DataFrame(conf, columns=df.index)
+                        df_dist = pd.DataFrame(dist, columns=index_gt)
+                        df_conf = pd.DataFrame(conf, columns=index_gt)
                         df_joint = pd.concat(
                             [df_dist, df_conf],
                             keys=["rmse", "conf"],
@@ -555,8 +672,6 @@ def evaluate_multianimal_full(
                             PredicteData, metadata, resultsfilename
                         )
 
-                        tf.compat.v1.reset_default_graph()
-
                     n_multibpts = len(cfg["multianimalbodyparts"])
                     if n_multibpts == 1:
                         continue
@@ -653,6 +768,10 @@ def evaluate_multianimal_full(
                     with open(data_path.replace("_full.", "_map."), "wb") as file:
                         pickle.dump((df, paf_scores), file)
 
+                if sess is not None:
+                    sess.close()  # closes the current tf session
+                    tf.compat.v1.reset_default_graph()
+
                 if len(final_result) > 0:  # Only append if results were calculated
                     make_results_file(final_result, evaluationfolder, DLCscorer)
 
@@ -0,0 +1,47 @@
+import numpy as np
+
+try:
+    import onnxruntime as ort
+
+    is_onnxruntime_available = True
+except ImportError:
+    is_onnxruntime_available = False
+
+
+class ONNXSession:
+    """Runs an ONNX export of a snapshot with ONNX Runtime on the CPU.
+
+    The session mimics the subset of the TensorFlow session interface used for
+    video analysis, i.e. ``sess.run(outputs, feed_dict={inputs: frames})``.
+    """
+
+    def __init__(
+        self, cfg, intra_op_threads=0, inter_op_threads=0, precision="float32"
+    ):
+        from deeplabcut.pose_estimation_tensorflow.export import export_onnx
+
+        # The model is exported (and converted) only once per snapshot and precision
+        self.onnx_path = export_onnx(cfg, precision)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime pick the number of threads
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(
+            self.onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def run(self, out_names, feed_dict):
+        inp = next(iter(feed_dict.values()))
+        inp = np.asarray(inp, dtype=np.float32)
+        if isinstance(out_names, str):
+            return self.session.run([out_names], {self.input_name: inp})[0]
+        return self.session.run(list(out_names), {self.input_name: inp})
+
+    def close(self):
+        self.session = None
@@ -13,23 +13,95 @@ except ImportError:
     is_openvino_available = False
 
 
+def _freeze_graph(cfg, pb_file):
+    """Freeze the multi-animal test heads of a snapshot into a protobuf file."""
+    from deeplabcut.pose_estimation_tensorflow.export import freeze_inference_graph
+
+    graph_def, input_name, output_names = freeze_inference_graph(cfg)
+    with open(pb_file, "wb") as file:
+        file.write(graph_def.SerializeToString())
+    return input_name, output_names
+
+
+def _read_frozen_graph(pb_file, output_names, required):
+    """Read the input placeholder of a frozen graph, and which of the candidate
+    output nodes it contains; the ``required`` ones must all be present."""
+    import tensorflow as tf
+
+    graph_def = tf.compat.v1.GraphDef()
+    with open(pb_file, "rb") as file:
+        graph_def.ParseFromString(file.read())
+    inputs = [node.name for node in graph_def.node if node.op == "Placeholder"]
+    if not inputs:
+        raise ValueError(f"No input placeholder found in {pb_file}.")
+    node_names = {node.name for node in graph_def.node}
+    missing = [name for name in required if name not in node_names]
+    if missing:
+        raise ValueError(
+            f"The frozen graph {pb_file} lacks the output(s) {', '.join(missing)}. "
+            "It may be stale or come from another model; please delete it, "
+            "or re-export the model."
+        )
+    return inputs[0], [name for name in output_names if name in node_names]
+
+
 class OpenVINOSession:
     def __init__(self, cfg, device):
         self.core = Core()
-        self.xml_path = cfg["init_weights"] + ".xml"
         self.device = device
+        self.multi_animal = "multi-animal" in cfg["dataset_type"]
+
+        # Freeze the graph if necessary. Single animal models use the frozen graph
+        # written by ``export_model``, multi-animal ones the full set of test heads.
+        if self.multi_animal:
+            self.pb_path = cfg["init_weights"] + "_multianimal.pb"
+            if not os.path.exists(self.pb_path):
+                self.input_name, self.output_names = _freeze_graph(cfg, self.pb_path)
+            else:
+                self.input_name, self.output_names = _read_frozen_graph(
+                    self.pb_path,
+                    ["scmaps", "locrefs", "pafs", "peaks"],
+                    required=["scmaps", "peaks"],
+                )
+        else:
+            self.pb_path = cfg["init_weights"] + ".pb"
+            self.input_name, self.output_names = _read_frozen_graph(
+                self.pb_path, ["concat_1"], required=["concat_1"]
+            )
+        self.output_name = self.output_names[0]
 
-        # Convert a frozen graph to OpenVINO IR format
-        if not os.path.exists(self.xml_path):
+        self.net = None
+        self.compiled_model = None
+        self.infer_queue = None
+        self._request = None
+        self._outputs = {}
+        self._shape = None
+
+    def _convert_model(self, inp_h, inp_w):
+        """Convert the frozen graph to OpenVINO IR for a given input resolution.
+
+        IRs are cached next to the snapshot, so that a resolution is only ever
+        converted once.
+        """
+        model_name = "{}_{}x{}".format(
+            os.path.basename(os.path.splitext(self.pb_path)[0]), inp_h, inp_w
+        )
+        output_dir = os.path.dirname(self.pb_path)
+        xml_path = os.path.join(output_dir, model_name + ".xml")
+        if not os.path.exists(xml_path):
             subprocess.run(
                 [
                     "mo",
                     "--output_dir",
-                    os.path.dirname(cfg["init_weights"]),
+                    output_dir,
+                    "--model_name",
+                    model_name,
                     "--input_model",
-                    cfg["init_weights"] + ".pb",
+                    self.pb_path,
                     "--input_shape",
-                    "[1, 747, 832, 3]",
+                    f"[1, {inp_h}, {inp_w}, 3]",
+                    "--output",
+                    ",".join(self.output_names),
                     "--extensions",
                     os.path.join(os.path.dirname(__file__), "mo_extensions"),
                     "--data_type",
@@ -37,102 +109,111 @@ class OpenVINOSession:
                 ],
                 check=True,
             )
+        return self.core.read_model(xml_path)
 
-        # Read network into memory
-        self.net = self.core.read_model(self.xml_path)
-        self.input_name = self.net.inputs[0].get_any_name()
-        self.output_name = self.net.outputs[0].get_any_name()
-        self.infer_queue = None
-
-    def _init_model(self, inp_h, inp_w):
-        # For better efficiency, model is initialized for batch_size 1 and every sample processed independently
-        inp_shape = [1, inp_h, inp_w, 3]
-        self.net.reshape({self.input_name: inp_shape})
+    def _init_model(self, inp_h, inp_w, batch_size=1):
+        shape = (batch_size, inp_h, inp_w)
+        if shape == self._shape:
+            return
+        if self._shape is None or self._shape[1:] != shape[1:]:
+            self.net = self._convert_model(inp_h, inp_w)
+        self.net.reshape({self.net.inputs[0]: [batch_size, inp_h, inp_w, 3]})
 
         # Load network to device
+        config = {"PERFORMANCE_HINT": "THROUGHPUT"}
         if "CPU" in self.device:
-            self.core.set_property(
-                "CPU",
-                {
-                    "CPU_THROUGHPUT_STREAMS": "CPU_THROUGHPUT_AUTO",
-                    "CPU_BIND_THREAD": "YES",
-                },
-            )
-        if "GPU" in self.device:
-            self.core.set_property(
-                "GPU", {"GPU_THROUGHPUT_STREAMS": "GPU_THROUGHPUT_AUTO"}
-            )
-
-        compiled_model = self.core.compile_model(self.net, self.device)
-        num_requests = compiled_model.get_property("OPTIMAL_NUMBER_OF_INFER_REQUESTS")
-        print(f"OpenVINO uses {num_requests} inference requests")
-        self.infer_queue = AsyncInferQueue(compiled_model, num_requests)
-
-    def run(self, out_name, feed_dict):
-        inp_name, inp = next(iter(feed_dict.items()))
-
-        if self.infer_queue is None:
-            self._init_model(inp.shape[1], inp.shape[2])
-
-        batch_size = inp.shape[0]
-        batch_output = np.zeros(
-            [batch_size] + self.net.outputs[out_name].shape, dtype=np.float32
+            self.core.set_property("CPU", {"CPU_BIND_THREAD": "YES"})
+        self.compiled_model = self.core.compile_model(self.net, self.device, config)
+        self._outputs = {
+            name: self._find_output(self.compiled_model, name)
+            for name in self.output_names
+        }
+        self._request = self.compiled_model.create_infer_request()
+        num_requests = self.compiled_model.get_property(
+            "OPTIMAL_NUMBER_OF_INFER_REQUESTS"
         )
-
-        def completion_callback(request, inp_id):
-            output = next(iter(request.results.values()))
-            batch_output[out_id] = output
-
-        self.infer_queue.set_callback(completion_callback)
-
-        for inp_id in range(batch_size):
-            self.infer_queue.start_async({inp_name: inp[inp_id : inp_id + 1]}, inp_id)
-
-        self.infer_queue.wait_all()
-
-        return batch_output.reshape(-1, 3)
+        print(
+            f"OpenVINO uses {num_requests} inference requests of batch size {batch_size}"
+        )
+        self.infer_queue = AsyncInferQueue(self.compiled_model, num_requests)
+        self._shape = shape
+
+    @staticmethod
+    def _find_output(model, name):
+        for output in model.outputs:
+            names = output.get_names()
+            if name in names or f"{name}:0" in names:
+                return output
+        raise ValueError(f"Output {name} not found in the OpenVINO model.")
+
+    def get_outputs(self, request, out_names):
+        """Return the outputs of a completed request.
+
+        Arrays are views onto the request's output buffers, which are reused by
+        subsequent inferences; copy them if they need to outlive the next call.
+        """
+        if isinstance(out_names, str):
+            return request.get_tensor(self._outputs[out_names]).data
+        return [request.get_tensor(self._outputs[name]).data for name in out_names]
+
+    def run(self, out_names, feed_dict):
+        inp = next(iter(feed_dict.values()))
+        self._init_model(inp.shape[1], inp.shape[2], inp.shape[0])
+        self._request.infer({self.input_name: inp})
+        return self.get_outputs(self._request, out_names)
+
+    def close(self):
+        self.infer_queue = None
+        self._request = None
+        self.compiled_model = None
+        self._shape = None
 
 
-def GetPoseF_OV(cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize):
-    """Prediction of pose"""
+def GetPoseF_OV(
+    cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize, motion_gate=None
+):
+    """Batchwise prediction of pose, with several batches in flight at once"""
     PredictedData = np.zeros((nframes, 3 * len(dlc_cfg["all_joints_names"])))
-    ny, nx = int(cap.get(4)), int(cap.get(3))
+    ny, nx = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     if cfg["cropping"]:
-        ny, nx = checkcropping(cfg, cap)
+        ny, nx = cfg["y2"] - cfg["y1"], cfg["x2"] - cfg["x1"]
 
-    sess._init_model(ny, nx)
+    sess._init_model(ny, nx, batchsize)
 
     pbar = tqdm(total=nframes)
     counter = 0
-    step = max(10, int(nframes / 100))
-
-    def completion_callback(request, inp_id):
-        pose = next(iter(request.results.values()))
+    inds = []
 
-        pose[:, [0, 1, 2]] = pose[:, [1, 0, 2]]  # change order to have x,y,confidence
-        pose = np.reshape(pose, (1, -1))  # bring into batchsize times x,y,conf etc.
-        PredictedData[inp_id] = pose
+    def completion_callback(request, inds):
+        pose = sess.get_outputs(request, outputs[0])
+        pose = np.reshape(pose, (batchsize, -1, 3))[: len(inds)]
+        # Change order to have x,y,confidence and bring into
+        # batchsize times x,y,conf etc.
+        PredictedData[inds] = pose[..., [1, 0, 2]].reshape((len(inds), -1))
 
     sess.infer_queue.set_callback(completion_callback)
 
-    while cap.isOpened():
-        if counter % step == 0:
-            pbar.update(step)
+    # A new batch is allocated after each submission, as the
+    # previous one may still be in use by a pending request.
+    frames = np.empty((batchsize, ny, nx, 3), dtype="ubyte")
+    while cap.isOpened() and counter < nframes:
         ret, frame = cap.read()
+        if ret:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if cfg["cropping"]:
+                frame = frame[cfg["y1"] : cfg["y2"], cfg["x1"] : cfg["x2"]]
+            if motion_gate is None or not motion_gate.skip(frame, counter):
+                frames[len(inds)] = frame
+                inds.append(counter)
+            counter += 1
+        if inds and (len(inds) == batchsize or not ret or counter == nframes):
+            sess.infer_queue.start_async({sess.input_name: frames}, inds)
+            pbar.update(counter - pbar.n)
+            frames = np.empty_like(frames)
+            inds = []
         if not ret:
             break
 
-        # Prepare input data
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        if cfg["cropping"]:
-            frame = frame[cfg["y1"] : cfg["y2"], cfg["x1"] : cfg["x2"]]
-
-        sess.infer_queue.start_async(
-            {sess.input_name: np.expand_dims(frame, axis=0)}, counter
-        )
-
-        counter += 1
-
     sess.infer_queue.wait_all()
 
     pbar.close()
@@ -25,6 +25,7 @@ https://arxiv.org/abs/1909.11229
 import numpy as np
 import tensorflow as tf
 from deeplabcut.pose_estimation_tensorflow.nnets.factory import PoseNetFactory
+from .onnx.session import ONNXSession
 from .openvino.session import OpenVINOSession
 
 
@@ -98,27 +99,8 @@ def argmax_pose_predict(scmap, offmat, stride):
 
 
 def multi_pose_predict(scmap, locref, stride, num_outputs):
-    Y, X = get_top_values(scmap[None], num_outputs)
-    Y, X = Y[:, 0], X[:, 0]
-    num_joints = scmap.shape[2]
-    DZ = np.zeros((num_outputs, num_joints, 3))
-    for m in range(num_outputs):
-        for k in range(num_joints):
-            x = X[m, k]
-            y = Y[m, k]
-            DZ[m, k, :2] = locref[y, x, k, :]
-            DZ[m, k, 2] = scmap[y, x, k]
-
-    X = X.astype("float32") * stride + 0.5 * stride + DZ[:, :, 0]
-    Y = Y.astype("float32") * stride + 0.5 * stride + DZ[:, :, 1]
-    P = DZ[:, :, 2]
-
-    pose = np.empty((num_joints, num_outputs * 3), dtype="float32")
-    pose[:, 0::3] = X.T
-    pose[:, 1::3] = Y.T
-    pose[:, 2::3] = P.T
-
-    return pose
+    pose = batched_pose_predict(scmap[None], locref[None], stride, num_outputs)
+    return pose.reshape((scmap.shape[2], num_outputs * 3)).astype("float32")
 
 
 def getpose(image, cfg, sess, inputs, outputs, outall=False):
@@ -154,22 +136,74 @@ def extract_cnn_outputmulti(outputs_np, cfg):
 
 
 def get_top_values(scmap, n_top=5):
+    """Locations of the n_top highest peaks (in descending order) of every
+    score map, as two arrays of shape (n_top, batchsize, num_joints)."""
     batchsize, ny, nx, num_joints = scmap.shape
     scmap_flat = scmap.reshape(batchsize, nx * ny, num_joints)
     if n_top == 1:
         scmap_top = np.argmax(scmap_flat, axis=1)[None]
     else:
+        # Only the n_top largest values are partitioned out, and then sorted
         scmap_top = np.argpartition(scmap_flat, -n_top, axis=1)[:, -n_top:]
-        for ix in range(batchsize):
-            vals = scmap_flat[ix, scmap_top[ix], np.arange(num_joints)]
-            arg = np.argsort(-vals, axis=0)
-            scmap_top[ix] = scmap_top[ix, arg, np.arange(num_joints)]
+        vals = np.take_along_axis(scmap_flat, scmap_top, axis=1)
+        arg = np.argsort(-vals, axis=1)
+        scmap_top = np.take_along_axis(scmap_top, arg, axis=1)
         scmap_top = scmap_top.swapaxes(0, 1)
 
     Y, X = np.unravel_index(scmap_top, (ny, nx))
     return Y, X
 
 
+def batched_pose_predict(scmap, locref, stride, num_outputs=1, locref_stdev=1):
+    """Reference CPU decoder of the network outputs into poses.
+
+    The num_outputs highest peaks of every score map are refined with the
+    location refinement offsets (if any) and mapped back to image coordinates.
+    Offsets and confidences are gathered for the whole batch at once, and written
+    directly into the output array.
+
+    Parameters
+    ----------
+    scmap : np.ndarray
+        Score maps of shape (batchsize, ny, nx, num_joints).
+    locref : np.ndarray or None
+        Location refinement fields of shape (batchsize, ny, nx, num_joints, 2).
+    stride : float
+        Stride of the network.
+    num_outputs : int, optional
+        Number of peaks to extract per joint.
+    locref_stdev : float, optional
+        Scale of the location refinement fields; only the gathered offsets are
+        rescaled, which spares a pass over the whole fields.
+
+    Returns
+    -------
+    np.ndarray
+        Poses of shape (batchsize, num_joints * num_outputs * 3), where each
+        (joint, output) is described by its x, y coordinates and confidence.
+    """
+    batchsize, ny, nx, num_joints = scmap.shape
+    Y, X = get_top_values(scmap, n_top=num_outputs)
+    Y = Y.transpose((1, 2, 0))
+    X = X.transpose((1, 2, 0))
+    inds = (
+        np.arange(batchsize)[:, None, None],
+        Y,
+        X,
+        np.arange(num_joints)[None, :, None],
+    )
+    pose = np.empty((batchsize, num_joints, num_outputs, 3))
+    if locref is not None:
+        pose[..., :2] = locref[inds]
+        pose[..., :2] *= locref_stdev
+    else:
+        pose[..., :2] = 0
+    pose[..., 0] += X * stride + 0.5 * stride
+    pose[..., 1] += Y * stride + 0.5 * stride
+    pose[..., 2] = scmap[inds]
+    return pose.reshape((batchsize, -1))
+
+
 def getposeNP(image, cfg, sess, inputs, outputs, outall=False):
     """Adapted from DeeperCut, performs numpy-based faster inference on batches.
     Introduced in https://www.biorxiv.org/content/10.1101/457242v1"""
@@ -177,37 +211,20 @@ def getposeNP(image, cfg, sess, inputs, outputs, outall=False):
     num_outputs = cfg.get("num_outputs", 1)
     outputs_np = sess.run(outputs, feed_dict={inputs: image})
 
-    scmap, locref = extract_cnn_outputmulti(outputs_np, cfg)  # processes image batch.
-    batchsize, ny, nx, num_joints = scmap.shape
-
-    Y, X = get_top_values(scmap, n_top=num_outputs)
-
-    # Combine scoremat and offsets to the final pose.
-    DZ = np.zeros((num_outputs, batchsize, num_joints, 3))
-    for m in range(num_outputs):
-        for l in range(batchsize):
-            for k in range(num_joints):
-                x = X[m, l, k]
-                y = Y[m, l, k]
-                DZ[m, l, k, :2] = locref[l, y, x, k, :]
-                DZ[m, l, k, 2] = scmap[l, y, x, k]
-
-    X = X.astype("float32") * cfg["stride"] + 0.5 * cfg["stride"] + DZ[:, :, :, 0]
-    Y = Y.astype("float32") * cfg["stride"] + 0.5 * cfg["stride"] + DZ[:, :, :, 1]
-    P = DZ[:, :, :, 2]
-
-    Xs = X.swapaxes(0, 2).swapaxes(0, 1)
-    Ys = Y.swapaxes(0, 2).swapaxes(0, 1)
-    Ps = P.swapaxes(0, 2).swapaxes(0, 1)
-
-    pose = np.empty(
-        (cfg["batch_size"], num_outputs * cfg["num_joints"] * 3), dtype=X.dtype
+    scmap = outputs_np[0]
+    locref = None
+    if cfg["location_refinement"]:
+        locref = outputs_np[1]
+        locref = np.reshape(locref, (*locref.shape[:3], -1, 2))
+    if len(scmap.shape) == 2:  # for single body part!
+        scmap = np.expand_dims(scmap, axis=2)
+    pose = batched_pose_predict(
+        scmap, locref, cfg["stride"], num_outputs, cfg["locref_stdev"]
     )
-    pose[:, 0::3] = Xs.reshape(batchsize, -1)
-    pose[:, 1::3] = Ys.reshape(batchsize, -1)
-    pose[:, 2::3] = Ps.reshape(batchsize, -1)
 
     if outall:
+        if locref is not None:
+            locref *= cfg["locref_stdev"]
         return scmap, locref, pose
     else:
         return pose
@@ -246,4 +263,11 @@ def extract_GPUprediction(outputs, cfg):
 
 def setup_openvino_pose_prediction(cfg, device):
     sess = OpenVINOSession(cfg, device)
-    return sess, sess.input_name, [sess.output_name]
+    return sess, sess.input_name, sess.output_names
+
+
+def setup_onnx_pose_prediction(
+    cfg, intra_op_threads=0, inter_op_threads=0, precision="float32"
+):
+    sess = ONNXSession(cfg, intra_op_threads, inter_op_threads, precision)
+    return sess, sess.input_name, sess.output_names
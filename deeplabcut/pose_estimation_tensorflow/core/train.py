@@ -15,6 +15,7 @@ import argparse
 import logging
 import os
 import threading
+import time
 from pathlib import Path
 
 import tensorflow as tf
@@ -25,8 +26,12 @@ import tf_slim as slim
 from deeplabcut.pose_estimation_tensorflow.config import load_config
 from deeplabcut.pose_estimation_tensorflow.datasets import (
     Batch,
+    DeterministicPoseDataset,
+    ImgaugPoseDataset,
+    MAImgaugPoseDataset,
     PoseDatasetFactory,
 )
+from deeplabcut.pose_estimation_tensorflow.datasets.loader import BatchLoader
 from deeplabcut.pose_estimation_tensorflow.nnets import PoseNetFactory
 from deeplabcut.pose_estimation_tensorflow.util.logging import setup_logging
 
@@ -76,17 +81,87 @@ def setup_preloading(batch_spec):
     return batch, enqueue_op, placeholders
 
 
-def load_and_enqueue(sess, enqueue_op, coord, dataset, placeholders):
-    while not coord.should_stop():
-        batch_np = dataset.next_batch()
-        food = {pl: batch_np[name] for (name, pl) in placeholders.items()}
-        sess.run(enqueue_op, feed_dict=food)
+class TrainingTimer:
+    """Split the duration of training iterations into the time spent waiting for
+    a batch to be enqueued and the time spent computing."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.n_enqueued = 0
+        self.n_iterations = 0
+        self.data_time = 0.0
+        self.compute_time = 0.0
+
+    def batch_enqueued(self):
+        with self._cond:
+            self.n_enqueued += 1
+            self._cond.notify_all()
+
+    def wait_for_batch(self, coord):
+        start = time.perf_counter()
+        with self._cond:
+            while self.n_enqueued <= self.n_iterations:
+                if coord.should_stop():
+                    coord.raise_requested_exception()
+                    raise RuntimeError("The data loading thread has stopped.")
+                self._cond.wait(timeout=1)
+        self.data_time += time.perf_counter() - start
+
+    def add_iteration(self, compute_time):
+        self.n_iterations += 1
+        self.compute_time += compute_time
+
+    def summary(self, n_iterations):
+        """Average times since the last summary, which resets them."""
+        total = self.data_time + self.compute_time
+        msg = "data wait: {:.3f}s/iter ({:.0f}%) compute: {:.3f}s/iter".format(
+            self.data_time / n_iterations,
+            100 * self.data_time / total if total else 0,
+            self.compute_time / n_iterations,
+        )
+        self.data_time = self.compute_time = 0.0
+        return msg
+
+
+def get_batch_loader(dataset, cfg, batch_spec):
+    """Wrap the dataset in a pool of cfg["num_loader_workers"] worker processes
+    preparing the batches in parallel; batches are prepared in the training
+    process by default (0 workers)."""
+    num_workers = cfg.get("num_loader_workers") or 0
+    supported = (ImgaugPoseDataset, MAImgaugPoseDataset, DeterministicPoseDataset)
+    if num_workers < 1 or not isinstance(dataset, supported):
+        return dataset
+    print(f"Preparing batches with {num_workers} worker processes.")
+    return BatchLoader(
+        dataset,
+        batch_spec.keys(),
+        num_workers,
+        prefetch=cfg.get("loader_prefetch", 2),
+        seed=cfg.get("seed"),
+    )
 
 
-def start_preloading(sess, enqueue_op, dataset, placeholders):
+def load_and_enqueue(sess, enqueue_op, coord, dataset, placeholders, timer=None):
+    while not coord.should_stop():
+        try:
+            batch_np = dataset.next_batch()
+            food = {pl: batch_np[name] for (name, pl) in placeholders.items()}
+            sess.run(enqueue_op, feed_dict=food)
+        except Exception as e:
+            # Errors raised once training is over (closing the session cancels
+            # the pending enqueue) are expected; others are passed on.
+            if not coord.should_stop():
+                coord.request_stop(e)
+            return
+        if timer is not None:
+            timer.batch_enqueued()
+
+
+def start_preloading(sess, enqueue_op, dataset, placeholders, timer=None):
     coord = tf.compat.v1.train.Coordinator()
     t = threading.Thread(
-        target=load_and_enqueue, args=(sess, enqueue_op, coord, dataset, placeholders),
+        target=load_and_enqueue,
+        args=(sess, enqueue_op, coord, dataset, placeholders, timer),
     )
     t.start()
     return coord, t
@@ -166,135 +241,149 @@ def train(
     dataset = PoseDatasetFactory.create(cfg)
     batch_spec = get_batch_spec(cfg)
     batch, enqueue_op, placeholders = setup_preloading(batch_spec)
+    # Worker processes are started before the session, as forking a process
+    # running TensorFlow threads is unsafe.
+    loader = get_batch_loader(dataset, cfg, batch_spec)
+
+    # Worker processes (and their shared memory) are released even if training
+    # is interrupted
+    try:
+        losses = PoseNetFactory.create(cfg).train(batch)
+        total_loss = losses["total_loss"]
+
+        for k, t in losses.items():
+            tf.compat.v1.summary.scalar(k, t)
+        merged_summaries = tf.compat.v1.summary.merge_all()
+
+        stem = Path(cfg["init_weights"]).stem
+        if "snapshot" in stem and keepdeconvweights:
+            print("Loading already trained DLC with backbone:", net_type)
+            variables_to_restore = slim.get_variables_to_restore()
+            start_iter = int(stem.split("-")[1])
+        else:
+            print("Loading ImageNet-pretrained", net_type)
+            # loading backbone from ResNet, MobileNet etc.
+            if "resnet" in net_type:
+                variables_to_restore = slim.get_variables_to_restore(include=["resnet_v1"])
+            elif "mobilenet" in net_type:
+                variables_to_restore = slim.get_variables_to_restore(
+                    include=["MobilenetV2"]
+                )
+            elif "efficientnet" in net_type:
+                variables_to_restore = slim.get_variables_to_restore(
+                    include=["efficientnet"]
+                )
+                variables_to_restore = {
+                    var.op.name.replace("efficientnet/", "")
+                    + "/ExponentialMovingAverage": var
+                    for var in variables_to_restore
+                }
+            else:
+                print("Wait for DLC 2.3.")
+            start_iter = 0
+
+        restorer = tf.compat.v1.train.Saver(variables_to_restore)
+        saver = tf.compat.v1.train.Saver(
+            max_to_keep=max_to_keep
+        )  # selects how many snapshots are stored, see https://github.com/DeepLabCut/DeepLabCut/issues/8#issuecomment-387404835
+
+        if allow_growth:
+            config = tf.compat.v1.ConfigProto()
+            config.gpu_options.allow_growth = True
+            sess = tf.compat.v1.Session(config=config)
+        else:
+            sess = tf.compat.v1.Session()
 
-    losses = PoseNetFactory.create(cfg).train(batch)
-    total_loss = losses["total_loss"]
+        timer = TrainingTimer()
+        coord, thread = start_preloading(sess, enqueue_op, loader, placeholders, timer)
+        train_writer = tf.compat.v1.summary.FileWriter(cfg["log_dir"], sess.graph)
 
-    for k, t in losses.items():
-        tf.compat.v1.summary.scalar(k, t)
-    merged_summaries = tf.compat.v1.summary.merge_all()
+        if cfg.get("freezeencoder", False):
+            if "efficientnet" in net_type:
+                print("Freezing ONLY supported MobileNet/ResNet currently!!")
+                learning_rate, train_op, tstep = get_optimizer(total_loss, cfg)
 
-    stem = Path(cfg["init_weights"]).stem
-    if "snapshot" in stem and keepdeconvweights:
-        print("Loading already trained DLC with backbone:", net_type)
-        variables_to_restore = slim.get_variables_to_restore()
-        start_iter = int(stem.split("-")[1])
-    else:
-        print("Loading ImageNet-pretrained", net_type)
-        # loading backbone from ResNet, MobileNet etc.
-        if "resnet" in net_type:
-            variables_to_restore = slim.get_variables_to_restore(include=["resnet_v1"])
-        elif "mobilenet" in net_type:
-            variables_to_restore = slim.get_variables_to_restore(
-                include=["MobilenetV2"]
-            )
-        elif "efficientnet" in net_type:
-            variables_to_restore = slim.get_variables_to_restore(
-                include=["efficientnet"]
-            )
-            variables_to_restore = {
-                var.op.name.replace("efficientnet/", "")
-                + "/ExponentialMovingAverage": var
-                for var in variables_to_restore
-            }
+            print("Freezing encoder...")
+            learning_rate, _, train_op = get_optimizer_with_freeze(total_loss, cfg)
         else:
-            print("Wait for DLC 2.3.")
-        start_iter = 0
-
-    restorer = tf.compat.v1.train.Saver(variables_to_restore)
-    saver = tf.compat.v1.train.Saver(
-        max_to_keep=max_to_keep
-    )  # selects how many snapshots are stored, see https://github.com/DeepLabCut/DeepLabCut/issues/8#issuecomment-387404835
-
-    if allow_growth:
-        config = tf.compat.v1.ConfigProto()
-        config.gpu_options.allow_growth = True
-        sess = tf.compat.v1.Session(config=config)
-    else:
-        sess = tf.compat.v1.Session()
-
-    coord, thread = start_preloading(sess, enqueue_op, dataset, placeholders)
-    train_writer = tf.compat.v1.summary.FileWriter(cfg["log_dir"], sess.graph)
-
-    if cfg.get("freezeencoder", False):
-        if "efficientnet" in net_type:
-            print("Freezing ONLY supported MobileNet/ResNet currently!!")
             learning_rate, train_op, tstep = get_optimizer(total_loss, cfg)
 
-        print("Freezing encoder...")
-        learning_rate, _, train_op = get_optimizer_with_freeze(total_loss, cfg)
-    else:
-        learning_rate, train_op, tstep = get_optimizer(total_loss, cfg)
-
-    sess.run(tf.compat.v1.global_variables_initializer())
-    sess.run(tf.compat.v1.local_variables_initializer())
+        sess.run(tf.compat.v1.global_variables_initializer())
+        sess.run(tf.compat.v1.local_variables_initializer())
 
-    # Restore variables from disk.
-    restorer.restore(sess, cfg["init_weights"])
-    if maxiters is None:
-        max_iter = int(cfg["multi_step"][-1][1])
-    else:
-        max_iter = min(int(cfg["multi_step"][-1][1]), int(maxiters))
-        # display_iters = max(1,int(displayiters))
-        print("Max_iters overwritten as", max_iter)
+        # Restore variables from disk.
+        restorer.restore(sess, cfg["init_weights"])
+        if maxiters is None:
+            max_iter = int(cfg["multi_step"][-1][1])
+        else:
+            max_iter = min(int(cfg["multi_step"][-1][1]), int(maxiters))
+            # display_iters = max(1,int(displayiters))
+            print("Max_iters overwritten as", max_iter)
 
-    if displayiters is None:
-        display_iters = max(1, int(cfg["display_iters"]))
-    else:
-        display_iters = max(1, int(displayiters))
-        print("Display_iters overwritten as", display_iters)
+        if displayiters is None:
+            display_iters = max(1, int(cfg["display_iters"]))
+        else:
+            display_iters = max(1, int(displayiters))
+            print("Display_iters overwritten as", display_iters)
 
-    if saveiters is None:
-        save_iters = max(1, int(cfg["save_iters"]))
+        if saveiters is None:
+            save_iters = max(1, int(cfg["save_iters"]))
 
-    else:
-        save_iters = max(1, int(saveiters))
-        print("Save_iters overwritten as", save_iters)
-
-    cum_loss = 0.0
-    lr_gen = LearningRate(cfg)
-
-    stats_path = Path(config_yaml).with_name("learning_stats.csv")
-    lrf = open(str(stats_path), "w")
-
-    print("Training parameter:")
-    print(cfg)
-    print("Starting training....")
-    max_iter += start_iter  # max_iter is relative to start_iter
-    for it in range(start_iter, max_iter + 1):
-        if "efficientnet" in net_type:
-            lr_dict = {tstep: it - start_iter}
-            current_lr = sess.run(learning_rate, feed_dict=lr_dict)
         else:
-            current_lr = lr_gen.get_lr(it - start_iter)
-            lr_dict = {learning_rate: current_lr}
-
-        [_, loss_val, summary] = sess.run(
-            [train_op, total_loss, merged_summaries], feed_dict=lr_dict
-        )
-        cum_loss += loss_val
-        train_writer.add_summary(summary, it)
-
-        if it % display_iters == 0 and it > start_iter:
-            average_loss = cum_loss / display_iters
-            cum_loss = 0.0
-            logging.info(
-                "iteration: {} loss: {} lr: {}".format(
-                    it, "{0:.4f}".format(average_loss), current_lr
-                )
+            save_iters = max(1, int(saveiters))
+            print("Save_iters overwritten as", save_iters)
+
+        cum_loss = 0.0
+        lr_gen = LearningRate(cfg)
+
+        stats_path = Path(config_yaml).with_name("learning_stats.csv")
+        lrf = open(str(stats_path), "w")
+
+        print("Training parameter:")
+        print(cfg)
+        print("Starting training....")
+        max_iter += start_iter  # max_iter is relative to start_iter
+        for it in range(start_iter, max_iter + 1):
+            if "efficientnet" in net_type:
+                lr_dict = {tstep: it - start_iter}
+                current_lr = sess.run(learning_rate, feed_dict=lr_dict)
+            else:
+                current_lr = lr_gen.get_lr(it - start_iter)
+                lr_dict = {learning_rate: current_lr}
+
+            timer.wait_for_batch(coord)
+            start = time.perf_counter()
+            [_, loss_val, summary] = sess.run(
+                [train_op, total_loss, merged_summaries], feed_dict=lr_dict
             )
-            lrf.write("{}, {:.5f}, {}\n".format(it, average_loss, current_lr))
-            lrf.flush()
-
-        # Save snapshot
-        if (it % save_iters == 0 and it != start_iter) or it == max_iter:
-            model_name = cfg["snapshot_prefix"]
-            saver.save(sess, model_name, global_step=it)
-
-    lrf.close()
-    sess.close()
-    coord.request_stop()
-    coord.join([thread])
+            timer.add_iteration(time.perf_counter() - start)
+            cum_loss += loss_val
+            train_writer.add_summary(summary, it)
+
+            if it % display_iters == 0 and it > start_iter:
+                average_loss = cum_loss / display_iters
+                cum_loss = 0.0
+                logging.info(
+                    "iteration: {} loss: {} lr: {}".format(
+                        it, "{0:.4f}".format(average_loss), current_lr
+                    )
+                )
+                logging.info(timer.summary(display_iters))
+                lrf.write("{}, {:.5f}, {}\n".format(it, average_loss, current_lr))
+                lrf.flush()
+
+            # Save snapshot
+            if (it % save_iters == 0 and it != start_iter) or it == max_iter:
+                model_name = cfg["snapshot_prefix"]
+                saver.save(sess, model_name, global_step=it)
+
+        lrf.close()
+        coord.request_stop()
+        sess.close()
+        coord.join([thread])
+    finally:
+        if isinstance(loader, BatchLoader):
+            loader.close()
     # return to original path.
     os.chdir(str(start_path))
 
@@ -0,0 +1,122 @@
+"""
+DeepLabCut2.2 Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+https://github.com/DeepLabCut/DeepLabCut
+Please see AUTHORS for contributors.
+https://github.com/DeepLabCut/DeepLabCut/blob/master/AUTHORS
+Licensed under GNU Lesser General Public License v3.0
+
+Cache of decoded training images, so that they are not decoded again at every
+training iteration.
+"""
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+from deeplabcut.utils.auxfun_videos import imread
+
+
+def images_checksum(project_path, image_paths):
+    """Checksum of the size and modification time of the images, which changes
+    whenever images of the labeled-data folders are added, removed or edited."""
+    sha = hashlib.sha1()
+    for path in sorted(set(image_paths)):
+        stat = os.stat(os.path.join(project_path, path))
+        sha.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return sha.hexdigest()
+
+
+class ImageCache:
+    """Decoded uint8 images packed in a memory-mapped file.
+
+    The file is built once, next to the training dataset file, and rebuilt when the
+    images change. Images are added in order until ``max_size`` (in MB) is reached;
+    the others are read from disk as usual. As the file is memory-mapped, loader
+    processes share the operating system's page cache rather than holding copies.
+    """
+
+    def __init__(self, project_path, image_paths, cache_file, max_size):
+        self.project_path = project_path
+        self.cache_file = cache_file
+        self.max_size = max_size
+        checksum = images_checksum(project_path, image_paths)
+        self.index = self._load_index(checksum)
+        if self.index is None:
+            self.index = self._build(image_paths, checksum)
+        self._blob = None
+
+    @classmethod
+    def from_cfg(cls, cfg, image_paths):
+        """Cache for the images of a training dataset, or None if the cache is
+        disabled (``image_cache_size`` of 0 or absent in the pose_cfg.yaml)."""
+        max_size = cfg.get("image_cache_size", 0)
+        if not max_size:
+            return None
+        cache_file = (
+            os.path.splitext(os.path.join(cfg["project_path"], cfg["dataset"]))[0]
+            + ".imagecache"
+        )
+        return cls(cfg["project_path"], image_paths, cache_file, max_size)
+
+    @property
+    def blob_file(self):
+        return self.cache_file + ".bin"
+
+    def _load_index(self, checksum):
+        if not os.path.isfile(self.cache_file) or not os.path.isfile(self.blob_file):
+            return None
+        with open(self.cache_file, "rb") as file:
+            meta = pickle.load(file)
+        if meta["checksum"] != checksum or meta["max_size"] != self.max_size:
+            print("The labeled data changed; rebuilding the image cache.")
+            return None
+        return meta["index"]
+
+    def _build(self, image_paths, checksum):
+        print("Caching the decoded training images in", self.blob_file)
+        index = {}
+        offset = 0
+        max_bytes = self.max_size * 1024 ** 2
+        tmp_file = self.blob_file + ".tmp"
+        with open(tmp_file, "wb") as file:
+            for path in dict.fromkeys(image_paths):
+                image = imread(os.path.join(self.project_path, path), mode="skimage")
+                if offset + image.nbytes > max_bytes:
+                    continue
+                file.write(np.ascontiguousarray(image).tobytes())
+                index[path] = offset, image.shape
+                offset += image.nbytes
+        os.replace(tmp_file, self.blob_file)
+        with open(self.cache_file, "wb") as file:
+            meta = {"checksum": checksum, "max_size": self.max_size, "index": index}
+            pickle.dump(meta, file, pickle.HIGHEST_PROTOCOL)
+        print(
+            f"{len(index)} of {len(set(image_paths))} images cached "
+            f"({offset / 1024 ** 2:.0f} MB)."
+        )
+        return index
+
+    def __getstate__(self):
+        # Worker processes map the file again rather than receiving a copy
+        state = self.__dict__.copy()
+        state["_blob"] = None
+        return state
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def read(self, path):
+        """Return the image as read by ``imread(..., mode="skimage")``."""
+        if path not in self.index:
+            return imread(os.path.join(self.project_path, path), mode="skimage")
+        if self._blob is None:
+            if os.path.getsize(self.blob_file) == 0:
+                self._blob = np.empty(0, dtype=np.uint8)
+            else:
+                self._blob = np.memmap(self.blob_file, dtype=np.uint8, mode="r")
+        offset, shape = self.index[path]
+        size = int(np.prod(shape))
+        # Copy, as augmenters may modify images in place
+        return np.array(self._blob[offset : offset + size]).reshape(shape)
@@ -0,0 +1,187 @@
+"""
+DeepLabCut2.2 Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+https://github.com/DeepLabCut/DeepLabCut
+Please see AUTHORS for contributors.
+https://github.com/DeepLabCut/DeepLabCut/blob/master/AUTHORS
+Licensed under GNU Lesser General Public License v3.0
+
+Preparation of training batches (image loading, augmentation and target maps)
+in a pool of worker processes.
+"""
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+def _write_batch(buffers, slot, arrays):
+    """Copy arrays into the shared memory buffer of a slot, (re)allocating it if
+    it is too small, and return the buffer's name and the arrays' layout."""
+    nbytes = sum(array.nbytes for array in arrays.values())
+    shm = buffers[slot]
+    if shm is None or shm.size < nbytes:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        # Leave some room, as batch shapes vary with the scale jitter
+        shm = SharedMemory(create=True, size=max(int(nbytes * 1.25), 1))
+        buffers[slot] = shm
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        view = np.ndarray(array.shape, np.float32, buffer=shm.buf, offset=offset)
+        view[...] = array
+        layout[name] = array.shape, offset
+        offset += array.nbytes
+    return shm.name, layout
+
+
+def _worker(
+    dataset, names, worker_id, num_workers, seed, out_queue, free_queue, stop_event
+):
+    import imgaug as ia
+
+    np.random.seed(seed)
+    ia.seed(seed)
+    dataset.shard(worker_id, num_workers)
+    buffers = {}
+    parent = os.getppid()
+    try:
+        while True:
+            try:
+                slot = free_queue.get(timeout=1)
+            except queue.Empty:
+                if os.getppid() != parent:  # The training process died
+                    break
+                continue
+            if slot is None or stop_event.is_set():
+                break
+            buffers.setdefault(slot, None)
+            try:
+                start = time.perf_counter()
+                batch = dataset.next_batch()
+                arrays = {
+                    name: np.ascontiguousarray(batch[name], dtype=np.float32)
+                    for name in names
+                }
+                shm_name, layout = _write_batch(buffers, slot, arrays)
+                out_queue.put((slot, shm_name, layout, time.perf_counter() - start))
+            except Exception:
+                out_queue.put(("error", traceback.format_exc()))
+                break
+    finally:
+        for shm in buffers.values():
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+
+class BatchLoader:
+    """Prepare training batches in parallel worker processes.
+
+    Every worker owns a copy of the dataset, seeded from ``seed`` and its index,
+    and ``prefetch`` shared memory buffers its batches are written to. Batches
+    are collected from the workers in turn, so that the sequence of batches is
+    reproducible for a given seed.
+
+    ``next_batch`` returns a dict of float32 arrays for the given names. They are
+    copied out of the shared buffers, as TensorFlow may hold on to the memory of
+    fed arrays (e.g. in its input queue) after the buffer is recycled.
+    """
+
+    def __init__(self, dataset, names, num_workers=2, prefetch=2, seed=None):
+        self.names = list(names)
+        self.num_workers = num_workers
+        self.wait_time = 0.0  # Time spent waiting on the workers
+        self.work_time = 0.0  # Time the workers spent preparing batches
+        self.n_batches = 0
+        self._next_worker = 0
+        self._shms = {}
+        self._out_queues = []
+        self._free_queues = []
+        self._processes = []
+        self._stop_event = multiprocessing.Event()
+        seeds = np.random.SeedSequence(seed).spawn(num_workers)
+        # Workers must share the parent's resource tracker, which would otherwise
+        # report the buffers attached to by the parent as leaked.
+        resource_tracker.ensure_running()
+        for i in range(num_workers):
+            out_queue = multiprocessing.Queue()
+            free_queue = multiprocessing.Queue()
+            for slot in range(prefetch):
+                free_queue.put(slot)
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(
+                    dataset,
+                    self.names,
+                    i,
+                    num_workers,
+                    int(seeds[i].generate_state(1)[0]),
+                    out_queue,
+                    free_queue,
+                    self._stop_event,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self._out_queues.append(out_queue)
+            self._free_queues.append(free_queue)
+            self._processes.append(process)
+
+    def _get(self, worker):
+        while True:
+            try:
+                return self._out_queues[worker].get(timeout=1)
+            except queue.Empty:
+                if not self._processes[worker].is_alive():
+                    raise RuntimeError(f"Data loader worker {worker} died.")
+
+    def _attach(self, worker, slot, name):
+        shm = self._shms.get((worker, slot))
+        if shm is None or shm.name.lstrip("/") != name.lstrip("/"):
+            if shm is not None:
+                shm.close()
+            shm = SharedMemory(name=name)
+            self._shms[worker, slot] = shm
+        return shm
+
+    def next_batch(self):
+        worker = self._next_worker
+        start = time.perf_counter()
+        message = self._get(worker)
+        self.wait_time += time.perf_counter() - start
+        if message[0] == "error":
+            self.close()
+            raise RuntimeError(f"Data loader worker {worker} failed:\n{message[1]}")
+        slot, name, layout, work_time = message
+        self.work_time += work_time
+        self.n_batches += 1
+        shm = self._attach(worker, slot, name)
+        batch = {
+            key: np.ndarray(shape, np.float32, buffer=shm.buf, offset=offset).copy()
+            for key, (shape, offset) in layout.items()
+        }
+        self._free_queues[worker].put(slot)
+        self._next_worker = (worker + 1) % self.num_workers
+        return batch
+
+    def close(self):
+        self._stop_event.set()
+        for free_queue in self._free_queues:
+            free_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for shm in self._shms.values():
+            shm.close()
+        self._shms.clear()
+        self._processes = []
+
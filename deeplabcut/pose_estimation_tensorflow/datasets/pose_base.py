@@ -10,13 +10,17 @@ Licensed under GNU Lesser General Public License v3.0
 
 
 import abc
+import os
+
 import numpy as np
+from deeplabcut.utils.auxfun_videos import imread
 
 
 class BasePoseDataset(metaclass=abc.ABCMeta):
     # TODO Finish implementing actual abstract class
     def __init__(self, cfg):
         self.cfg = cfg
+        self.image_cache = None
 
     @abc.abstractmethod
     def load_dataset(self):
@@ -26,6 +30,19 @@ class BasePoseDataset(metaclass=abc.ABCMeta):
     def next_batch(self):
         ...
 
+    def shard(self, index, num_shards):
+        """Restrict the dataset to the index-th of num_shards parallel loaders.
+
+        Datasets sampling images at random need nothing more than the distinct
+        seeds of the loaders; datasets iterating over the images override it.
+        """
+
+    def read_image(self, im_file):
+        """Read a training image, from the decoded-image cache if there is one."""
+        if self.image_cache is not None:
+            return self.image_cache.read(im_file)
+        return imread(os.path.join(self.cfg["project_path"], im_file), mode="skimage")
+
     def sample_scale(self):
         if self.cfg.get("deterministic", False):
             np.random.seed(42)
@@ -40,6 +40,8 @@ class DeterministicPoseDataset(BasePoseDataset):
                 cfg["all_joints"], cfg["num_joints"]
             )
         self.curr_img = 0
+        self._n_samples = 0
+        self._shard = 0, 1
         self.scale = cfg["global_scale"]
         self.locref_scale = 1.0 / cfg["locref_stdev"]
         self.stride = cfg["stride"]
@@ -128,12 +130,21 @@ class DeterministicPoseDataset(BasePoseDataset):
             num *= 2
         return num
 
-    def next_training_sample(self):
-        if self.curr_img == 0 and self.shuffle:
-            self.shuffle_images()
+    def shard(self, index, num_shards):
+        self._shard = index, num_shards
 
-        curr_img = self.curr_img
-        self.curr_img = (self.curr_img + 1) % self.num_training_samples()
+    def next_training_sample(self):
+        # With parallel loaders, each one only yields every num_shards-th sample
+        index, num_shards = self._shard
+        while True:
+            if self.curr_img == 0 and self.shuffle:
+                self.shuffle_images()
+
+            curr_img = self.curr_img
+            self.curr_img = (self.curr_img + 1) % self.num_training_samples()
+            self._n_samples += 1
+            if (self._n_samples - 1) % num_shards == index:
+                break
 
         imidx = self.image_indices[curr_img]
         mirror = self.cfg["mirror"] and self.mirrored[curr_img]
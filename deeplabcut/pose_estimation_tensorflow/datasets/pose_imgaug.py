@@ -23,9 +23,9 @@ import imgaug.augmenters as iaa
 import numpy as np
 import scipy.io as sio
 from deeplabcut.pose_estimation_tensorflow.datasets import augmentation
-from deeplabcut.utils.auxfun_videos import imread
 from deeplabcut.utils.conversioncode import robust_split_path
 from .factory import PoseDatasetFactory
+from .image_cache import ImageCache
 from .pose_base import BasePoseDataset
 from .utils import DataItem, Batch
 
@@ -37,6 +37,9 @@ class ImgaugPoseDataset(BasePoseDataset):
         super(ImgaugPoseDataset, self).__init__(cfg)
         self._n_kpts = len(cfg["all_joints_names"])
         self.data = self.load_dataset()
+        self.image_cache = ImageCache.from_cfg(
+            cfg, [data_item.im_path for data_item in self.data]
+        )
         self.batch_size = cfg.get("batch_size", 1)
         self.num_images = len(self.data)
         self.max_input_sizesquare = cfg.get("max_input_size", 1500) ** 2
@@ -331,9 +334,7 @@ class ImgaugPoseDataset(BasePoseDataset):
             im_file = data_item.im_path
 
             logging.debug("image %s", im_file)
-            image = imread(
-                os.path.join(self.cfg["project_path"], im_file), mode="skimage"
-            )
+            image = self.read_image(im_file)
 
             if self.has_gt:
                 joints = data_item.joints
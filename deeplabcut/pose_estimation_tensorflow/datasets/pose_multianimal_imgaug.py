@@ -21,9 +21,8 @@ from deeplabcut.pose_estimation_tensorflow.datasets.factory import PoseDatasetFa
 from deeplabcut.pose_estimation_tensorflow.datasets.pose_base import BasePoseDataset
 from deeplabcut.pose_estimation_tensorflow.datasets.utils import DataItem, Batch
 from deeplabcut.utils import auxiliaryfunctions, auxfun_multianimal
-from deeplabcut.utils.auxfun_videos import imread
+from deeplabcut.pose_estimation_tensorflow.datasets.image_cache import ImageCache
 from deeplabcut.utils.conversioncode import robust_split_path
-from math import sqrt
 
 
 @PoseDatasetFactory.register("multi-animal-imgaug")
@@ -39,6 +38,9 @@ class MAImgaugPoseDataset(BasePoseDataset):
         self._n_kpts = len(multi) + len(unique)
         self._n_animals = len(animals)
         self.data = self.load_dataset()
+        self.image_cache = ImageCache.from_cfg(
+            cfg, [data_item.im_path for data_item in self.data]
+        )
         self.num_images = len(self.data)
         self.batch_size = cfg["batch_size"]
         print("Batch Size is %d" % self.batch_size)
@@ -261,9 +263,7 @@ class MAImgaugPoseDataset(BasePoseDataset):
             im_file = data_item.im_path
 
             logging.debug("image %s", im_file)
-            image = imread(
-                os.path.join(self.cfg["project_path"], im_file), mode="skimage"
-            )
+            image = self.read_image(im_file)
             if self.has_gt:
                 Joints = data_item.joints
                 kpts = np.zeros((self._n_kpts * self._n_animals, 2))
@@ -429,13 +429,12 @@ class MAImgaugPoseDataset(BasePoseDataset):
     def compute_scmap_weights(self, scmap_shape, joint_id):
         cfg = self.cfg
         if cfg["weigh_only_present_joints"]:
-            weights = np.zeros(scmap_shape)
-            for k, j_id in enumerate(
-                np.concatenate(joint_id)
-            ):  # looping over all animals
-                weights[:, :, j_id] = 1.0
+            weights = np.zeros(scmap_shape, np.float32)
+            # Looping over all animals
+            for ids in joint_id:
+                weights[:, :, np.asarray(ids, dtype=int)] = 1.0
         else:
-            weights = np.ones(scmap_shape)
+            weights = np.ones(scmap_shape, np.float32)
         return weights
 
     def compute_target_part_scoremap_numpy(
@@ -445,118 +444,75 @@ class MAImgaugPoseDataset(BasePoseDataset):
         half_stride = stride // 2
         dist_thresh = float(self.cfg["pos_dist_thresh"] * scale)
         num_idchannel = self.cfg.get("num_idchannel", 0)
-
         num_joints = self.cfg["num_joints"]
-
-        scmap = np.zeros((*size, num_joints + num_idchannel))
-        locref_size = *size, num_joints * 2
-        locref_map = np.zeros(locref_size)
+        num_limbs = self.cfg["num_limbs"]
+        weigh_only_present_joints = self.cfg["weigh_only_present_joints"]
         locref_scale = 1.0 / self.cfg["locref_stdev"]
-        dist_thresh_sq = dist_thresh ** 2
-
-        partaffinityfield_shape = *size, self.cfg["num_limbs"] * 2
-        partaffinityfield_map = np.zeros(partaffinityfield_shape)
-        if self.cfg["weigh_only_present_joints"]:
-            partaffinityfield_mask = np.zeros(partaffinityfield_shape)
-            locref_mask = np.zeros(locref_size)
-        else:
-            partaffinityfield_mask = np.ones(partaffinityfield_shape)
-            locref_mask = np.ones(locref_size)
 
         height, width = size
-        grid = np.mgrid[:height, :width].transpose((1, 2, 0))
-        xx = np.expand_dims(grid[..., 1], axis=2)
-        yy = np.expand_dims(grid[..., 0], axis=2)
+        scmap = np.zeros((height, width, num_joints + num_idchannel), np.float32)
+        locref_map = np.zeros((height, width, num_joints * 2), np.float32)
+        partaffinityfield_map = np.zeros((height, width, num_limbs * 2), np.float32)
+        fill = 0 if weigh_only_present_joints else 1
+        locref_mask = np.full(locref_map.shape, fill, np.float32)
+        partaffinityfield_mask = np.full(partaffinityfield_map.shape, fill, np.float32)
+
+        coords = np.asarray(coords, dtype=float).reshape((-1, 2))
+        sizes = [len(ids) for ids in joint_id]
+        bodyparts = np.array([ind for ids in joint_id for ind in ids], dtype=int)
 
         # Produce score maps and location refinement fields
-        coords_sm = np.round((coords - half_stride) / stride).astype(int)
-        mins = np.round(np.maximum(coords_sm - dist_thresh - 1, 0)).astype(int)
-        maxs = np.round(
-            np.minimum(coords_sm + dist_thresh + 1, [width - 1, height - 1])
-        ).astype(int)
-        dx = coords[:, 0] - xx * stride - half_stride
-        dx_ = dx * locref_scale
-        dy = coords[:, 1] - yy * stride - half_stride
-        dy_ = dy * locref_scale
-        dist = dx ** 2 + dy ** 2
-        mask1 = dist <= dist_thresh_sq
-        mask2 = (xx >= mins[:, 0]) & (xx <= maxs[:, 0])
-        mask3 = (yy >= mins[:, 1]) & (yy <= maxs[:, 1])
-        mask = mask1 & mask2 & mask3
-        for n, ind in enumerate(np.concatenate(joint_id).tolist()):
-            mask_ = mask[..., n]
-            scmap[mask_, ind] = 1
-            if self.cfg["weigh_only_present_joints"]:
-                locref_mask[mask_, [ind * 2 + 0, ind * 2 + 1]] = 1.0
-            locref_map[mask_, ind * 2 + 0] = dx_[mask_, n]
-            locref_map[mask_, ind * 2 + 1] = dy_[mask_, n]
+        n, y, x, dx, dy = _keypoint_neighborhoods(
+            coords, stride, half_stride, dist_thresh, size
+        )
+        ind = bodyparts[n]
+        scmap[y, x, ind] = 1
+        # Where keypoints of several animals overlap, the last one wins
+        last = _last_writes((y, x, ind), (height, width, num_joints))
+        y_, x_, ind_ = y[last], x[last], ind[last]
+        locref_map[y_, x_, ind_ * 2] = dx[last] * locref_scale
+        locref_map[y_, x_, ind_ * 2 + 1] = dy[last] * locref_scale
+        if weigh_only_present_joints:
+            locref_mask[y_, x_, ind_ * 2] = 1
+            locref_mask[y_, x_, ind_ * 2 + 1] = 1
 
         if num_idchannel > 0:
-            coordinateoffset = 0
-            # Find indices of individuals in joint_id
-            idx = [
-                (i, id_)
-                for i, id_ in enumerate(data_item.joints)
-                if id_ < num_idchannel
-            ]
-            for i, person_id in idx:
-                joint_ids = joint_id[i]
-                n_joints = joint_ids.size
-                if n_joints:
-                    inds = np.arange(n_joints) + coordinateoffset
-                    mask_ = mask[..., inds].any(axis=2)
-                    scmap[mask_, person_id + num_joints] = 1
-                coordinateoffset += n_joints
-
-        coordinateoffset = 0  # the offset based on
-        y, x = np.rollaxis(grid * stride + half_stride, 2)
-        for person_id in range(len(joint_id)):
-            joint_ids = joint_id[person_id].tolist()
-            if len(joint_ids) >= 2:  # there is a possible edge
-                for l, (bp1, bp2) in enumerate(self.cfg["partaffinityfield_graph"]):
-                    try:
-                        ind1 = joint_ids.index(bp1)
-                    except ValueError:
-                        continue
-                    try:
-                        ind2 = joint_ids.index(bp2)
-                    except ValueError:
-                        continue
-                    j_x, j_y = coords[ind1 + coordinateoffset]
-                    linkedj_x, linkedj_y = coords[ind2 + coordinateoffset]
-                    dist = sqrt((linkedj_x - j_x) ** 2 + (linkedj_y - j_y) ** 2)
-                    if dist > 0:
-                        Dx = (linkedj_x - j_x) / dist  # x-axis UNIT VECTOR
-                        Dy = (linkedj_y - j_y) / dist
-                        d1 = [
-                            Dx * j_x + Dy * j_y,
-                            Dx * linkedj_x + Dy * linkedj_y,
-                        ]  # in-line with direct axis
-                        d1lowerboundary = min(d1)
-                        d1upperboundary = max(d1)
-                        d2mid = j_y * Dx - j_x * Dy  # orthogonal direction
-
-                        distance_along = Dx * x + Dy * y
-                        distance_across = (
-                            ((y * Dx - x * Dy) - d2mid)
-                            * 1.0
-                            / self.cfg["pafwidth"]
-                            * scale
-                        )
-
-                        mask1 = (distance_along >= d1lowerboundary) & (
-                            distance_along <= d1upperboundary
-                        )
-                        distance_across_abs = np.abs(distance_across)
-                        mask2 = distance_across_abs <= 1
-                        mask = mask1 & mask2
-                        temp = 1 - distance_across_abs[mask]
-                        if self.cfg["weigh_only_present_joints"]:
-                            partaffinityfield_mask[mask, [l * 2 + 0, l * 2 + 1]] = 1.0
-                        partaffinityfield_map[mask, l * 2 + 0] = Dx * temp
-                        partaffinityfield_map[mask, l * 2 + 1] = Dy * temp
-
-            coordinateoffset += len(joint_ids)  # keeping track of the blocks
+            individuals = np.repeat(list(data_item.joints), sizes)[n]
+            has_channel = individuals < num_idchannel
+            channels = num_joints + individuals[has_channel]
+            scmap[y[has_channel], x[has_channel], channels] = 1
+
+        # Produce part affinity fields, only around the limbs of every animal
+        graph = np.reshape(self.cfg["partaffinityfield_graph"], (-1, 2)).astype(int)
+        # Index of the keypoint of every bodypart of every animal, -1 if missing
+        keypoint_inds = np.full((len(joint_id), num_joints), -1)
+        start = 0
+        for person, ids in enumerate(joint_id):
+            ids = np.asarray(ids, dtype=int)
+            keypoint_inds[person, ids] = start + np.arange(ids.size)
+            start += ids.size
+        inds1 = keypoint_inds[:, graph[:, 0]]
+        inds2 = keypoint_inds[:, graph[:, 1]]
+        present = (inds1 >= 0) & (inds2 >= 0)
+        _, limbs = np.nonzero(present)
+        l, y, x, unit_vectors, distance_across = _limb_neighborhoods(
+            coords[inds1[present]],
+            coords[inds2[present]],
+            stride,
+            half_stride,
+            self.cfg["pafwidth"],
+            scale,
+            size,
+        )
+        limb = limbs[l]
+        last = _last_writes((y, x, limb), (height, width, num_limbs))
+        y, x, limb = y[last], x[last], limb[last]
+        fields = unit_vectors[l[last]] * (1 - distance_across[last, None])
+        partaffinityfield_map[y, x, limb * 2] = fields[:, 0]
+        partaffinityfield_map[y, x, limb * 2 + 1] = fields[:, 1]
+        if weigh_only_present_joints:
+            partaffinityfield_mask[y, x, limb * 2] = 1
+            partaffinityfield_mask[y, x, limb * 2 + 1] = 1
 
         weights = self.compute_scmap_weights(scmap.shape, joint_id)
         return (
@@ -696,3 +652,87 @@ class MAImgaugPoseDataset(BasePoseDataset):
 
         weights = self.compute_scmap_weights(scmap.shape, joint_id)
         return scmap, weights, locref_map, locref_mask
+
+
+def _keypoint_neighborhoods(coords, stride, half_stride, dist_thresh, size):
+    """Score map cells within dist_thresh pixels of each keypoint, computed in a
+    window around the keypoints rather than over the whole map.
+
+    Returns the indices of the keypoints, the cells' coordinates and the offsets
+    from the cells' centers to the keypoints, ordered by keypoint.
+    """
+    height, width = size
+    radius = int(np.ceil(dist_thresh / stride)) + 1
+    offsets = np.arange(-radius, radius + 1)
+    coords_sm = np.round((coords - half_stride) / stride)
+    mins = np.round(np.maximum(coords_sm - dist_thresh - 1, 0))
+    maxs = np.round(np.minimum(coords_sm + dist_thresh + 1, [width - 1, height - 1]))
+    xx = coords_sm[:, 0, None, None] + offsets
+    yy = coords_sm[:, 1, None, None] + offsets[:, None]
+    dx = coords[:, 0, None, None] - xx * stride - half_stride
+    dy = coords[:, 1, None, None] - yy * stride - half_stride
+    dx, dy = np.broadcast_arrays(dx, dy)
+    mask = (
+        (dx ** 2 + dy ** 2 <= dist_thresh ** 2)
+        & (xx >= mins[:, 0, None, None])
+        & (xx <= maxs[:, 0, None, None])
+        & (yy >= mins[:, 1, None, None])
+        & (yy <= maxs[:, 1, None, None])
+    )
+    n, i, j = np.nonzero(mask)
+    y = yy[n, i, 0].astype(int)
+    x = xx[n, 0, j].astype(int)
+    return n, y, x, dx[n, i, j], dy[n, i, j]
+
+
+def _limb_neighborhoods(starts, ends, stride, half_stride, pafwidth, scale, size):
+    """Score map cells covered by the part affinity fields of limbs going from
+    starts to ends, computed in the bounding box of every limb.
+
+    Returns the indices of the limbs, the cells' coordinates, the limbs' unit
+    vectors and the cells' relative distances across the limbs (in [0, 1]).
+    """
+    height, width = size
+    vectors = ends - starts
+    lengths = np.sqrt(vectors[:, 0] ** 2 + vectors[:, 1] ** 2)
+    valid = lengths > 0
+    unit_vectors = np.zeros_like(vectors)
+    unit_vectors[valid] = vectors[valid] / lengths[valid, None]
+    half_width = pafwidth / scale
+    lo = np.floor((np.minimum(starts, ends) - half_width - half_stride) / stride)
+    hi = np.ceil((np.maximum(starts, ends) + half_width - half_stride) / stride)
+    lo = np.maximum(lo, 0)
+    hi = np.minimum(hi, [width - 1, height - 1])
+    n_cols, n_rows = np.maximum(hi - lo + 1, 0).max(axis=0, initial=0).astype(int)
+    xx = lo[:, 0, None, None] + np.arange(n_cols)
+    yy = lo[:, 1, None, None] + np.arange(n_rows)[:, None]
+    x_ = xx * stride + half_stride
+    y_ = yy * stride + half_stride
+    dx, dy = unit_vectors[:, 0, None, None], unit_vectors[:, 1, None, None]
+    x1, y1 = starts[:, 0, None, None], starts[:, 1, None, None]
+    x2, y2 = ends[:, 0, None, None], ends[:, 1, None, None]
+    d1 = dx * x1 + dy * y1
+    d2 = dx * x2 + dy * y2
+    d2mid = y1 * dx - x1 * dy
+    distance_along = dx * x_ + dy * y_
+    distance_across = np.abs(((y_ * dx - x_ * dy) - d2mid) * 1.0 / pafwidth * scale)
+    mask = (
+        (distance_along >= np.minimum(d1, d2))
+        & (distance_along <= np.maximum(d1, d2))
+        & (distance_across <= 1)
+        & (xx <= hi[:, 0, None, None])
+        & (yy <= hi[:, 1, None, None])
+        & valid[:, None, None]
+    )
+    n, i, j = np.nonzero(mask)
+    y = yy[n, i, 0].astype(int)
+    x = xx[n, 0, j].astype(int)
+    return n, y, x, unit_vectors, distance_across[n, i, j]
+
+
+def _last_writes(indices, shape):
+    """Positions of the last of the repeated indices, so that assigning through
+    them gives the same result as assigning in a loop, where the last one wins."""
+    flat = np.ravel_multi_index(indices, shape)
+    _, first = np.unique(flat[::-1], return_index=True)
+    return len(flat) - 1 - first
@@ -230,6 +230,215 @@ def tf_to_pb(sess, checkpoint, output, output_dir=None):
         file.write(frozen_graph_def.SerializeToString())
 
 
+def freeze_inference_graph(dlc_cfg):
+    """
+    Builds the inference graph of a snapshot and freezes its variables into constants.
+
+    Single animal models expose the ``poses`` output of the GPU inference layers, a
+    (batch size * number of body parts) x 3 array of y, x, likelihood. Multi-animal
+    models expose the test heads ``scmaps``, ``locrefs`` (if location refinement is
+    used), ``pafs`` (if part affinity fields are predicted) and ``peaks``, in the
+    order expected by ``predict_multianimal.predict_batched_peaks_and_costs``.
+    The batch size and image dimensions are left undefined.
+
+    Parameters
+    ----------
+    dlc_cfg : dict
+        pose configuration; its ``init_weights`` must point to a snapshot
+
+    Returns
+    --------
+    graph_def : tf.compat.v1.GraphDef
+        the frozen graph
+    input_name : string
+        name of the input placeholder
+    output_names : list of strings
+        names of the output nodes
+    """
+    dlc_cfg = dict(dlc_cfg, batch_size=None)
+    if "multi-animal" in dlc_cfg["dataset_type"]:
+        sess, inputs, outputs = predict.setup_pose_prediction(dlc_cfg)
+        output_names = ["scmaps"]
+        if dlc_cfg["location_refinement"]:
+            output_names.append("locrefs")
+        if len(outputs) > len(output_names) + 1:
+            output_names.append("pafs")
+        output_names.append("peaks")
+    else:
+        sess, inputs, outputs = predict.setup_GPUpose_prediction(dlc_cfg)
+        output_names = ["poses"]
+    output_names = [
+        tf.identity(output, name=name).op.name
+        for name, output in zip(output_names, outputs)
+    ]
+    graph_def = tf.compat.v1.graph_util.convert_variables_to_constants(
+        sess, sess.graph.as_graph_def(), output_names,
+    )
+    sess.close()
+    return graph_def, inputs.op.name, output_names
+
+
+def _convert_unravel_index(ctx, node, name, args):
+    """tf2onnx handler for UnravelIndex, which has no ONNX counterpart.
+
+    The inference layers only unravel indices into 2D (height x width) maps,
+    hence rows and columns are recovered by integer division and modulo.
+    """
+    from tf2onnx import utils
+    from tf2onnx.graph_builder import GraphBuilder
+
+    indices, dims = node.input
+    one = ctx.make_const(utils.make_name("one"), np.array([1], dtype=np.int64))
+    width = ctx.make_node("Gather", [dims, one.output[0]]).output[0]
+    rows = ctx.make_node("Div", [indices, width]).output[0]
+    cols = ctx.make_node("Mod", [indices, width]).output[0]
+    builder = GraphBuilder(ctx)
+    node.type = "Concat"
+    ctx.replace_inputs(
+        node,
+        [
+            builder.make_unsqueeze({"data": rows, "axes": [0]}),
+            builder.make_unsqueeze({"data": cols, "axes": [0]}),
+        ],
+    )
+    node.set_attr("axis", 0)
+
+
+def tf_to_onnx(dlc_cfg, onnx_file, opset=13):
+    """
+    Converts a snapshot to an ONNX model, e.g. for inference with ONNX Runtime.
+
+    Requires tf2onnx (``pip install tf2onnx``). See ``freeze_inference_graph`` for
+    the model outputs.
+
+    Parameters
+    ----------
+    dlc_cfg : dict
+        pose configuration; its ``init_weights`` must point to a snapshot
+    onnx_file : string
+        path the ONNX model is written to
+    opset : int, optional
+        ONNX opset to target. Default = 13
+    """
+    import tf2onnx
+
+    graph_def, input_name, output_names = freeze_inference_graph(dlc_cfg)
+    tf2onnx.convert.from_graph_def(
+        graph_def,
+        input_names=[input_name + ":0"],
+        output_names=[name + ":0" for name in output_names],
+        opset=opset,
+        custom_op_handlers={"UnravelIndex": (_convert_unravel_index, [])},
+        output_path=onnx_file,
+    )
+
+
+def _sample_calibration_images(project_path, n_images=100, seed=0):
+    """Randomly sample annotated frames from the project's labeled-data folders."""
+    from deeplabcut.utils.auxfun_videos import imread
+
+    images = [
+        image
+        for image in sorted(
+            glob.glob(os.path.join(project_path, "labeled-data", "*", "*.png"))
+        )
+        if not os.path.dirname(image).endswith("_labeled")
+    ]
+    if not images:
+        raise FileNotFoundError(
+            "No calibration frames found in %s."
+            % os.path.join(project_path, "labeled-data")
+        )
+    rng = np.random.default_rng(seed)
+    images = rng.choice(images, min(n_images, len(images)), replace=False)
+    return [imread(image, mode="skimage") for image in images]
+
+
+def quantize_onnx(onnx_file, output_file, precision, project_path=None, n_images=100):
+    """
+    Converts an ONNX model (see ``tf_to_onnx``) to reduced precision.
+
+    Experimental: on a single CPU core, the int8 model of a mobilenet_v2_0.35 ran
+    slower than the float32 one (121 vs 95 ms/frame), and ResNet backbones were not
+    benchmarked. Measure the speed and accuracy of the quantized model (see
+    ``evaluate_network(..., precision="int8")``) before using it.
+
+    Parameters
+    ----------
+    onnx_file : string
+        path to the float32 ONNX model
+    output_file : string
+        path the reduced precision model is written to
+    precision : string
+        Only "int8" is supported: static post-training quantization with ONNX
+        Runtime of the convolutions, while the keypoint decoding stays in float32.
+        Activation ranges are calibrated on frames sampled from the project's
+        labeled-data.
+    project_path : string, optional
+        path to the project, required for int8 calibration
+    n_images : int, optional
+        number of frames used for calibration. Default = 100
+    """
+    import onnx
+
+    if precision == "int8":
+        from onnxruntime import quantization
+
+        input_name = onnx.load(onnx_file).graph.input[0].name
+        images = _sample_calibration_images(project_path, n_images)
+
+        class _CalibrationReader(quantization.CalibrationDataReader):
+            def __init__(self):
+                self._images = iter(images)
+
+            def get_next(self):
+                image = next(self._images, None)
+                if image is None:
+                    return None
+                return {input_name: image[np.newaxis].astype(np.float32)}
+
+        quantization.quantize_static(
+            onnx_file,
+            output_file,
+            _CalibrationReader(),
+            quant_format=quantization.QuantFormat.QDQ,
+            op_types_to_quantize=["Conv", "ConvTranspose"],
+            per_channel=True,
+            activation_type=quantization.QuantType.QUInt8,
+            weight_type=quantization.QuantType.QInt8,
+        )
+    else:
+        raise ValueError(
+            f"Unknown precision {precision}; only 'int8' is supported."
+        )
+
+
+def onnx_model_path(dlc_cfg, precision="float32"):
+    """Path of the ONNX export of the snapshot in ``dlc_cfg['init_weights']``."""
+    if precision == "float32":
+        return dlc_cfg["init_weights"] + ".onnx"
+    return dlc_cfg["init_weights"] + "_" + precision + ".onnx"
+
+
+def export_onnx(dlc_cfg, precision="float32", overwrite=False):
+    """
+    Exports the snapshot in ``dlc_cfg['init_weights']`` to ONNX next to it,
+    converting it to ``precision`` (see ``quantize_onnx``) if required.
+    Returns the path to the model.
+    """
+    onnx_file = onnx_model_path(dlc_cfg)
+    if overwrite or not os.path.exists(onnx_file):
+        print("Exporting the model to ONNX", onnx_file)
+        tf_to_onnx(dlc_cfg, onnx_file)
+    if precision == "float32":
+        return onnx_file
+    output_file = onnx_model_path(dlc_cfg, precision)
+    if overwrite or not os.path.exists(output_file):
+        print("Converting the model to", precision, output_file)
+        quantize_onnx(onnx_file, output_file, precision, dlc_cfg["project_path"])
+    return output_file
+
+
 def export_model(
     cfg_path,
     shuffle=1,
@@ -241,6 +450,8 @@ def export_model(
     make_tar=True,
     wipepaths=False,
     modelprefix="",
+    onnx=False,
+    precision="float32",
 ):
     """
 
@@ -283,6 +494,17 @@ def export_model(
     wipepaths : bool, optional
         Removes the actual path of your project and the init_weights from pose_cfg.
 
+    onnx : bool, optional
+        Also export the model to ONNX (requires tf2onnx), for CPU inference with
+        ONNX Runtime. See ``tf_to_onnx``. Default = False
+
+    precision : string, optional
+        Precision of the ONNX model, "float32" or "int8" (experimental). The int8
+        model is exported in addition to the float32 one, and calibrated on frames
+        from the project's labeled-data. Its accuracy can be compared to the float32
+        model with ``evaluate_network(..., precision="int8")``. See ``quantize_onnx``.
+        Default = "float32"
+
     Example:
     --------
     Export the first stored snapshot for model trained with shuffle 3:
@@ -367,6 +589,19 @@ def export_model(
 
     tf_to_pb(sess, ckpt, output, output_dir=full_export_dir)
 
+    if onnx or precision != "float32":
+        onnx_file = os.path.normpath(
+            full_export_dir + "/" + os.path.basename(ckpt) + ".onnx"
+        )
+        tf_to_onnx(dlc_cfg, onnx_file)
+        if precision != "float32":
+            quantize_onnx(
+                onnx_file,
+                os.path.splitext(onnx_file)[0] + "_" + precision + ".onnx",
+                precision,
+                cfg["project_path"],
+            )
+
     ### tar export directory
 
     if make_tar:
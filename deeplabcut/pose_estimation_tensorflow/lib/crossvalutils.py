@@ -8,6 +8,7 @@ https://github.com/DeepLabCut/DeepLabCut/blob/master/AUTHORS
 Licensed under GNU Lesser General Public License v3.0
 """
 
+import multiprocessing
 import os
 import pickle
 import shutil
@@ -182,6 +183,7 @@ def _benchmark_paf_graphs(
     margin=0,
     symmetric_kpts=None,
     split_inds=None,
+    n_processes=None,
 ):
     metadata = data.pop("metadata")
     multi_bpts_orig = auxfun_multianimal.extractindividualsandbodyparts(config)[2]
@@ -232,17 +234,18 @@ def _benchmark_paf_graphs(
     ids = np.vectorize(map_.get)(idx.get_level_values("individuals").to_numpy())
     ground_truth = np.insert(ground_truth, 2, ids, axis=2)
 
-    # Assemble animals on the full set of detections
+    # Links are extracted once for all the edges of the graphs to benchmark;
+    # every graph then only reruns the assembly step with its own edges.
     paf_inds = sorted(paf_inds, key=len)
     n_graphs = len(paf_inds)
-    all_scores = []
-    all_metrics = []
-    all_assemblies = []
-    for j, paf in enumerate(paf_inds, start=1):
-        print(f"Graph {j}|{n_graphs}")
+    ass.cache_links(set().union(*paf_inds))
+
+    global wrapped  # Hack to make the function pickable
+
+    def wrapped(paf):
+        # Assemble animals on the full set of detections
         ass.paf_inds = paf
-        ass.assemble()
-        all_assemblies.append((ass.assemblies, ass.unique, ass.metadata["imnames"]))
+        ass.assemble(chunk_size=0)
         if split_inds is not None:
             oks = []
             for inds in split_inds:
@@ -266,9 +269,8 @@ def _benchmark_paf_graphs(
                 symmetric_kpts=symmetric_kpts,
                 greedy_matching=inference_cfg.get("greedy_oks", False),
             )
-        all_metrics.append(oks)
         scores = np.full((len(image_paths), 2), np.nan)
-        for i, imname in enumerate(tqdm(image_paths)):
+        for i, imname in enumerate(image_paths):
             gt = ground_truth[i]
             gt = gt[~np.isnan(gt).any(axis=1)]
             if len(np.unique(gt[:, 2])) < 2:  # Only consider frames with 2+ animals
@@ -295,7 +297,31 @@ def _benchmark_paf_graphs(
                 mat = contingency_matrix(id_gt, id_hyp)
                 purity = mat.max(axis=0).sum() / mat.sum()
                 scores[i, 1] = purity
-        all_scores.append((scores, paf))
+        assemblies = ass.assemblies, ass.unique, ass.metadata["imnames"]
+        return assemblies, oks, (scores, paf)
+
+    # Graphs are benchmarked in parallel, with the detections and links
+    # shared by the forked processes. Spawning (rather than forking) does not
+    # work nicely with the GUI or interactive sessions; in that case,
+    # we fall back to a serial benchmark.
+    n_processes = min(n_processes or os.cpu_count(), n_graphs)
+    if n_processes == 1 or multiprocessing.get_start_method() == "spawn":
+        results = map(wrapped, paf_inds)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(n_processes)
+        results = pool.imap(wrapped, paf_inds)
+    all_scores = []
+    all_metrics = []
+    all_assemblies = []
+    try:
+        for assemblies, oks, scores in tqdm(results, total=n_graphs, desc="Graphs"):
+            all_assemblies.append(assemblies)
+            all_metrics.append(oks)
+            all_scores.append(scores)
+    finally:
+        if pool is not None:
+            pool.terminate()
 
     dfs = []
     for score, inds in all_scores:
@@ -383,6 +409,7 @@ def cross_validate_paf_graphs(
     n_graphs=10,
     paf_inds=None,
     symmetric_kpts=None,
+    n_processes=None,
 ):
     cfg = auxiliaryfunctions.read_config(config)
     inf_cfg = auxiliaryfunctions.read_plainconfig(inference_config)
@@ -427,6 +454,7 @@ def cross_validate_paf_graphs(
         symmetric_kpts=symmetric_kpts,
         calibration_file=calibration_file,
         split_inds=[metadata["data"]["trainIndices"], metadata["data"]["testIndices"],],
+        n_processes=n_processes,
     )
     # Select optimal PAF graph
     df = results[1]
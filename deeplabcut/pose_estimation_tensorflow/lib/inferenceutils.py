@@ -53,6 +53,7 @@ class Link:
     def __init__(self, j1, j2, affinity=1):
         self.j1 = j1
         self.j2 = j2
+        self.idx = j1.idx, j2.idx
         self.affinity = affinity
         self._length = sqrt((j1.pos[0] - j2.pos[0]) ** 2 + (j1.pos[1] - j2.pos[1]) ** 2)
 
@@ -65,10 +66,6 @@ class Link:
     def confidence(self):
         return self.j1.confidence * self.j2.confidence
 
-    @property
-    def idx(self):
-        return self.j1.idx, self.j2.idx
-
     @property
     def length(self):
         return self._length
@@ -268,6 +265,7 @@ class Assembler:
         self._trees = dict()
         self.safe_edge = False
         self._kde = None
+        self._links = None
         self.assemblies = dict()
         self.unique = dict()
 
@@ -377,75 +375,134 @@ class Assembler:
     def extract_best_links(self, joints_dict, costs, trees=None):
         links = []
         for ind in self.paf_inds:
-            s, t = self.graph[ind]
-            dets_s = joints_dict.get(s, None)
-            dets_t = joints_dict.get(t, None)
-            if dets_s is None or dets_t is None:
-                continue
-            if ind not in costs:
-                continue
-            lengths = costs[ind]["distance"]
-            if np.isinf(lengths).all():
-                continue
-            aff = costs[ind][self.method].copy()
-            aff[np.isnan(aff)] = 0
+            links.extend(self._extract_edge_links(ind, joints_dict, costs, trees))
+        return links
 
-            if trees:
-                vecs = np.vstack(
-                    [[*det_s.pos, *det_t.pos] for det_s in dets_s for det_t in dets_t]
-                )
-                dists = []
-                for n, tree in enumerate(trees, start=1):
-                    d, _ = tree.query(vecs)
-                    dists.append(np.exp(-self._gamma * n * d))
-                w = np.mean(dists, axis=0)
-                aff *= w.reshape(aff.shape)
-
-            if self.greedy:
-                conf = np.asarray(
-                    [
-                        [det_s.confidence * det_t.confidence for det_t in dets_t]
-                        for det_s in dets_s
-                    ]
-                )
-                rows, cols = np.where(
-                    (conf >= self.pcutoff * self.pcutoff) & (aff >= self.min_affinity)
-                )
-                candidates = sorted(
-                    zip(rows, cols, aff[rows, cols], lengths[rows, cols]),
-                    key=lambda x: x[2],
-                    reverse=True,
-                )
-                i_seen = set()
-                j_seen = set()
-                for i, j, w, l in candidates:
-                    if i not in i_seen and j not in j_seen:
-                        i_seen.add(i)
-                        j_seen.add(j)
-                        links.append(Link(dets_s[i], dets_t[j], w))
-                        if len(i_seen) == self.max_n_individuals:
-                            break
-            else:  # Optimal keypoint pairing
-                inds_s = sorted(
-                    range(len(dets_s)), key=lambda x: dets_s[x].confidence, reverse=True
-                )[: self.max_n_individuals]
-                inds_t = sorted(
-                    range(len(dets_t)), key=lambda x: dets_t[x].confidence, reverse=True
-                )[: self.max_n_individuals]
-                keep_s = [
-                    ind for ind in inds_s if dets_s[ind].confidence >= self.pcutoff
-                ]
-                keep_t = [
-                    ind for ind in inds_t if dets_t[ind].confidence >= self.pcutoff
+    def _extract_edge_links(self, ind, joints_dict, costs, trees=None):
+        links = []
+        s, t = self.graph[ind]
+        dets_s = joints_dict.get(s, None)
+        dets_t = joints_dict.get(t, None)
+        if dets_s is None or dets_t is None:
+            return links
+        if ind not in costs:
+            return links
+        lengths = costs[ind]["distance"]
+        if np.isinf(lengths).all():
+            return links
+        aff = costs[ind][self.method].copy()
+        aff[np.isnan(aff)] = 0
+
+        if trees:
+            vecs = np.vstack(
+                [[*det_s.pos, *det_t.pos] for det_s in dets_s for det_t in dets_t]
+            )
+            dists = []
+            for n, tree in enumerate(trees, start=1):
+                d, _ = tree.query(vecs)
+                dists.append(np.exp(-self._gamma * n * d))
+            w = np.mean(dists, axis=0)
+            aff *= w.reshape(aff.shape)
+
+        if self.greedy:
+            conf = np.asarray(
+                [
+                    [det_s.confidence * det_t.confidence for det_t in dets_t]
+                    for det_s in dets_s
                 ]
-                aff = aff[np.ix_(keep_s, keep_t)]
-                rows, cols = linear_sum_assignment(aff, maximize=True)
-                for row, col in zip(rows, cols):
-                    w = aff[row, col]
-                    if w >= self.min_affinity:
-                        links.append(Link(dets_s[keep_s[row]], dets_t[keep_t[col]], w))
+            )
+            rows, cols = np.where(
+                (conf >= self.pcutoff * self.pcutoff) & (aff >= self.min_affinity)
+            )
+            candidates = sorted(
+                zip(rows, cols, aff[rows, cols], lengths[rows, cols]),
+                key=lambda x: x[2],
+                reverse=True,
+            )
+            i_seen = set()
+            j_seen = set()
+            for i, j, w, l in candidates:
+                if i not in i_seen and j not in j_seen:
+                    i_seen.add(i)
+                    j_seen.add(j)
+                    links.append(Link(dets_s[i], dets_t[j], w))
+                    if len(i_seen) == self.max_n_individuals:
+                        break
+        else:  # Optimal keypoint pairing
+            inds_s = sorted(
+                range(len(dets_s)), key=lambda x: dets_s[x].confidence, reverse=True
+            )[: self.max_n_individuals]
+            inds_t = sorted(
+                range(len(dets_t)), key=lambda x: dets_t[x].confidence, reverse=True
+            )[: self.max_n_individuals]
+            keep_s = [ind for ind in inds_s if dets_s[ind].confidence >= self.pcutoff]
+            keep_t = [ind for ind in inds_t if dets_t[ind].confidence >= self.pcutoff]
+            aff = aff[np.ix_(keep_s, keep_t)]
+            rows, cols = linear_sum_assignment(aff, maximize=True)
+            for row, col in zip(rows, cols):
+                w = aff[row, col]
+                if w >= self.min_affinity:
+                    links.append(Link(dets_s[keep_s[row]], dets_t[keep_t[col]], w))
         return links
 
+    def _weigh_links(self, links):
+        # Scale the affinities by the probability of the link lengths,
+        # dropping the links no longer likely enough.
+        for link in links[::-1]:
+            p = max(self.calc_link_probability(link), 0.001)
+            link.affinity *= p
+            if link.affinity < self.min_affinity:
+                links.remove(link)
+
+    def cache_links(self, paf_inds=None):
+        """Extract the best links of every edge in ``paf_inds`` (by default, all
+        edges of the graph) once for all frames.
+
+        Links are found independently for every edge, so animals can then be
+        assembled with any subset of these edges (see ``paf_inds``) without
+        extracting them again; only the assembly step is rerun. Links are stored
+        compactly as the edge and joint indices, and the affinity, of each link.
+        They cannot be cached with a temporal ``window_size``, since they would
+        then depend on the links retained in the previous frames.
+        """
+        if self.window_size:
+            raise ValueError("Links cannot be cached with a temporal window_size.")
+
+        if paf_inds is None:
+            paf_inds = range(len(self.graph))
+        edges = sorted(set(paf_inds))
+        self._links = None
+        links = []
+        for data_dict in tqdm(self, desc="Extracting links"):
+            bag = defaultdict(list)
+            for joint in self._flatten_detections(data_dict):
+                bag[joint.label].append(joint)
+            rows = []
+            affinities = []
+            if bag:
+                for ind in edges:
+                    links_ = self._extract_edge_links(ind, bag, data_dict["costs"])
+                    if self._kde:
+                        self._weigh_links(links_)
+                    rows.extend((ind, *link.idx) for link in links_)
+                    affinities.extend(link.affinity for link in links_)
+            links.append(
+                (np.asarray(rows, dtype=int).reshape((-1, 3)), np.asarray(affinities))
+            )
+        self._links = set(edges), links
+
+    def _gather_links(self, joints, ind_frame):
+        # Cached links of the edges in paf_inds, in the order they would be extracted
+        _, links = self._links
+        rows, affinities = links[ind_frame]
+        starts = np.searchsorted(rows[:, 0], self.paf_inds, side="left")
+        ends = np.searchsorted(rows[:, 0], self.paf_inds, side="right")
+        return [
+            Link(joints[rows[n, 1]], joints[rows[n, 2]], affinities[n])
+            for start, end in zip(starts, ends)
+            for n in range(start, end)
+        ]
+
     def _fill_assembly(self, assembly, lookup, assembled, safe_edge, nan_policy):
         stack = []
         visited = set()
@@ -513,7 +570,7 @@ class Assembler:
         G = nx.Graph([link.idx for link in links])
         for chain in nx.connected_components(G):
             if len(chain) == self.n_multibodyparts:
-                edges = [tuple(sorted(edge)) for edge in G.edges(chain)]
+                edges = set(tuple(sorted(edge)) for edge in G.edges(chain))
                 assembly = Assembly(self.n_multibodyparts)
                 for link in links:
                     i, j = link.idx
@@ -695,13 +752,12 @@ class Assembler:
                 if tree is not None:
                     trees.append(tree)
 
-            links = self.extract_best_links(bag, data_dict["costs"], trees)
-            if self._kde:
-                for link in links[::-1]:
-                    p = max(self.calc_link_probability(link), 0.001)
-                    link.affinity *= p
-                    if link.affinity < self.min_affinity:
-                        links.remove(link)
+            if self._links is not None and self._links[0].issuperset(self.paf_inds):
+                links = self._gather_links(joints, ind_frame)
+            else:
+                links = self.extract_best_links(bag, data_dict["costs"], trees)
+                if self._kde:
+                    self._weigh_links(links)
 
             if self.window_size >= 1 and links:
                 # Store selected edges for subsequent frames
@@ -114,6 +114,7 @@ def AnalyzeMultiAnimalVideo(
     destfolder=None,
     robust_nframes=False,
     use_shelve=False,
+    batchsize_tuner=None,
 ):
     """Helper function for analyzing a video with multiple individuals"""
 
@@ -154,6 +155,11 @@ def AnalyzeMultiAnimalVideo(
             nx,
             ny,
         )
+        batchsize_info = None
+        if batchsize_tuner is not None:
+            crop = [cfg["x1"], cfg["x2"], cfg["y1"], cfg["y2"]] if cfg["cropping"] else None
+            dlc_cfg["batch_size"], batchsize_info = batchsize_tuner.tune(video, crop)
+
         start = time.time()
 
         print(
@@ -203,6 +209,8 @@ def AnalyzeMultiAnimalVideo(
             "cropping": cfg["cropping"],
             "cropping_parameters": coords,
         }
+        if batchsize_info is not None:
+            dictionary["batch_size_autotune"] = batchsize_info
         metadata = {"data": dictionary}
         print("Video Analyzed. Saving results in %s..." % (destfolder))
 
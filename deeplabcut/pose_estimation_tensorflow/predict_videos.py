@@ -16,7 +16,9 @@ import argparse
 import os
 import os.path
 import pickle
+import queue
 import re
+import threading
 import time
 import warnings
 from pathlib import Path
@@ -282,6 +284,12 @@ def analyze_videos(
     calibrate=False,
     identity_only=False,
     use_openvino="CPU" if is_openvino_available else None,
+    backend="tensorflow",
+    intra_op_threads=0,
+    inter_op_threads=0,
+    precision="float32",
+    session_cache=None,
+    motion_threshold=None,
 ):
     """Makes prediction based on a trained network.
 
@@ -327,8 +335,12 @@ def analyze_videos(
         the video is used. Note that for subsequent analysis this folder also needs to
         be passed.
 
-    batchsize: int or None, optional, default=None
+    batchsize: int, str or None, optional, default=None
         Change batch size for inference; if given overwrites value in ``pose_cfg.yaml``.
+        With "auto", the batch size maximizing the throughput is measured on the
+        first frames of each video, and cached per model, resolution and device in
+        the model's test folder (batchsize_autotune.yaml), so that calibration only
+        runs once. The chosen value is stored in the _meta.pickle file.
 
     cropping: list or None, optional, default=None
         List of cropping coordinates as [x1, x2, y1, y2].
@@ -399,6 +411,45 @@ def analyze_videos(
 
     use_openvino: str, optional
         Use "CPU" for inference if OpenVINO is available in the Python environment.
+        Frames are processed in batches of ``batchsize``, with several batches in
+        flight at once; the model is converted once per input resolution and
+        cached next to the snapshot. Works for single and multi-animal projects.
+
+    backend: str, optional, default="tensorflow"
+        Inference engine, either "tensorflow" or "onnxruntime". With "onnxruntime",
+        the snapshot is exported to ONNX (next to the snapshot, requires tf2onnx) the
+        first time it is used, and run on the CPU with ONNX Runtime. This is typically
+        faster than TensorFlow on machines without a GPU. Not supported in dynamic
+        cropping mode nor with ``num_outputs`` > 1 for single animal projects.
+
+    intra_op_threads: int, optional, default=0
+        Number of threads used to parallelize the execution of a single operator by
+        ONNX Runtime. 0 lets ONNX Runtime decide (usually one per physical core).
+
+    inter_op_threads: int, optional, default=0
+        Number of threads used to run independent operators in parallel by ONNX
+        Runtime. 0 lets ONNX Runtime decide.
+
+    precision: str, optional, default="float32"
+        Precision of the ONNX model used by the "onnxruntime" backend: "float32" or
+        "int8" (experimental; quantized after calibration on the project's
+        labeled-data, and not necessarily faster). Check the speed and accuracy cost
+        with ``evaluate_network(..., precision=...)`` first.
+
+    session_cache: SessionCache, optional
+        Cache keeping networks loaded across calls, so that they are only built and
+        restored once; see ``deeplabcut.pose_estimation_tensorflow.server``, whose
+        model server uses it. By default, the network is loaded for every call.
+
+    motion_threshold: float, optional
+        If set, frames in which nothing moves are not analyzed: a frame whose mean
+        absolute difference to the last analyzed frame (on a grayscale thumbnail, in
+        0-255 intensity units) is below this threshold gets the pose of that frame.
+        Values of 1-3 suit static home-cage recordings. One in 50 skippable frames
+        is analyzed anyway to estimate the error made; the skip rate and this error
+        are printed, and stored with the boolean mask of skipped frames
+        ("skipped_frames") in the _meta.pickle file. Only for single animal projects
+        without dynamic cropping.
 
     Returns
     -------
@@ -545,9 +596,13 @@ def analyze_videos(
     # Update number of output and batchsize
     dlc_cfg["num_outputs"] = cfg.get("num_outputs", dlc_cfg.get("num_outputs", 1))
 
+    autotune = batchsize == "auto"
     if batchsize is None:
         # update batchsize (based on parameters in config.yaml)
         dlc_cfg["batch_size"] = cfg["batch_size"]
+    elif autotune:
+        # The network then accepts any batch size; it is chosen for each video
+        dlc_cfg["batch_size"] = None
     else:
         dlc_cfg["batch_size"] = batchsize
         cfg["batch_size"] = batchsize
@@ -562,10 +617,33 @@ def analyze_videos(
         dlc_cfg["num_outputs"] = 1
         TFGPUinference = False
         dlc_cfg["batch_size"] = 1
+        autotune = False
         print(
             "Switching batchsize to 1, num_outputs (per animal) to 1 and TFGPUinference to False (all these features are not supported in this mode)."
         )
 
+    if motion_threshold is not None and (
+        dynamic[0] or "multi-animal" in dlc_cfg["dataset_type"]
+    ):
+        print(
+            "Motion gating is not supported for multi-animal projects nor in dynamic cropping mode; all frames will be analyzed."
+        )
+        motion_threshold = None
+
+    if backend == "onnxruntime":
+        if "multi-animal" not in dlc_cfg["dataset_type"]:
+            if dynamic[0] or dlc_cfg["num_outputs"] > 1:
+                raise ValueError(
+                    "The onnxruntime backend supports neither dynamic cropping nor num_outputs > 1."
+                )
+            # The ONNX model exposes the same pose output as the TF inference layers
+            TFGPUinference = True
+        use_openvino = None
+    elif backend != "tensorflow":
+        raise ValueError(
+            f"Unknown backend {backend}; use 'tensorflow' or 'onnxruntime'."
+        )
+
     # Name for scorer:
     DLCscorer, DLCscorerlegacy = auxiliaryfunctions.get_scorer_name(
         cfg,
@@ -588,17 +666,54 @@ def analyze_videos(
     else:
         xyz_labs = ["x", "y", "likelihood"]
 
-    if use_openvino:
-        sess, inputs, outputs = predict.setup_openvino_pose_prediction(
-            dlc_cfg, device=use_openvino
+    def setup_session():
+        if backend == "onnxruntime":
+            return predict.setup_onnx_pose_prediction(
+                dlc_cfg,
+                intra_op_threads=intra_op_threads,
+                inter_op_threads=inter_op_threads,
+                precision=precision,
+            )
+        elif use_openvino:
+            return predict.setup_openvino_pose_prediction(
+                dlc_cfg, device=use_openvino
+            )
+        elif TFGPUinference:
+            return predict.setup_GPUpose_prediction(
+                dlc_cfg, allow_growth=allow_growth
+            )
+        else:
+            return predict.setup_pose_prediction(dlc_cfg, allow_growth=allow_growth)
+
+    if session_cache is None:
+        sess, inputs, outputs = setup_session()
+    else:
+        key = (
+            dlc_cfg["init_weights"],
+            dlc_cfg["batch_size"],
+            dlc_cfg["num_outputs"],
+            TFGPUinference,
+            use_openvino,
+            backend,
+            precision,
         )
-    elif TFGPUinference:
-        sess, inputs, outputs = predict.setup_GPUpose_prediction(
-            dlc_cfg, allow_growth=allow_growth
+        sess, inputs, outputs = session_cache.get(key, setup_session)
+
+    batchsize_tuner = None
+    if autotune:
+        from deeplabcut.pose_estimation_tensorflow.core.autotune import (
+            BatchSizeTuner,
         )
-    else:
-        sess, inputs, outputs = predict.setup_pose_prediction(
-            dlc_cfg, allow_growth=allow_growth
+
+        model = f"{Snapshots[snapshotindex]}_{backend}"
+        if backend == "onnxruntime":
+            model += f"_{precision}"
+        batchsize_tuner = BatchSizeTuner(
+            sess,
+            inputs,
+            outputs,
+            os.path.join(modelfolder, "test", "batchsize_autotune.yaml"),
+            model,
         )
 
     pdindex = pd.MultiIndex.from_product(
@@ -629,6 +744,7 @@ def analyze_videos(
                     destfolder,
                     robust_nframes=robust_nframes,
                     use_shelve=use_shelve,
+                    batchsize_tuner=batchsize_tuner,
                 )
                 if auto_track:  # tracker type is taken from default in cfg
                     convert_detections2tracklets(
@@ -671,6 +787,8 @@ def analyze_videos(
                     TFGPUinference,
                     dynamic,
                     use_openvino,
+                    motion_threshold,
+                    batchsize_tuner,
                 )
 
         os.chdir(str(start_path))
@@ -717,7 +835,154 @@ def checkcropping(cfg, cap):
     return int(ny), int(nx)
 
 
-def GetPoseF(cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize):
+class MotionGate:
+    """Skip the inference of frames in which nothing moves.
+
+    A frame is compared to the last analyzed frame on a small grayscale thumbnail;
+    if their mean absolute difference (in 0-255 intensity units) is below
+    ``threshold``, it is skipped and the pose of the last analyzed frame is copied
+    forward. Comparing to the last analyzed frame rather than to the previous one
+    prevents slow movements from going unnoticed.
+
+    One in every ``audit_interval`` frames that could be skipped is analyzed
+    anyway, which gives an estimate of the error made on the skipped frames.
+    """
+
+    def __init__(self, threshold, scale=0.125, audit_interval=50):
+        self.threshold = threshold
+        self.scale = scale
+        self.audit_interval = audit_interval
+        self.sources = {}  # Skipped frame -> analyzed frame whose pose it gets
+        self.audits = {}  # Audited frame -> analyzed frame it was compared to
+        self._ref = None
+        self._ref_index = None
+        self._n_static = 0
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        thumbnail = cv2.resize(
+            gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+        )
+        return thumbnail.astype(np.int16)
+
+    def skip(self, frame, index):
+        """Return True if the inference of the (RGB) frame can be skipped."""
+        thumbnail = self._thumbnail(frame)
+        if (
+            self._ref is not None
+            and np.mean(np.abs(thumbnail - self._ref)) < self.threshold
+        ):
+            self._n_static += 1
+            if self._n_static % self.audit_interval:
+                self.sources[index] = self._ref_index
+                return True
+            self.audits[index] = self._ref_index
+            return False
+        self._ref = thumbnail
+        self._ref_index = index
+        return False
+
+    def fill(self, PredictedData):
+        """Copy poses forward to the skipped frames (in place), and return the
+        mask of skipped frames."""
+        mask = np.zeros(len(PredictedData), dtype=bool)
+        if self.sources:
+            skipped = np.fromiter(self.sources.keys(), dtype=int)
+            PredictedData[skipped] = PredictedData[list(self.sources.values())]
+            mask[skipped] = True
+        return mask
+
+    def estimated_error(self, PredictedData):
+        """Mean distance (in pixels) between the poses of the audited frames and
+        the poses they would have been given had they been skipped."""
+        if not self.audits:
+            return np.nan
+        xy = PredictedData.reshape((len(PredictedData), -1, 3))[..., :2]
+        audited = list(self.audits)
+        dist = np.linalg.norm(xy[audited] - xy[list(self.audits.values())], axis=2)
+        return float(np.nanmean(dist))
+
+    def report(self, PredictedData):
+        mask = self.fill(PredictedData)
+        stats = {
+            "threshold": self.threshold,
+            "skip_rate": mask.mean() if mask.size else 0.0,
+            "estimated_error": self.estimated_error(PredictedData),
+            "n_audited": len(self.audits),
+        }
+        print(
+            f"Motion gating skipped {mask.sum()} of {mask.size} frames "
+            f"({100 * stats['skip_rate']:.1f}%); estimated error of the copied "
+            f"poses: {stats['estimated_error']:.2f} px "
+            f"(from {stats['n_audited']} audited frames)."
+        )
+        return mask, stats
+
+
+class PrefetchingCapture:
+    """Read and decode the frames of a cv2.VideoCapture in a background thread.
+
+    Decoding then overlaps with inference (and with the analysis of other videos
+    sharing the same network). It stands in for the capture in the GetPose
+    functions: reads stop, as theirs, at the first failed read past ``nframes``.
+    The properties of the video are read before the thread starts, as the
+    capture must not be used from two threads at once.
+    """
+
+    _PROPS = (
+        cv2.CAP_PROP_FPS,
+        cv2.CAP_PROP_FRAME_COUNT,
+        cv2.CAP_PROP_FRAME_HEIGHT,
+        cv2.CAP_PROP_FRAME_WIDTH,
+    )
+
+    def __init__(self, cap, nframes, buffer_size=16):
+        self.cap = cap
+        self._props = {prop: cap.get(prop) for prop in self._PROPS}
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._read, args=(nframes,), daemon=True
+        )
+        self._thread.start()
+
+    def _read(self, nframes):
+        counter = 0
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            counter += 1
+            while not self._stop.is_set():
+                try:
+                    self._queue.put((ret, frame), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if not ret and counter > nframes:
+                break
+
+    def read(self):
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if not self._thread.is_alive() and self._queue.empty():
+                    return False, None
+
+    def get(self, prop):
+        return self._props[prop]
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self._stop.set()
+        self._thread.join()
+        self.cap.release()
+
+
+def GetPoseF(
+    cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize, motion_gate=None
+):
     """Batchwise prediction of pose"""
     PredictedData = np.zeros(
         (nframes, dlc_cfg["num_outputs"] * 3 * len(dlc_cfg["all_joints_names"]))
@@ -742,11 +1007,11 @@ def GetPoseF(cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize):
         if ret:
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             if cfg["cropping"]:
-                frames[batch_ind] = img_as_ubyte(
-                    frame[cfg["y1"] : cfg["y2"], cfg["x1"] : cfg["x2"]]
-                )
-            else:
-                frames[batch_ind] = img_as_ubyte(frame)
+                frame = frame[cfg["y1"] : cfg["y2"], cfg["x1"] : cfg["x2"]]
+            if motion_gate is not None and motion_gate.skip(frame, counter):
+                counter += 1
+                continue
+            frames[batch_ind] = img_as_ubyte(frame)
             inds.append(counter)
             if batch_ind == batchsize - 1:
                 pose = predict.getposeNP(frames, dlc_cfg, sess, inputs, outputs)
@@ -852,7 +1117,9 @@ def GetPoseS_GTF(cfg, dlc_cfg, sess, inputs, outputs, cap, nframes):
     return PredictedData, nframes
 
 
-def GetPoseF_GTF(cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize):
+def GetPoseF_GTF(
+    cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize, motion_gate=None
+):
     """Batchwise prediction of pose"""
     PredictedData = np.zeros((nframes, 3 * len(dlc_cfg["all_joints_names"])))
     batch_ind = 0  # keeps track of which image within a batch should be written to
@@ -878,11 +1145,11 @@ def GetPoseF_GTF(cfg, dlc_cfg, sess, inputs, outputs, cap, nframes, batchsize):
         if ret:
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             if cfg["cropping"]:
-                frames[batch_ind] = img_as_ubyte(
-                    frame[cfg["y1"] : cfg["y2"], cfg["x1"] : cfg["x2"]]
-                )
-            else:
-                frames[batch_ind] = img_as_ubyte(frame)
+                frame = frame[cfg["y1"] : cfg["y2"], cfg["x1"] : cfg["x2"]]
+            if motion_gate is not None and motion_gate.skip(frame, counter):
+                counter += 1
+                continue
+            frames[batch_ind] = img_as_ubyte(frame)
             inds.append(counter)
             if batch_ind == batchsize - 1:
                 # pose = predict.getposeNP(frames,dlc_cfg, sess, inputs, outputs)
@@ -1008,6 +1275,8 @@ def AnalyzeVideo(
     TFGPUinference=True,
     dynamic=(False, 0.5, 10),
     use_openvino="CPU" if is_openvino_available else None,
+    motion_threshold=None,
+    batchsize_tuner=None,
 ):
     """Helper function for analyzing a video."""
     print("Starting to analyze % ", video)
@@ -1046,25 +1315,36 @@ def AnalyzeVideo(
             ny,
         )
 
+        batchsize_info = None
+        if batchsize_tuner is not None:
+            crop = [cfg["x1"], cfg["x2"], cfg["y1"], cfg["y2"]] if cfg["cropping"] else None
+            dlc_cfg["batch_size"], batchsize_info = batchsize_tuner.tune(video, crop)
+
         dynamic_analysis_state, detectiontreshold, margin = dynamic
+        motion_gate = MotionGate(motion_threshold) if motion_threshold else None
         start = time.time()
+        # Decode frames ahead in the background, up to two batches (and ~256 MB)
+        buffer_size = min(
+            2 * int(dlc_cfg["batch_size"]), 2 ** 28 // max(nx * ny * 3, 1)
+        )
+        cap = PrefetchingCapture(cap, nframes, max(buffer_size, 2))
         print("Starting to extract posture")
-        if dynamic_analysis_state:
-            PredictedData, nframes = GetPoseDynamic(
-                cfg,
-                dlc_cfg,
-                sess,
-                inputs,
-                outputs,
-                cap,
-                nframes,
-                detectiontreshold,
-                margin,
-            )
-            # GetPoseF_GTF(cfg,dlc_cfg, sess, inputs, outputs,cap,nframes,int(dlc_cfg["batch_size"]))
-        else:
-            if int(dlc_cfg["batch_size"]) > 1:
-                args = (
+        try:
+            if dynamic_analysis_state:
+                PredictedData, nframes = GetPoseDynamic(
+                    cfg,
+                    dlc_cfg,
+                    sess,
+                    inputs,
+                    outputs,
+                    cap,
+                    nframes,
+                    detectiontreshold,
+                    margin,
+                )
+                # GetPoseF_GTF(cfg,dlc_cfg, sess, inputs, outputs,cap,nframes,int(dlc_cfg["batch_size"]))
+            elif use_openvino:
+                PredictedData, nframes = GetPoseF_OV(
                     cfg,
                     dlc_cfg,
                     sess,
@@ -1073,22 +1353,37 @@ def AnalyzeVideo(
                     cap,
                     nframes,
                     int(dlc_cfg["batch_size"]),
+                    motion_gate,
                 )
-                if use_openvino:
-                    PredictedData, nframes = GetPoseF_OV(*args)
-                elif TFGPUinference:
-                    PredictedData, nframes = GetPoseF_GTF(*args)
-                else:
-                    PredictedData, nframes = GetPoseF(*args)
             else:
-                if TFGPUinference:
-                    PredictedData, nframes = GetPoseS_GTF(
-                        cfg, dlc_cfg, sess, inputs, outputs, cap, nframes
+                # Motion gating is implemented by the batched functions only
+                if int(dlc_cfg["batch_size"]) > 1 or motion_gate is not None:
+                    args = (
+                        cfg,
+                        dlc_cfg,
+                        sess,
+                        inputs,
+                        outputs,
+                        cap,
+                        nframes,
+                        int(dlc_cfg["batch_size"]),
+                        motion_gate,
                     )
+                    if TFGPUinference:
+                        PredictedData, nframes = GetPoseF_GTF(*args)
+                    else:
+                        PredictedData, nframes = GetPoseF(*args)
                 else:
-                    PredictedData, nframes = GetPoseS(
-                        cfg, dlc_cfg, sess, inputs, outputs, cap, nframes
-                    )
+                    if TFGPUinference:
+                        PredictedData, nframes = GetPoseS_GTF(
+                            cfg, dlc_cfg, sess, inputs, outputs, cap, nframes
+                        )
+                    else:
+                        PredictedData, nframes = GetPoseS(
+                            cfg, dlc_cfg, sess, inputs, outputs, cap, nframes
+                        )
+        finally:
+            cap.release()
 
         stop = time.time()
         if cfg["cropping"] == True:
@@ -1112,6 +1407,13 @@ def AnalyzeVideo(
             "cropping_parameters": coords
             # "gpu_info": device_lib.list_local_devices()
         }
+        if batchsize_info is not None:
+            dictionary["batch_size_autotune"] = batchsize_info
+        if motion_gate is not None:
+            skipped, dictionary["motion_gating"] = motion_gate.report(
+                PredictedData[:nframes]
+            )
+            dictionary["skipped_frames"] = skipped
         metadata = {"data": dictionary}
 
         print(f"Saving results in {destfolder}...")
@@ -0,0 +1,345 @@
+"""
+DeepLabCut2.0 Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+https://github.com/DeepLabCut/DeepLabCut
+Please see AUTHORS for contributors.
+
+https://github.com/DeepLabCut/DeepLabCut/blob/master/AUTHORS
+Licensed under GNU Lesser General Public License v3.0
+
+A long-lived local inference server, which keeps networks loaded across
+analysis jobs. Building a network and restoring its checkpoint takes
+10-30 s; with the server, this is only paid the first time a model is used.
+
+Start the server (from Python or with ``deeplabcut serve``):
+
+>>> from deeplabcut.pose_estimation_tensorflow.server import ModelServer
+>>> ModelServer("/tmp/dlc.sock", capacity=2).serve_forever()
+
+and send jobs to it from any other process:
+
+>>> from deeplabcut.pose_estimation_tensorflow.server import ModelClient
+>>> client = ModelClient("/tmp/dlc.sock")
+>>> client.analyze_videos(config, ["/data/video1.mp4"], shuffle=2)
+>>> poses = client.predict_frames(config, frames)
+
+The server listens on a Unix socket if the address is a path, or on a TCP
+socket if it is a (host, port) tuple. Messages are exchanged with
+``multiprocessing.connection``, so frames are sent as numpy arrays.
+
+Security: messages are pickled, and unpickling data can run arbitrary code.
+The server must therefore never be exposed to untrusted users or networks.
+The Unix socket is only accessible to its owner; a TCP socket requires an
+``authkey``, shared by the server and its clients, and should be bound to a
+trusted interface only (e.g. "localhost").
+"""
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+
+class SessionCache:
+    """Least-recently-used cache of loaded networks.
+
+    Values are created by the factory passed to ``get`` on a cache miss; the
+    least recently used one is closed once more than ``capacity`` are loaded.
+    """
+
+    def __init__(self, capacity=2):
+        if capacity < 1:
+            raise ValueError("The capacity must be a positive integer.")
+        self.capacity = capacity
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def keys(self):
+        return list(self._sessions)
+
+    def get(self, key, factory):
+        with self._lock:
+            if key in self._sessions:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return self._sessions[key]
+            self.misses += 1
+            value = factory()
+            self._sessions[key] = value
+            while len(self._sessions) > self.capacity:
+                _, evicted = self._sessions.popitem(last=False)
+                self._close(evicted)
+            return value
+
+    def clear(self):
+        with self._lock:
+            while self._sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                self._close(evicted)
+
+    @staticmethod
+    def _close(value):
+        sess = value[0] if isinstance(value, tuple) else value
+        if hasattr(sess, "close"):
+            sess.close()
+
+
+def load_pose_config(config, shuffle=1, trainingsetindex=0, modelprefix=""):
+    """Return the test pose configuration of a model, pointing to the snapshot
+    selected by the ``snapshotindex`` of the project's config.yaml."""
+    from deeplabcut.pose_estimation_tensorflow.config import load_config
+    from deeplabcut.utils import auxiliaryfunctions
+
+    cfg = auxiliaryfunctions.read_config(config)
+    train_fraction = cfg["TrainingFraction"][trainingsetindex]
+    model_folder = os.path.join(
+        cfg["project_path"],
+        str(
+            auxiliaryfunctions.get_model_folder(
+                train_fraction, shuffle, cfg, modelprefix=modelprefix
+            )
+        ),
+    )
+    dlc_cfg = load_config(os.path.join(model_folder, "test", "pose_cfg.yaml"))
+    snapshots = [
+        fn.split(".")[0]
+        for fn in os.listdir(os.path.join(model_folder, "train"))
+        if "index" in fn
+    ]
+    if not snapshots:
+        raise FileNotFoundError(
+            "Snapshots not found! It seems the dataset for shuffle %s has not been trained."
+            % shuffle
+        )
+    snapshots = sorted(snapshots, key=lambda s: int(s.split("-")[1]))
+    snapshotindex = cfg["snapshotindex"]
+    if snapshotindex == "all":
+        snapshotindex = -1
+    dlc_cfg["init_weights"] = os.path.join(
+        model_folder, "train", snapshots[snapshotindex]
+    )
+    dlc_cfg["batch_size"] = None
+    return dlc_cfg
+
+
+def _setup_frame_prediction(dlc_cfg):
+    from deeplabcut.pose_estimation_tensorflow.core import predict
+
+    if "multi-animal" in dlc_cfg["dataset_type"]:
+        return predict.setup_pose_prediction(dlc_cfg)
+    return predict.setup_GPUpose_prediction(dlc_cfg)
+
+
+def predict_frames(
+    config,
+    frames,
+    shuffle=1,
+    trainingsetindex=0,
+    modelprefix="",
+    session_cache=None,
+):
+    """Predict poses on a batch of RGB frames.
+
+    Parameters
+    ----------
+    config : str
+        Full path of the config.yaml file.
+
+    frames : np.ndarray
+        Array of shape (n_frames, height, width, 3).
+
+    session_cache : SessionCache, optional
+        Cache keeping the network loaded across calls.
+
+    Returns
+    -------
+    np.ndarray or list
+        For single animal projects, an array of shape (n_frames, 3 * n_bodyparts)
+        holding the x, y, likelihood of every body part. For multi-animal projects,
+        the per-frame detections and PAF costs, as stored in the _full.pickle files.
+    """
+    from deeplabcut.pose_estimation_tensorflow.core import predict_multianimal
+
+    dlc_cfg = load_pose_config(config, shuffle, trainingsetindex, modelprefix)
+    key = (dlc_cfg["init_weights"], "frames")
+    if session_cache is None:
+        sess, inputs, outputs = _setup_frame_prediction(dlc_cfg)
+    else:
+        sess, inputs, outputs = session_cache.get(
+            key, lambda: _setup_frame_prediction(dlc_cfg)
+        )
+    frames = np.asarray(frames)
+    if "multi-animal" in dlc_cfg["dataset_type"]:
+        return predict_multianimal.predict_batched_peaks_and_costs(
+            dlc_cfg, frames, sess, inputs, outputs,
+        )
+    pose = sess.run(outputs[0], feed_dict={inputs: frames})
+    # Change order to have x, y, confidence
+    return pose[:, [1, 0, 2]].reshape((len(frames), -1))
+
+
+def _check_authkey(address, authkey):
+    """Refuse unauthenticated TCP connections: messages are pickled, so anyone
+    able to connect could run code on the other end."""
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    if not isinstance(address, str) and not authkey:
+        raise ValueError(
+            "An authkey is required to communicate over TCP; "
+            "use a Unix socket path for local, unauthenticated use."
+        )
+    return authkey
+
+
+class ModelServer:
+    """Inference server keeping up to ``capacity`` networks loaded.
+
+    Requests are (command, kwargs) tuples; the commands are "ping", "status",
+    "analyze_videos", "predict_frames" and "shutdown". Jobs are run one at a
+    time, since a single job already saturates the device.
+    """
+
+    def __init__(self, address, capacity=2, authkey=None):
+        self.address = address
+        self.authkey = _check_authkey(address, authkey)
+        self.cache = SessionCache(capacity)
+        self._job_lock = threading.Lock()
+        self._listener = None
+        self._stopped = threading.Event()
+
+    @property
+    def family(self):
+        return "AF_UNIX" if isinstance(self.address, str) else "AF_INET"
+
+    def start(self):
+        """Open the socket; the listener's actual address is returned, which
+        is useful with port 0."""
+        if self.family == "AF_UNIX":
+            if os.path.exists(self.address):
+                os.remove(self.address)  # Stale socket from a previous server
+            # Only the owner may connect to the socket
+            umask = os.umask(0o177)
+            try:
+                self._listener = Listener(
+                    self.address, self.family, authkey=self.authkey
+                )
+            finally:
+                os.umask(umask)
+        else:
+            self._listener = Listener(self.address, self.family, authkey=self.authkey)
+        self.address = self._listener.address
+        return self.address
+
+    def serve_forever(self):
+        if self._listener is None:
+            self.start()
+        print("DeepLabCut model server listening on", self.address)
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    continue
+                thread = threading.Thread(
+                    target=self._handle, args=(conn,), daemon=True
+                )
+                thread.start()
+        finally:
+            self.close()
+
+    def close(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        self.cache.clear()
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                command, kwargs = conn.recv()
+                result = self.dispatch(command, **kwargs)
+                conn.send(("ok", result))
+            except EOFError:
+                return
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+        if self._stopped.is_set() and self._listener is not None:
+            # Unblock accept() so that serve_forever returns
+            try:
+                Client(self.address, self.family, authkey=self.authkey).close()
+            except OSError:
+                pass
+
+    def dispatch(self, command, **kwargs):
+        if command == "ping":
+            return "pong"
+        if command == "status":
+            return {
+                "models": self.cache.keys(),
+                "capacity": self.cache.capacity,
+                "hits": self.cache.hits,
+                "misses": self.cache.misses,
+            }
+        if command == "shutdown":
+            self._stopped.set()
+            return None
+        if command == "analyze_videos":
+            from deeplabcut.pose_estimation_tensorflow.predict_videos import (
+                analyze_videos,
+            )
+
+            with self._job_lock:
+                return analyze_videos(session_cache=self.cache, **kwargs)
+        if command == "predict_frames":
+            with self._job_lock:
+                return predict_frames(session_cache=self.cache, **kwargs)
+        raise ValueError(f"Unknown command {command}.")
+
+
+class ModelClient:
+    """Client sending jobs to a running ``ModelServer``."""
+
+    def __init__(self, address, authkey=None):
+        self.address = address
+        self.authkey = _check_authkey(address, authkey)
+
+    def request(self, command, **kwargs):
+        family = "AF_UNIX" if isinstance(self.address, str) else "AF_INET"
+        with Client(self.address, family, authkey=self.authkey) as conn:
+            conn.send((command, kwargs))
+            status, result = conn.recv()
+        if status == "error":
+            raise RuntimeError(f"The model server failed:\n{result}")
+        return result
+
+    def ping(self):
+        return self.request("ping") == "pong"
+
+    def status(self):
+        return self.request("status")
+
+    def shutdown(self):
+        return self.request("shutdown")
+
+    def analyze_videos(self, config, videos, **kwargs):
+        """Run ``deeplabcut.analyze_videos`` on the server; see its documentation
+        for the keyword arguments."""
+        return self.request("analyze_videos", config=config, videos=videos, **kwargs)
+
+    def predict_frames(self, config, frames, **kwargs):
+        """Predict poses on a batch of RGB frames; see ``predict_frames``."""
+        return self.request("predict_frames", config=config, frames=frames, **kwargs)
@@ -8,22 +8,40 @@ https://github.com/DeepLabCut/DeepLabCut/blob/master/AUTHORS
 Licensed under GNU Lesser General Public License v3.0
 """
 import argparse
+from collections import defaultdict
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from scipy import signal
+from scipy import ndimage, signal
 from scipy.interpolate import CubicSpline
 
-from deeplabcut.refine_training_dataset.outlier_frames import FitSARIMAXModel
+from deeplabcut.refine_training_dataset.outlier_frames import FitSARIMAXModels
 from deeplabcut.utils import auxiliaryfunctions, auxfun_multianimal
 
 
+def _run_lengths(mask):
+    """
+    Compute, for every entry of a 2D boolean *mask*, the length of the run
+    of identical values (along the columns) it belongs to.
+    Runs are found at once for all columns with a single run-length encoding.
+    """
+    nrows, ncols = mask.shape
+    flat = mask.T.ravel()
+    starts = np.ones_like(flat)
+    starts[1:] = flat[1:] != flat[:-1]
+    starts[::nrows] = True  # Runs cannot span two columns
+    run_ids = np.cumsum(starts) - 1
+    return np.bincount(run_ids)[run_ids].reshape((ncols, nrows)).T
+
+
 def columnwise_spline_interp(data, max_gap=0):
     """
     Perform cubic spline interpolation over the columns of *data*.
     All gaps of size lower than or equal to *max_gap* are filled,
     and data slightly smoothed.
+    Columns sharing the same missing values (e.g., the x and y coordinates
+    of a keypoint) are interpolated with a single spline fit.
 
     Parameters
     ----------
@@ -39,29 +57,52 @@ def columnwise_spline_interp(data, max_gap=0):
     if np.ndim(data) < 2:
         data = np.expand_dims(data, axis=1)
     nrows, ncols = data.shape
-    temp = data.copy()
+    # Work on the transpose so that every series is contiguous in memory
+    temp = np.array(data, dtype=float).T
     valid = ~np.isnan(temp)
     x = np.arange(nrows)
-    for i in range(ncols):
-        mask = valid[:, i]
+    groups = defaultdict(list)
+    for i, key in enumerate(np.packbits(valid, axis=1)):
+        groups[key.tobytes()].append(i)
+    fitted = np.zeros(ncols, dtype=bool)
+    for cols in groups.values():
+        mask = valid[cols[0]]
         if (
             np.sum(mask) > 3
         ):  # Make sure there are enough points to fit the cubic spline
-            spl = CubicSpline(x[mask], temp[mask, i])
-            y = spl(x)
-            if max_gap > 0:
-                inds = np.flatnonzero(np.r_[True, np.diff(mask), True])
-                count = np.diff(inds)
-                inds = inds[:-1]
-                to_fill = np.ones_like(mask)
-                for ind, n, is_nan in zip(inds, count, ~mask[inds]):
-                    if is_nan and n > max_gap:
-                        to_fill[ind : ind + n] = False
-                y[~to_fill] = np.nan
-            # Get rid of the interpolation beyond the spline knots
-            y[y == 0] = np.nan
-            temp[:, i] = y
-    return temp
+            spl = CubicSpline(x[mask], temp[cols][:, mask], axis=1)
+            # The spline passes through the data, so it is only evaluated in the gaps
+            gaps = np.flatnonzero(~mask)
+            temp[np.ix_(cols, gaps)] = spl(gaps)
+            fitted[cols] = True
+    # Get rid of the interpolation beyond the spline knots
+    to_discard = temp == 0
+    if max_gap > 0:
+        to_discard |= ~valid & (_run_lengths(valid.T).T > max_gap)
+    to_discard[~fitted] = False
+    temp[to_discard] = np.nan
+    return temp.T
+
+
+def columnwise_median_filter(data, windowlength=5):
+    """
+    Median filter the columns of *data*, zero-padding the edges
+    as in :func:`scipy.signal.medfilt`.
+    Columns without missing values are filtered at once; columns with NaNs
+    are filtered with :func:`scipy.signal.medfilt`, so that they are
+    filtered exactly as before.
+    """
+    if windowlength % 2 == 0:
+        raise ValueError("windowlength should be an odd number.")
+    data = np.asarray(data, dtype=float)
+    filtered = np.empty_like(data)
+    has_nan = np.isnan(data).any(axis=0)
+    filtered[:, ~has_nan] = ndimage.median_filter(
+        data[:, ~has_nan], size=(windowlength, 1), mode="constant"
+    )
+    for i in np.flatnonzero(has_nan):
+        filtered[:, i] = signal.medfilt(data[:, i], windowlength)
+    return filtered
 
 
 def filterpredictions(
@@ -80,11 +121,15 @@ def filterpredictions(
     destfolder=None,
     modelprefix="",
     track_method="",
+    n_processes=1,
+    arima_window=None,
+    polyorder=2,
 ):
     """Fits frame-by-frame pose predictions.
 
-    The pose predictions are fitted with ARIMA model (filtertype='arima') or median
-    filter (default).
+    The pose predictions are fitted with ARIMA model (filtertype='arima'), smoothed
+    with a median filter (default) or a Savitzky-Golay filter (filtertype='savgol'),
+    or interpolated with cubic splines (filtertype='spline').
 
     Parameters
     ----------
@@ -104,7 +149,7 @@ def filterpredictions(
         Note that TrainingFraction is a list in config.yaml.
 
     filtertype: string, optional, default="median".
-        The filter type - 'arima', 'median' or 'spline'.
+        The filter type - 'arima', 'median', 'savgol' or 'spline'.
 
     windowlength: int, optional, default=5
         For filtertype='median' filters the input array using a local window-size given
@@ -112,6 +157,8 @@ def filterpredictions(
         https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.medfilt.html.
         The windowlenght should be an odd number.
         If filtertype='spline', windowlength is the maximal gap size to fill.
+        If filtertype='savgol', windowlength is the length of the filter window
+        https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.savgol_filter.html.
 
     p_bound: float between 0 and 1, optional, default=0.001
         For filtertype 'arima' this parameter defines the likelihood below,
@@ -146,6 +193,20 @@ def filterpredictions(
         For multiple animals, must be either 'box', 'skeleton', or 'ellipse' and will
         be taken from the config.yaml file if none is given.
 
+    n_processes: int or None, optional, default=1
+        For filtertype 'arima', number of processes across which the models of the
+        body parts' x and y coordinates are fitted. If ``None``, all available cores
+        are used.
+
+    arima_window: int or None, optional, default=None
+        For filtertype 'arima', very long recordings can be fitted in (overlapping)
+        windows of that many frames, which are fitted in parallel too.
+        By default, a single model is fitted to the whole series.
+
+    polyorder: int, optional, default=2
+        For filtertype 'savgol', order of the polynomial fitted to the samples
+        within a window. Must be less than windowlength.
+
     Returns
     -------
     None
@@ -225,17 +286,21 @@ def filterpredictions(
                 if filtertype == "arima":
                     temp = df.values.reshape((nrows, -1, 3))
                     placeholder = np.empty_like(temp)
-                    for i in range(temp.shape[1]):
-                        x, y, p = temp[:, i].T
-                        meanx, _ = FitSARIMAXModel(
-                            x, p, p_bound, alpha, ARdegree, MAdegree, False
-                        )
-                        meany, _ = FitSARIMAXModel(
-                            y, p, p_bound, alpha, ARdegree, MAdegree, False
-                        )
-                        meanx[0] = x[0]
-                        meany[0] = y[0]
-                        placeholder[:, i] = np.c_[meanx, meany, p]
+                    xy = temp[..., :2].reshape((nrows, -1))
+                    p = np.repeat(temp[..., 2], 2, axis=1)
+                    means, _ = FitSARIMAXModels(
+                        xy,
+                        p,
+                        p_bound,
+                        alpha,
+                        ARdegree,
+                        MAdegree,
+                        n_processes,
+                        arima_window,
+                    )
+                    means[0] = xy[0]
+                    placeholder[..., :2] = means.reshape((nrows, -1, 2))
+                    placeholder[..., 2] = temp[..., 2]
                     data = pd.DataFrame(
                         placeholder.reshape((nrows, -1)),
                         columns=df.columns,
@@ -244,8 +309,14 @@ def filterpredictions(
                 elif filtertype == "median":
                     data = df.copy()
                     mask = data.columns.get_level_values("coords") != "likelihood"
-                    data.loc[:, mask] = df.loc[:, mask].apply(
-                        signal.medfilt, args=(windowlength,), axis=0
+                    data.loc[:, mask] = columnwise_median_filter(
+                        df.loc[:, mask].values, windowlength
+                    )
+                elif filtertype == "savgol":
+                    data = df.copy()
+                    mask = data.columns.get_level_values("coords") != "likelihood"
+                    data.loc[:, mask] = signal.savgol_filter(
+                        df.loc[:, mask].values, windowlength, polyorder, axis=0
                     )
                 elif filtertype == "spline":
                     data = df.copy()
@@ -9,9 +9,11 @@ Licensed under GNU Lesser General Public License v3.0
 """
 
 import argparse
+import multiprocessing
 import os
 import pickle
 import re
+from functools import partial
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -19,6 +21,7 @@ import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 from skimage.util import img_as_ubyte
+from tqdm import tqdm
 
 from deeplabcut.pose_estimation_tensorflow.lib import inferenceutils
 from deeplabcut.utils import (
@@ -196,6 +199,7 @@ def extract_outlier_frames(
     destfolder=None,
     modelprefix="",
     track_method="",
+    n_processes=1,
 ):
     """Extracts the outlier frames.
 
@@ -312,6 +316,11 @@ def extract_outlier_frames(
          For multiple animals, must be either 'box', 'skeleton', or 'ellipse' and will
          be taken from the config.yaml file if none is given.
 
+    n_processes: int or None, optional, default=1
+        For outlieralgorithm ``'fitting'``: number of processes across which the
+        ARIMA models of the body parts' x and y coordinates are fitted. If ``None``,
+        all available cores are used.
+
     Returns
     -------
     None
@@ -403,7 +412,13 @@ def extract_outlier_frames(
                 Indices.extend(ind)
             elif outlieralgorithm == "fitting":
                 d, o = compute_deviations(
-                    df_temp, dataname, p_bound, alpha, ARdegree, MAdegree
+                    df_temp,
+                    dataname,
+                    p_bound,
+                    alpha,
+                    ARdegree,
+                    MAdegree,
+                    n_processes=n_processes,
                 )
                 # Some heuristics for extracting frames based on distance:
                 ind = np.flatnonzero(
@@ -540,21 +555,91 @@ def FitSARIMAXModel(x, p, pcutoff, alpha, ARdegree, MAdegree, nforecast=0, disp=
         return np.nan * np.zeros(len(Y)), np.nan * np.zeros((len(Y), 2))
 
 
+def _fit_sarimax_model(xp, **kwargs):
+    return FitSARIMAXModel(*xp, **kwargs)
+
+
+def FitSARIMAXModels(
+    X, P, pcutoff, alpha, ARdegree, MAdegree, n_processes=1, window=None
+):
+    """Fits a SARIMAX model (see FitSARIMAXModel) to every column of X, given the likelihoods P.
+
+    Fits are independent of one another and are thus dispatched to a pool of n_processes
+    workers (all cores if None). Very long series can be fitted in windows of `window` frames;
+    consecutive windows overlap by a tenth of their length, so that the model has settled
+    by the time its predictions are kept.
+
+    Returns the mean fits and confidence intervals, of shapes (nframes, nseries) and (nframes, nseries, 2)."""
+    nframes, nseries = X.shape
+    if window is None or window >= nframes:
+        windows = [(0, 0, nframes)]
+    else:
+        overlap = window // 10
+        windows = [
+            (start, max(start - overlap, 0), min(start + window, nframes))
+            for start in range(0, nframes, window)
+        ]
+    tasks = [
+        (X[first:last, i], P[first:last, i])
+        for i in range(nseries)
+        for _, first, last in windows
+    ]
+    func = partial(
+        _fit_sarimax_model,
+        pcutoff=pcutoff,
+        alpha=alpha,
+        ARdegree=ARdegree,
+        MAdegree=MAdegree,
+    )
+    if n_processes == 1:
+        results = [func(task) for task in tqdm(tasks)]
+    else:
+        with multiprocessing.Pool(n_processes) as pool:
+            results = list(tqdm(pool.imap(func, tasks), total=len(tasks)))
+
+    means = np.empty((nframes, nseries))
+    CIs = np.empty((nframes, nseries, 2))
+    for n, (mean, CI) in enumerate(results):
+        i, j = divmod(n, len(windows))
+        start, first, last = windows[j]
+        means[start:last, i] = mean[start - first :]
+        CIs[start:last, i] = CI[start - first :]
+    return means, CIs
+
+
 def compute_deviations(
-    Dataframe, dataname, p_bound, alpha, ARdegree, MAdegree, storeoutput=None
+    Dataframe,
+    dataname,
+    p_bound,
+    alpha,
+    ARdegree,
+    MAdegree,
+    storeoutput=None,
+    n_processes=1,
+    window=None,
 ):
     """Fits Seasonal AutoRegressive Integrated Moving Average with eXogenous regressors model to data and computes confidence interval
-    as well as mean fit."""
+    as well as mean fit. The x and y series of every body part are fitted in parallel over n_processes workers (see FitSARIMAXModels)."""
 
     print("Fitting state-space models with parameters:", ARdegree, MAdegree)
     df_x, df_y, df_likelihood = Dataframe.values.reshape((Dataframe.shape[0], -1, 3)).T
+    means, CIs = FitSARIMAXModels(
+        np.c_[df_x.T, df_y.T],
+        np.c_[df_likelihood.T, df_likelihood.T],
+        p_bound,
+        alpha,
+        ARdegree,
+        MAdegree,
+        n_processes,
+        window,
+    )
+    nbodyparts = len(df_x)
     preds = []
-    for row in range(len(df_x)):
+    for row in range(nbodyparts):
         x = df_x[row]
         y = df_y[row]
-        p = df_likelihood[row]
-        meanx, CIx = FitSARIMAXModel(x, p, p_bound, alpha, ARdegree, MAdegree)
-        meany, CIy = FitSARIMAXModel(y, p, p_bound, alpha, ARdegree, MAdegree)
+        meanx, CIx = means[:, row], CIs[:, row]
+        meany, CIy = means[:, nbodyparts + row], CIs[:, nbodyparts + row]
         distance = np.sqrt((x - meanx) ** 2 + (y - meany) ** 2)
         significant = (
             (x < CIx[:, 0]) + (x > CIx[:, 1]) + (y < CIy[:, 0]) + (y > CIy[:, 1])
@@ -689,6 +774,9 @@ def ExtractFramesbasedonPreselection(
     print("Let's select frames indices:", frames2pick)
     colors = visualization.get_cmap(len(bodyparts), cfg["colormap"])
     strwidth = int(np.ceil(np.log10(nframes)))  # width for strings
+    if opencv:
+        # Decode all frames in a single pass rather than seeking to each of them
+        frames = vid.read_frames(frames2pick)
     for index in frames2pick:  ##tqdm(range(0,nframes,10)):
         if opencv:
             PlottingSingleFramecv2(
@@ -705,6 +793,7 @@ def ExtractFramesbasedonPreselection(
                 colors,
                 strwidth,
                 savelabeled,
+                frame=next(frames),
             )
         else:
             PlottingSingleFrame(
@@ -911,8 +1000,10 @@ def PlottingSingleFramecv2(
     colors,
     strwidth=4,
     savelabeled=True,
+    frame=None,
 ):
-    """Label frame and save under imagename / cap is not already cropped."""
+    """Label frame and save under imagename / cap is not already cropped.
+    If the frame was already decoded, it can be passed directly to avoid seeking."""
     from skimage import io
 
     imagename1 = os.path.join(tmpfolder, "img" + str(index).zfill(strwidth) + ".png")
@@ -924,8 +1015,9 @@ def PlottingSingleFramecv2(
         os.path.join(tmpfolder, "img" + str(index).zfill(strwidth) + ".png")
     ):
         plt.axis("off")
-        cap.set_to_frame(index)
-        frame = cap.read_frame()
+        if frame is None:
+            cap.set_to_frame(index)
+            frame = cap.read_frame()
         if frame is None:
             print("Frame could not be read.")
             return
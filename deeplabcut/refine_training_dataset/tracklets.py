@@ -56,6 +56,7 @@ class TrackletManager:
         self.tracklet2bp = []
         self.swapping_pairs = []
         self.swapping_bodyparts = []
+        self.tracklet_swaps = dict()
         self._label_pairs = None
 
     def _load_tracklets(self, tracklets, auto_fill):
@@ -306,34 +307,110 @@ class TrackletManager:
             self.tracklet2bp[track1],
         )
 
-    def find_swapping_bodypart_pairs(self, force_find=False):
-        if not self.swapping_pairs or force_find:
-            sub = (
-                self.xy[:, np.newaxis] - self.xy
-            )  # Broadcasting for efficient subtraction of X and Y coordinates
+    def _find_overlapping_pairs(self):
+        """Pairs (i, j), i > j, of tracklets whose spans of valid frames overlap
+        (by at least two frames), found by sweeping over the sorted tracklet starts.
+        """
+        first, last, inds = [], [], []
+        for i, xy in enumerate(self.xy):
+            valid = np.flatnonzero(~np.isnan(xy).any(axis=1))
+            if valid.size:
+                first.append(valid[0])
+                last.append(valid[-1])
+                inds.append(i)
+        order = np.argsort(first, kind="stable")
+        first = np.asarray(first, dtype=int)[order]
+        last = np.asarray(last, dtype=int)[order]
+        inds = np.asarray(inds, dtype=int)[order]
+        # Tracklets starting between the start and the end of a tracklet overlap it
+        n = len(inds)
+        ends = np.searchsorted(first, last, side="right")
+        counts = np.maximum(ends - np.arange(n) - 1, 0)
+        left = np.repeat(np.arange(n), counts)
+        offsets = np.cumsum(counts) - counts
+        right = left + 1 + np.arange(counts.sum()) - np.repeat(offsets, counts)
+        keep = np.minimum(last[left], last[right]) > first[right]
+        pairs = np.sort(np.c_[inds[left[keep]], inds[right[keep]]], axis=1)[:, ::-1]
+        starts = first[right[keep]]
+        stops = np.minimum(last[left[keep]], last[right[keep]])
+        return pairs, starts, stops
+
+    def _find_swaps(self, pairs, starts=None, stops=None, chunk_size=2 ** 22):
+        """Frames at which the tracklets of every pair simultaneously cross each
+        other in x and y, as a dict mapping the pairs to the (sorted) frame indices.
+
+        Frames are scanned block by block, comparing only the pairs overlapping
+        in time within the ``[starts, stops]`` frame spans, so that no more than
+        about ``chunk_size`` coordinates are compared at once.
+        """
+        pairs = np.asarray(pairs, dtype=int).reshape((-1, 2))
+        if starts is None:
+            starts = np.zeros(len(pairs), dtype=int)
+        if stops is None:
+            stops = np.full(len(pairs), self.nframes - 1)
+        block_size = max(2, chunk_size // max(1, 2 * len(pairs)))
+        found_pairs = []
+        found_frames = []
+        for start in range(0, self.nframes - 1, block_size - 1):
+            stop = min(start + block_size, self.nframes)
+            active = np.flatnonzero((starts < stop - 1) & (stops > start))
+            if not active.size:
+                continue
+            i, j = pairs[active].T
+            sub = self.xy[i, start:stop] - self.xy[j, start:stop]
             with np.errstate(
                 invalid="ignore"
             ):  # Get rid of annoying warnings when comparing with NaNs
                 pos = sub > 0
                 neg = sub <= 0
-                down = neg[:, :, 1:] & pos[:, :, :-1]
-                up = pos[:, :, 1:] & neg[:, :, :-1]
-                zero_crossings = down | up
+                down = neg[:, 1:] & pos[:, :-1]
+                up = pos[:, 1:] & neg[:, :-1]
             # ID swaps occur when X and Y simultaneously intersect each other.
-            self.tracklet_swaps = zero_crossings.all(axis=3)
-            cross = self.tracklet_swaps.sum(axis=2) > self.min_swap_len
-            mat = np.tril(cross)
-            temp_pairs = np.where(mat)
-            # Get only those bodypart pairs that belong to different individuals
-            pairs = []
-            for a, b in zip(*temp_pairs):
-                if self.tracklet2id[a] != self.tracklet2id[b]:
-                    pairs.append((a, b))
-            self.swapping_pairs = pairs
-            self.swapping_bodyparts = np.unique(pairs).tolist()
+            n_pair, frame = np.nonzero((down | up).all(axis=2))
+            found_pairs.append(active[n_pair])
+            found_frames.append(frame + start)
+        swaps = dict()
+        if found_pairs:
+            found_pairs = np.concatenate(found_pairs)
+            found_frames = np.concatenate(found_frames)
+            order = np.lexsort((found_frames, found_pairs))
+            found_pairs = found_pairs[order]
+            found_frames = found_frames[order]
+            unique, splits = np.unique(found_pairs, return_index=True)
+            for n, frames in zip(unique, np.split(found_frames, splits[1:])):
+                swaps[tuple(pairs[n].tolist())] = frames
+        return swaps
+
+    def find_swapping_bodypart_pairs(self, force_find=False):
+        if not self.swapping_pairs or force_find:
+            # Only tracklets overlapping in time and belonging to
+            # different individuals are compared; swaps are stored sparsely.
+            pairs, starts, stops = self._find_overlapping_pairs()
+            ids = np.asarray(self.tracklet2id)
+            mask = ids[pairs[:, 0]] != ids[pairs[:, 1]]
+            self.tracklet_swaps = self._find_swaps(
+                pairs[mask], starts[mask], stops[mask]
+            )
+            self.swapping_pairs = sorted(
+                pair
+                for pair, inds in self.tracklet_swaps.items()
+                if len(inds) > self.min_swap_len
+            )
+            self.swapping_bodyparts = np.unique(self.swapping_pairs).tolist()
 
     def get_swap_indices(self, tracklet1, tracklet2):
-        return np.flatnonzero(self.tracklet_swaps[tracklet1, tracklet2])
+        pair = max(tracklet1, tracklet2), min(tracklet1, tracklet2)
+        if pair not in self.tracklet_swaps:
+            self.tracklet_swaps[pair] = self._find_swaps([pair]).get(
+                pair, np.array([], dtype=int)
+            )
+        return self.tracklet_swaps[pair]
+
+    def invert_swaps(self, tracklet1, tracklet2, inds):
+        """Flag (or unflag, if already flagged) swaps of two tracklets at ``inds``."""
+        pair = max(tracklet1, tracklet2), min(tracklet1, tracklet2)
+        swap_inds = self.get_swap_indices(*pair)
+        self.tracklet_swaps[pair] = np.setxor1d(swap_inds, inds).astype(int)
 
     def get_nonoverlapping_segments(self, tracklet1, tracklet2):
         swap_inds = self.get_swap_indices(tracklet1, tracklet2)
@@ -18,6 +18,8 @@ import numpy as np
 import os
 import subprocess
 import warnings
+from collections import Counter, OrderedDict
+from threading import Condition, Thread
 
 
 # more videos are in principle covered, as OpenCV is used and allows many formats.
@@ -36,6 +38,7 @@ class VideoReader:
         self.parse_metadata()
         self._bbox = 0, 1, 0, 1
         self._n_frames_robust = None
+        self._gop_size = None
 
     def __repr__(self):
         string = "Video (duration={:0.2f}, fps={}, dimensions={}x{})"
@@ -122,6 +125,88 @@ class VideoReader:
     def reset(self):
         self.set_to_frame(0)
 
+    @property
+    def gop_size(self):
+        """Estimated number of frames between two consecutive keyframes."""
+        if self._gop_size is None:
+            n_packets = 2000
+            command = (
+                f'ffprobe -i "{self.video_path}" -v error -select_streams v:0 '
+                f"-read_intervals %+#{n_packets} -show_entries packet=flags "
+                f"-of csv=p=0"
+            )
+            try:
+                output = subprocess.check_output(
+                    command, shell=True, stderr=subprocess.DEVNULL
+                )
+                flags = output.decode().split()
+                keyframes = np.flatnonzero([flag.startswith("K") for flag in flags])
+                if len(keyframes) > 1:
+                    self._gop_size = int(np.ceil(np.diff(keyframes).mean()))
+                else:
+                    self._gop_size = max(len(flags), 1)
+            except (subprocess.CalledProcessError, UnicodeDecodeError):
+                # ffprobe is unavailable; fall back to x264's default keyframe interval.
+                self._gop_size = 250
+        return self._gop_size
+
+    def read_frames(self, indices, shrink=1, crop=False, max_gap=None):
+        """
+        Read a batch of frames, which are returned in the requested order.
+
+        Frames are decoded in increasing order, whatever the order of ``indices``.
+        Gaps between consecutive frames are skipped with ``grab()`` (much cheaper than
+        seeking, which decodes from the preceding keyframe every time), unless they
+        are longer than ``max_gap`` frames, in which case the reader seeks instead.
+
+        Parameters
+        ----------
+        indices : iterable of int
+            Indices of the frames to read; they may be unsorted and contain duplicates.
+
+        shrink : int, optional
+            Factor by which frames are downsampled, as in ``read_frame``.
+
+        crop : bool, optional
+            Whether frames are cropped to the bounding box, as in ``read_frame``.
+
+        max_gap : int, optional
+            Largest number of frames that are grabbed over rather than seeked over.
+            By default, the estimated GOP length of the video.
+
+        Yields
+        ------
+        frame : ndarray or None
+            RGB frame, or None if it could not be read.
+        """
+        indices = [int(ind) for ind in indices]
+        if not indices:
+            return
+        if max_gap is None:
+            max_gap = self.gop_size
+        n_requests = Counter(indices)
+        requested = iter(indices)
+        next_ind = next(requested)
+        decoded = dict()
+        pos = int(self.video.get(cv2.CAP_PROP_POS_FRAMES))
+        for ind in sorted(n_requests):
+            gap = ind - pos
+            if 0 <= gap <= max_gap:
+                for _ in range(gap):
+                    self.video.grab()
+            else:
+                self.set_to_frame(ind)
+            decoded[ind] = self.read_frame(shrink, crop)
+            pos = ind + 1
+            # Only frames still to be yielded are kept in memory
+            while next_ind in decoded:
+                n_requests[next_ind] -= 1
+                if n_requests[next_ind]:
+                    yield decoded[next_ind]
+                else:
+                    yield decoded.pop(next_ind)
+                next_ind = next(requested, None)
+
     def read_frame(self, shrink=1, crop=False):
         success, frame = self.video.read()
         if not success:
@@ -188,6 +273,183 @@ class VideoReader:
         self.video.release()
 
 
+class FrameCache:
+    """
+    LRU cache of the decoded frames of a video around a current position.
+
+    A background thread decodes the frames around the position last requested,
+    first the frame itself, then up to ``n_ahead`` frames after it and
+    ``n_behind`` frames before it. Frames are decoded sequentially, as in
+    ``VideoReader.read_frames``, so that browsing a video does not seek (and decode
+    from the preceding keyframe) at every frame.
+
+    Parameters
+    ----------
+    video_path : str
+        Full path to the video.
+
+    n_ahead : int, optional
+        Number of frames decoded ahead of the current position.
+
+    n_behind : int, optional
+        Number of frames decoded behind the current position.
+
+    max_frames : int, optional
+        Maximal number of frames kept in memory; at least as many as prefetched.
+
+    proxy_shrink : int, optional
+        If greater than 1, frames downsampled by that factor are cached as well,
+        ``proxy_shrink`` times further around the current position and in
+        ``proxy_shrink`` times greater numbers. They offer a cheap preview of
+        frames whose full resolution version is not decoded yet.
+    """
+
+    def __init__(
+        self, video_path, n_ahead=32, n_behind=16, max_frames=64, proxy_shrink=1
+    ):
+        # The capture is only used by the decoding thread from now on
+        self.reader = VideoReader(video_path)
+        self.n_frames = len(self.reader)
+        self.n_ahead = n_ahead
+        self.n_behind = n_behind
+        self.max_frames = max(max_frames, n_ahead + n_behind + 1)
+        self.proxy_shrink = proxy_shrink
+        self._frames = OrderedDict()
+        self._proxies = OrderedDict()
+        self._center = 0
+        self._running = True
+        self._cond = Condition()
+        self._thread = Thread(target=self._decode, daemon=True)
+        self._thread.start()
+
+    def _window(self, factor=1):
+        start = max(self._center - factor * self.n_behind, 0)
+        stop = min(self._center + factor * self.n_ahead, self.n_frames - 1)
+        return start, stop
+
+    def _next_frame(self):
+        """Next frame to decode, and whether only its proxy is missing."""
+        caches = [(self._frames, 1)]
+        if self.proxy_shrink > 1:
+            caches.append((self._proxies, self.proxy_shrink))
+        for cache, factor in caches:
+            start, stop = self._window(factor)
+            for ind in range(self._center, stop + 1):
+                if ind not in cache:
+                    return ind, cache is self._proxies
+            # Frames behind are decoded from the earliest on
+            for ind in range(start, self._center):
+                if ind not in cache:
+                    return ind, cache is self._proxies
+
+    def _store(self, cache, ind, frame, max_size, window):
+        cache[ind] = frame
+        cache.move_to_end(ind)
+        start, stop = window
+        while len(cache) > max_size:
+            # Evict the least recently used frame outside of the prefetch window
+            key = next(key for key in cache if not start <= key <= stop)
+            del cache[key]
+
+    def _decode(self):
+        pos = int(self.reader.video.get(cv2.CAP_PROP_POS_FRAMES))
+        max_gap = None
+        while True:
+            with self._cond:
+                target = self._next_frame()
+                while self._running and target is None:
+                    self._cond.wait()
+                    target = self._next_frame()
+                if not self._running:
+                    break
+            ind, proxy_only = target
+            if max_gap is None:
+                max_gap = self.reader.gop_size
+            if 0 <= ind - pos <= max_gap:
+                for _ in range(ind - pos):
+                    self.reader.video.grab()
+            else:
+                self.reader.set_to_frame(ind)
+            frame = self.reader.read_frame()
+            pos = ind + 1
+            proxy = frame
+            if frame is not None and self.proxy_shrink > 1:
+                h, w = frame.shape[:2]
+                proxy = cv2.resize(
+                    frame,
+                    (w // self.proxy_shrink, h // self.proxy_shrink),
+                    interpolation=cv2.INTER_AREA,
+                )
+            with self._cond:
+                if not proxy_only:
+                    self._store(
+                        self._frames, ind, frame, self.max_frames, self._window()
+                    )
+                if self.proxy_shrink > 1:
+                    self._store(
+                        self._proxies,
+                        ind,
+                        proxy,
+                        self.max_frames * self.proxy_shrink,
+                        self._window(self.proxy_shrink),
+                    )
+                self._cond.notify_all()
+        self.reader.close()
+
+    def __contains__(self, ind):
+        """Whether frame ``ind`` was decoded (or at least attempted to)."""
+        with self._cond:
+            return ind in self._frames
+
+    def seek(self, ind):
+        """Move the current position, around which frames are prefetched, to ``ind``."""
+        with self._cond:
+            self._center = min(max(int(ind), 0), max(self.n_frames - 1, 0))
+            self._cond.notify_all()
+
+    def get(self, ind, proxy=False):
+        """
+        Return frame ``ind`` if it is already decoded (or its proxy if ``proxy``
+        is True and the full resolution frame is not), None otherwise.
+        The current position is moved to ``ind``.
+        """
+        ind = int(ind)
+        self.seek(ind)
+        with self._cond:
+            for cache in (self._frames, self._proxies if proxy else ()):
+                if ind in cache:
+                    cache.move_to_end(ind)
+                    return cache[ind]
+
+    def read(self, ind, timeout=None):
+        """
+        Return frame ``ind``, waiting for it to be decoded, or None if it could not be
+        read (or if ``timeout`` seconds have elapsed, or another frame was requested
+        in the meantime).
+        """
+        ind = int(ind)
+        if not 0 <= ind < self.n_frames:
+            return None
+        self.seek(ind)
+        with self._cond:
+            if self._cond.wait_for(
+                lambda: ind in self._frames
+                or self._center != ind
+                or not self._running,
+                timeout,
+            ):
+                frame = self._frames.get(ind)
+                if frame is not None:
+                    self._frames.move_to_end(ind)
+                return frame
+
+    def close(self, *args):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+
+
 class VideoWriter(VideoReader):
     def __init__(self, video_path, codec="h264", dpi=100, fps=None):
         super(VideoWriter, self).__init__(video_path)
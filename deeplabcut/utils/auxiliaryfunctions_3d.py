@@ -105,12 +105,79 @@ def triangulatePoints(P1, P2, x1, x2):
     return X / X[3]
 
 
+def triangulate_views(projection_matrices, points, weights=None, chunk_size=100000):
+    """
+    Triangulates points seen from two or more calibrated views with the linear
+    (DLT) method, solving for all points at once.
+
+    Parameters
+    ----------
+    projection_matrices : array-like, shape (n_views, 3, 4)
+        Projection matrices of the views, in the coordinates of the points.
+
+    points : np.ndarray, shape (n_views, ..., 2)
+        Undistorted 2D coordinates of the points in every view; NaN where a view
+        did not see a point.
+
+    weights : np.ndarray, shape (n_views, ...), optional
+        Confidence of every view in every point (e.g., the likelihoods of the
+        predictions), weighting the views' equations. By default, all views have
+        the same weight.
+
+    chunk_size : int, optional
+        Number of points solved for at once, which bounds memory usage.
+
+    Returns
+    -------
+    np.ndarray, shape (..., 3)
+        3D coordinates of the points; NaN where fewer than two views saw a point.
+    """
+    P = np.asarray(projection_matrices, dtype=float)[:, :3]
+    n_views = P.shape[0]
+    if n_views < 2:
+        raise ValueError("At least two views are required for triangulation.")
+    shape = points.shape[1:-1]
+    points = points.reshape((n_views, -1, 2))
+    if weights is None:
+        weights = np.ones(points.shape[:2])
+    else:
+        weights = np.asarray(weights, dtype=float).reshape((n_views, -1))
+    weights = np.where(np.isfinite(points).all(axis=2), weights, 0)
+    inds = np.flatnonzero(np.sum(weights > 0, axis=0) >= 2)
+    points_3d = np.full((points.shape[1], 3), np.nan)
+    for start in range(0, inds.size, chunk_size):
+        inds_ = inds[start : start + chunk_size]
+        xy = np.nan_to_num(points[:, inds_])
+        # Equations x * P[2] - P[0] = 0 and y * P[2] - P[1] = 0 of every view
+        A = xy[..., None] * P[:, None, 2:] - P[:, None, :2]
+        A *= weights[:, inds_, None, None]
+        A = A.transpose((1, 0, 2, 3)).reshape((inds_.size, 2 * n_views, 4))
+        # The solution is the eigenvector of the smallest eigenvalue of A.T @ A
+        # (i.e., the right singular vector of the smallest singular value of A)
+        X = np.linalg.eigh(A.transpose((0, 2, 1)) @ A)[1][..., 0]
+        points_3d[inds_] = X[:, :3] / X[:, 3:]
+    return points_3d.reshape((*shape, 3))
+
+
+def reprojection_errors(projection_matrices, points_3d, points):
+    """
+    Distances (in pixels) between 2D points of shape (n_views, ..., 2) and the
+    projections of 3D points of shape (..., 3) into every view.
+    """
+    P = np.asarray(projection_matrices, dtype=float)[:, :3]
+    X = np.concatenate((points_3d, np.ones((*points_3d.shape[:-1], 1))), axis=-1)
+    projected = np.einsum("vij,...j->v...i", P, X)
+    projected = projected[..., :2] / projected[..., 2:]
+    return np.linalg.norm(projected - points, axis=-1)
+
+
 def get_camerawise_videos(path, cam_names, videotype):
     """
     This function returns the list of videos corresponding to the camera names specified in the cam_names.
     e.g. if cam_names = ['camera-1','camera-2']
 
     then it will return [['somename-camera-1-othername.avi', 'somename-camera-2-othername.avi']]
+    With more cameras, each list holds the videos of all the cameras.
     """
     import glob
     from pathlib import Path
@@ -144,23 +211,18 @@ def get_camerawise_videos(path, cam_names, videotype):
             ending = Path(vid[0][k]).suffix
             pref = str(Path(vid[0][k]).stem).split(cam)[0]
             suf = str(Path(vid[0][k]).stem).split(cam)[1]
-            if pref == "":
-                if suf == "":
-                    print("Strange naming convention on your part. Respect.")
-                else:
-                    putativecam2name = os.path.join(path, cam_names[1] + suf + ending)
-            else:
-                if suf == "":
-                    putativecam2name = os.path.join(path, pref + cam_names[1] + ending)
-                else:
-                    putativecam2name = os.path.join(
-                        path, pref + cam_names[1] + suf + ending
-                    )
-            # print([os.path.join(path,pref+cam+suf+ending),putativecam2name])
-            if os.path.isfile(putativecam2name):
+            if pref == "" and suf == "":
+                print("Strange naming convention on your part. Respect.")
+                continue
+            # Videos of the other cameras (one for a pair of cameras)
+            putativecamnames = [
+                os.path.join(path, pref + other_cam + suf + ending)
+                for other_cam in cam_names[1:]
+            ]
+            if all(os.path.isfile(name) for name in putativecamnames):
                 # found a pair!!!
                 video_list.append(
-                    [os.path.join(path, pref + cam + suf + ending), putativecam2name]
+                    [os.path.join(path, pref + cam + suf + ending)] + putativecamnames
                 )
     return video_list
 
@@ -266,62 +328,114 @@ def LoadMetadata3d(metadatafilename):
         metadata = pickle.load(f)
         return metadata
 
-def _reconstruct_tracks_as_tracklets(df):
+def epipolar_costs(points1, points2, F, window=None, chunk_size=1000):
     """
-    Parameters:
-    -----------
-    df: DataFrame 
-        loaded from an .h5 tracks file (obtained from `stitch_tracklets()`)
-    """
-    from deeplabcut.refine_training_dataset.stitch import Tracklet
+    Epipolar costs |x1 F x2| of every pair of individuals of two views, averaged
+    over the body parts detected in both views and over windows of frames.
+
+    Parameters
+    ----------
+    points1, points2 : np.ndarray, shape (n_frames, n_individuals, n_bodyparts, 2)
+        Frame-aligned 2D coordinates of the individuals in either view; NaN where
+        a body part was not detected.
 
-    tracklets = []
-    for _, group in df.groupby("individuals", axis=1):
-        temp = group.dropna(how="all")
-        inds = temp.index.to_numpy()
-        track = Tracklet(temp.to_numpy().reshape((len(temp), -1, 3)), inds)
-        track = track.interpolate(max_gap=len(group))
-        tracklets.append(track)
-    return tracklets
+    F : np.ndarray, shape (3, 3)
+        Fundamental matrix between the views.
 
+    window : int, optional
+        Number of frames the costs are averaged over; by default, all frames.
 
-def _associate_paired_view_tracks(tracklets1, tracklets2, F):
+    chunk_size : int, optional
+        Number of frames processed at once, which bounds memory usage.
+
+    Returns
+    -------
+    np.ndarray, shape (n_windows, n_individuals1, n_individuals2)
+        Mean costs in every window; NaN for pairs never detected together.
     """
-    Computes the optimal matching between tracks in two cameras 
-    using the xFx'=0 epipolar constraint equation.
-
-    Parameters:
-    -----------
-    tracklets1/2: Tracklet() object (defined in stitch.py)
-    F: nd.array
-        Fundamental matrix between cam1 and cam2
+    n_frames, n_individuals1 = points1.shape[:2]
+    n_individuals2 = points2.shape[1]
+    window = window or max(n_frames, 1)
+    n_windows = max(-(-n_frames // window), 1)
+    sums = np.zeros((n_windows, n_individuals1, n_individuals2))
+    counts = np.zeros_like(sums)
+    for start in range(0, n_frames, chunk_size):
+        xy1 = points1[start : start + chunk_size]
+        xy2 = points2[start : start + chunk_size]
+        # Body parts first, so that the costs of all pairs are a matrix product
+        valid1 = np.isfinite(xy1).all(axis=3).transpose((0, 2, 1))
+        valid2 = np.isfinite(xy2).all(axis=3).transpose((0, 2, 1))
+        lines = np.nan_to_num(xy1).transpose((0, 2, 1, 3)) @ F[:2] + F[2]  # x1 F
+        cost = lines[..., :2] @ np.nan_to_num(xy2).transpose((0, 2, 3, 1))
+        cost += lines[..., 2:]
+        cost = np.abs(cost, out=cost)
+        cost *= valid1[..., None] & valid2[:, :, None]
+        # Sum over the body parts, then over the frames of every window
+        window_inds = (start + np.arange(len(xy1))) // window
+        first = np.flatnonzero(np.diff(window_inds, prepend=-1))
+        window_inds = window_inds[first]
+        sums[window_inds] += np.add.reduceat(cost.sum(axis=1), first, axis=0)
+        counts[window_inds] += np.add.reduceat(
+            valid1.transpose((0, 2, 1)) @ valid2.astype(float), first, axis=0
+        )
+    with np.errstate(invalid="ignore"):
+        return sums / counts
+
+
+def match_individuals(costs):
     """
-    from scipy.optimize import linear_sum_assignment
-    # Initialize costs matrix
-    costs = np.zeros([len(tracklets1), len(tracklets2)])
+    Optimal matching of the individuals of two views in every window of frames,
+    given the costs of ``epipolar_costs``. Windows where no pair of individuals
+    was detected together get the matching of the whole video.
 
-    for i, t1 in enumerate(tracklets1):
-        for j, t2 in enumerate(tracklets2):
-            # get common bodypart detections in track pair
-            _t1 = t1.xy[np.isin(t1.inds, t2.inds)]
-            _t2 = t2.xy[np.isin(t2.inds, t1.inds)]
+    Returns an array of shape (n_windows, n_individuals1) holding, for every
+    individual of the first view, the index of its match in the second view.
+    """
+    from scipy.optimize import linear_sum_assignment
 
-            # add 3rd dim to the points
-            _t1 = np.c_[_t1, np.ones((*_t1.shape[:2], 1))]
-            _t2 = np.c_[_t2, np.ones((*_t2.shape[:2], 1))]
+    def match(cost):
+        # Pairs never seen together are the least likely matches
+        cost = np.where(np.isfinite(cost), cost, np.nanmax(cost))
+        rows, cols = linear_sum_assignment(cost)
+        matches = np.arange(cost.shape[0])
+        matches[rows] = cols
+        return matches
+
+    n_windows, n_individuals = costs.shape[:2]
+    defined = np.isfinite(costs).any(axis=(1, 2))
+    matches = np.tile(np.arange(n_individuals), (n_windows, 1))
+    if not defined.any():
+        return matches
+    with np.errstate(invalid="ignore"):
+        overall = np.nanmean(costs[defined], axis=0)
+    matches[:] = match(overall)
+    for i in np.flatnonzero(defined):
+        matches[i] = match(costs[i])
+    return matches
+
+
+def cross_view_match(points1, points2, F, window=None, chunk_size=1000):
+    """
+    Matches the individuals of a second view to those of a first view with the
+    epipolar constraint, either once for the whole video or in windows of
+    ``window`` frames (1 matching them in every frame); see ``epipolar_costs``.
 
-            # cost for any point in time of t1 being the same
-            # any point in time of t2
-            cost = np.abs(np.nansum(np.matmul(_t1, F) * _t2, axis=2))
-            
-            # Get average cost of the entire track
-            cost = cost.mean()
-            costs[i, j] = cost
+    Returns an array of shape (n_frames, n_individuals1) holding, in every frame,
+    the index of the individual of the second view matched to each of the first.
+    """
+    n_frames = points1.shape[0]
+    costs = epipolar_costs(points1, points2, F, window, chunk_size)
+    matches = match_individuals(costs)
+    window = window or max(n_frames, 1)
+    return np.repeat(matches, window, axis=0)[:n_frames]
 
-    match_inds = linear_sum_assignment(np.abs(costs))
-    voting = dict(zip(*match_inds))
 
-    return costs, voting
+def _individuals_points(df):
+    """2D coordinates of a multi-animal DataFrame as an array of shape
+    (n_frames, n_individuals, n_bodyparts, 2)."""
+    individuals = df.columns.get_level_values("individuals").unique()
+    data = df.to_numpy().reshape((len(df), len(individuals), -1, 3))
+    return data[..., :2]
 
 
 def cross_view_match_dataframes(df1, df2, F):
@@ -332,9 +446,9 @@ def cross_view_match_dataframes(df1, df2, F):
     df: Data read from .h5 track file
     F: fundamental matrix from OpenCV
     """
-
-    tracks1 = _reconstruct_tracks_as_tracklets(df1)
-    tracks2 = _reconstruct_tracks_as_tracklets(df2)
-    costs, voting = _associate_paired_view_tracks(tracks1, tracks2, F)
-
-    return costs, voting
\ No newline at end of file
+    inds = df1.index.intersection(df2.index)
+    costs = epipolar_costs(
+        _individuals_points(df1.loc[inds]), _individuals_points(df2.loc[inds]), F
+    )
+    voting = dict(enumerate(match_individuals(costs)[0]))
+    return costs[0], voting
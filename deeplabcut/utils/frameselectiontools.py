@@ -100,6 +100,67 @@ def UniformFramescv2(cap, numframes2pick, start, stop, Index=None):
             return list(Index)
 
 
+def _cluster_frames(features, numframes2pick, batchsize, max_iter, tol=1e-3):
+    """ Cluster downsampled frames incrementally with MiniBatchKMeans.partial_fit.
+
+    features is a compact (nframes, nfeatures) uint8 array; only one minibatch at a
+    time is cast to float32, so memory stays bounded by the size of the uint8 array.
+    Note that centering the data is unnecessary, as k-means is translation invariant.
+
+    Returns the cluster label of every frame."""
+    nframes = len(features)
+    batchsize = max(batchsize, 1)
+    kmeans = MiniBatchKMeans(
+        n_clusters=numframes2pick,
+        batch_size=batchsize,
+        n_init=3,
+        compute_labels=False,
+    )
+    # Initialize the centers on frames drawn across the whole interval
+    init_size = min(nframes, max(3 * batchsize, 3 * numframes2pick))
+    init_inds = np.sort(np.random.choice(nframes, init_size, replace=False))
+    kmeans.partial_fit(features[init_inds].astype(np.float32))
+
+    # Early stopping on the variance-normalized squared center shifts (as in sklearn)
+    sum_ = np.zeros(features.shape[1])
+    sum_sq = np.zeros(features.shape[1])
+    for i in range(0, nframes, 10000):
+        chunk = features[i : i + 10000].astype(np.float64)
+        sum_ += chunk.sum(axis=0)
+        sum_sq += (chunk ** 2).sum(axis=0)
+    tol *= np.mean(sum_sq / nframes - (sum_ / nframes) ** 2)
+    for _ in range(max_iter):
+        shift = 0.0
+        order = np.random.permutation(nframes)
+        nbatches = 0
+        for i in range(0, nframes, batchsize):
+            centers = kmeans.cluster_centers_.copy()
+            batch = np.sort(order[i : i + batchsize])
+            kmeans.partial_fit(features[batch].astype(np.float32))
+            shift += np.sum((kmeans.cluster_centers_ - centers) ** 2) / numframes2pick
+            nbatches += 1
+        if shift / nbatches <= tol:
+            break
+
+    labels = np.empty(nframes, dtype=int)
+    for i in range(0, nframes, 10000):
+        labels[i : i + 10000] = kmeans.predict(
+            features[i : i + 10000].astype(np.float32)
+        )
+    return labels
+
+
+def _pick_one_frame_per_cluster(Index, labels, numframes2pick):
+    frames2pick = []
+    for clusterid in range(numframes2pick):  # pick one frame per cluster
+        clusterids = np.where(clusterid == labels)[0]
+
+        numimagesofcluster = len(clusterids)
+        if numimagesofcluster > 0:
+            frames2pick.append(Index[clusterids[np.random.randint(numimagesofcluster)]])
+    return list(np.array(frames2pick))
+
+
 def KmeansbasedFrameselection(
     clip,
     numframes2pick,
@@ -114,7 +175,7 @@ def KmeansbasedFrameselection(
 ):
     """ This code downsamples the video to a width of resizewidth.
 
-    The video is extracted as a numpy array, which is then clustered with kmeans, whereby each frames is treated as a vector.
+    The downsampled frames are stored as compact uint8 vectors, which are then clustered with kmeans, whereby each frames is treated as a vector.
     Frames from different clusters are then selected for labeling. This procedure makes sure that the frames "look different",
     i.e. different postures etc. On large videos this code is slow.
 
@@ -144,7 +205,6 @@ def KmeansbasedFrameselection(
 
     if len(Index) >= numframes2pick:
         clipresized = clip.resize(width=resizewidth)
-        ny, nx = clipresized.size
         frame0 = img_as_ubyte(clip.get_frame(0))
         if np.ndim(frame0) == 3:
             ncolors = np.shape(frame0)[2]
@@ -152,57 +212,46 @@ def KmeansbasedFrameselection(
             ncolors = 1
         print("Extracting and downsampling...", nframes, " frames from the video.")
 
-        if color and ncolors > 1:
-            DATA = np.zeros((nframes, nx * 3, ny))
-            for counter, index in tqdm(enumerate(Index)):
-                image = img_as_ubyte(
-                    clipresized.get_frame(index * 1.0 / clipresized.fps)
-                )
-                DATA[counter, :, :] = np.vstack(
-                    [image[:, :, 0], image[:, :, 1], image[:, :, 2]]
-                )
-        else:
-            DATA = np.zeros((nframes, nx, ny))
-            for counter, index in tqdm(enumerate(Index)):
-                if ncolors == 1:
-                    DATA[counter, :, :] = img_as_ubyte(
-                        clipresized.get_frame(index * 1.0 / clipresized.fps)
-                    )
-                else:  # attention: averages over color channels to keep size small / perhaps you want to use color information?
-                    DATA[counter, :, :] = img_as_ubyte(
-                        np.array(
-                            np.mean(
-                                clipresized.get_frame(index * 1.0 / clipresized.fps), 2
-                            ),
-                            dtype=np.uint8,
-                        )
-                    )
+        features = None
+        for counter, index in tqdm(enumerate(Index)):
+            image = img_as_ubyte(clipresized.get_frame(index * 1.0 / clipresized.fps))
+            if ncolors > 1 and not color:
+                # attention: averages over color channels to keep size small / perhaps you want to use color information?
+                image = np.mean(image, 2)
+            if features is None:  # allocate memory in first pass
+                features = np.empty((nframes, image.size), dtype=np.uint8)
+            features[counter] = image.ravel()
 
         print("Kmeans clustering ... (this might take a while)")
-        data = DATA - DATA.mean(axis=0)
-        data = data.reshape(nframes, -1)  # stacking
-
-        kmeans = MiniBatchKMeans(
-            n_clusters=numframes2pick, tol=1e-3, batch_size=batchsize, max_iter=max_iter
-        )
-        kmeans.fit(data)
-        frames2pick = []
-        for clusterid in range(numframes2pick):  # pick one frame per cluster
-            clusterids = np.where(clusterid == kmeans.labels_)[0]
-
-            numimagesofcluster = len(clusterids)
-            if numimagesofcluster > 0:
-                frames2pick.append(
-                    Index[clusterids[np.random.randint(numimagesofcluster)]]
-                )
+        labels = _cluster_frames(features, numframes2pick, batchsize, max_iter)
 
         clipresized.close()
         del clipresized
-        return list(np.array(frames2pick))
+        return _pick_one_frame_per_cluster(Index, labels, numframes2pick)
     else:
         return list(Index)
 
 
+def _read_downsampled_frames(cap, Index, ratio, crop, coords, color):
+    """ Decode the frames listed in Index in a single forward pass through the video
+    (see VideoReader.read_frames), downsampling each frame with area interpolation right after decoding.
+
+    Yields the position of the frame in Index and its flattened uint8 representation."""
+    order = np.argsort(Index, kind="stable")
+    for pos, frame in zip(order, cap.read_frames(Index[order])):
+        if frame is None:
+            continue
+        if crop:
+            frame = frame[
+                int(coords[2]) : int(coords[3]), int(coords[0]) : int(coords[1]), :
+            ]
+        # color trafo not necessary; lack thereof improves speed.
+        image = cv2.resize(frame, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+        if not color:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        yield pos, image.ravel()
+
+
 def KmeansbasedFrameselectioncv2(
     cap,
     numframes2pick,
@@ -218,15 +267,14 @@ def KmeansbasedFrameselectioncv2(
     color=False,
 ):
     """ This code downsamples the video to a width of resizewidth.
-    The video is extracted as a numpy array, which is then clustered with kmeans, whereby each frames is treated as a vector.
+    The video is decoded in a single sequential pass, and the downsampled frames are stored as compact uint8 vectors,
+    which are then clustered with kmeans, whereby each frames is treated as a vector.
     Frames from different clusters are then selected for labeling. This procedure makes sure that the frames "look different",
-    i.e. different postures etc. On large videos this code is slow.
+    i.e. different postures etc. Memory only grows with the number of (downsampled) frames, so long videos can be handled too.
 
     Consider not extracting the frames from the whole video but rather set start and stop to a period around interesting behavior.
 
-    Note: this method can return fewer images than numframes2pick.
-
-    Attention: the flow of commands was not optimized for readability, but rather speed. This is why it might appear tedious and repetitive."""
+    Note: this method can return fewer images than numframes2pick."""
     nframes = len(cap)
     nx, ny = cap.dimensions
     ratio = resizewidth * 1.0 / nx
@@ -253,153 +301,28 @@ def KmeansbasedFrameselectioncv2(
     if batchsize > nframes:
         batchsize = nframes // 2
 
-    allocated = False
     if len(Index) >= numframes2pick:
-        if (
-            np.mean(np.diff(Index)) > 1
-        ):  # then non-consecutive indices are present, thus cap.set is required (which slows everything down!)
-            print("Extracting and downsampling...", nframes, " frames from the video.")
-            if color:
-                for counter, index in tqdm(enumerate(Index)):
-                    cap.set_to_frame(index)  # extract a particular frame
-                    frame = cap.read_frame()
-                    if frame is not None:
-                        if crop:
-                            frame = frame[
-                                int(coords[2]) : int(coords[3]),
-                                int(coords[0]) : int(coords[1]),
-                                :,
-                            ]
-
-                        # image=img_as_ubyte(cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),None,fx=ratio,fy=ratio))
-                        image = img_as_ubyte(
-                            cv2.resize(
-                                frame,
-                                None,
-                                fx=ratio,
-                                fy=ratio,
-                                interpolation=cv2.INTER_NEAREST,
-                            )
-                        )  # color trafo not necessary; lack thereof improves speed.
-                        if (
-                            not allocated
-                        ):  #'DATA' not in locals(): #allocate memory in first pass
-                            DATA = np.empty(
-                                (nframes, np.shape(image)[0], np.shape(image)[1] * 3)
-                            )
-                            allocated = True
-                        DATA[counter, :, :] = np.hstack(
-                            [image[:, :, 0], image[:, :, 1], image[:, :, 2]]
-                        )
-            else:
-                for counter, index in tqdm(enumerate(Index)):
-                    cap.set_to_frame(index)  # extract a particular frame
-                    frame = cap.read_frame()
-                    if frame is not None:
-                        if crop:
-                            frame = frame[
-                                int(coords[2]) : int(coords[3]),
-                                int(coords[0]) : int(coords[1]),
-                                :,
-                            ]
-                        # image=img_as_ubyte(cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),None,fx=ratio,fy=ratio))
-                        image = img_as_ubyte(
-                            cv2.resize(
-                                frame,
-                                None,
-                                fx=ratio,
-                                fy=ratio,
-                                interpolation=cv2.INTER_NEAREST,
-                            )
-                        )  # color trafo not necessary; lack thereof improves speed.
-                        if (
-                            not allocated
-                        ):  #'DATA' not in locals(): #allocate memory in first pass
-                            DATA = np.empty(
-                                (nframes, np.shape(image)[0], np.shape(image)[1])
-                            )
-                            allocated = True
-                        DATA[counter, :, :] = np.mean(image, 2)
-        else:
-            print("Extracting and downsampling...", nframes, " frames from the video.")
-            if color:
-                for counter, index in tqdm(enumerate(Index)):
-                    frame = cap.read_frame()
-                    if frame is not None:
-                        if crop:
-                            frame = frame[
-                                int(coords[2]) : int(coords[3]),
-                                int(coords[0]) : int(coords[1]),
-                                :,
-                            ]
-
-                        # image=img_as_ubyte(cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),None,fx=ratio,fy=ratio))
-                        image = img_as_ubyte(
-                            cv2.resize(
-                                frame,
-                                None,
-                                fx=ratio,
-                                fy=ratio,
-                                interpolation=cv2.INTER_NEAREST,
-                            )
-                        )  # color trafo not necessary; lack thereof improves speed.
-                        if (
-                            not allocated
-                        ):  #'DATA' not in locals(): #allocate memory in first pass
-                            DATA = np.empty(
-                                (nframes, np.shape(image)[0], np.shape(image)[1] * 3)
-                            )
-                            allocated = True
-                        DATA[counter, :, :] = np.hstack(
-                            [image[:, :, 0], image[:, :, 1], image[:, :, 2]]
-                        )
-            else:
-                for counter, index in tqdm(enumerate(Index)):
-                    frame = cap.read_frame()
-                    if frame is not None:
-                        if crop:
-                            frame = frame[
-                                int(coords[2]) : int(coords[3]),
-                                int(coords[0]) : int(coords[1]),
-                                :,
-                            ]
-                        # image=img_as_ubyte(cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),None,fx=ratio,fy=ratio))
-                        image = img_as_ubyte(
-                            cv2.resize(
-                                frame,
-                                None,
-                                fx=ratio,
-                                fy=ratio,
-                                interpolation=cv2.INTER_NEAREST,
-                            )
-                        )  # color trafo not necessary; lack thereof improves speed.
-                        if (
-                            not allocated
-                        ):  #'DATA' not in locals(): #allocate memory in first pass
-                            DATA = np.empty(
-                                (nframes, np.shape(image)[0], np.shape(image)[1])
-                            )
-                            allocated = True
-                        DATA[counter, :, :] = np.mean(image, 2)
+        print("Extracting and downsampling...", nframes, " frames from the video.")
+        features = None
+        is_valid = np.zeros(nframes, dtype=bool)
+        for pos, image in tqdm(
+            _read_downsampled_frames(cap, Index, ratio, crop, coords, color),
+            total=nframes,
+        ):
+            if features is None:  # allocate memory in first pass
+                features = np.empty((nframes, image.size), dtype=np.uint8)
+            features[pos] = image
+            is_valid[pos] = True
+
+        Index = Index[is_valid]
+        if len(Index) < numframes2pick:
+            return list(Index)
 
         print("Kmeans clustering ... (this might take a while)")
-        data = DATA - DATA.mean(axis=0)
-        data = data.reshape(nframes, -1)  # stacking
-
-        kmeans = MiniBatchKMeans(
-            n_clusters=numframes2pick, tol=1e-3, batch_size=batchsize, max_iter=max_iter
-        )
-        kmeans.fit(data)
-        frames2pick = []
-        for clusterid in range(numframes2pick):  # pick one frame per cluster
-            clusterids = np.where(clusterid == kmeans.labels_)[0]
-
-            numimagesofcluster = len(clusterids)
-            if numimagesofcluster > 0:
-                frames2pick.append(
-                    Index[clusterids[np.random.randint(numimagesofcluster)]]
-                )
+        if not is_valid.all():
+            features = features[is_valid]
+        labels = _cluster_frames(features, numframes2pick, batchsize, max_iter)
         # cap.release() >> still used in frame_extraction!
-        return list(np.array(frames2pick))
+        return _pick_one_frame_per_cluster(Index, labels, numframes2pick)
     else:
         return list(Index)
@@ -1040,11 +1040,9 @@ def _create_video_from_tracks(video, tracks, destfolder, output_name, pcutoff, s
     fig, ax = visualization.prepare_figure_axes(nx, ny, scale)
     im = ax.imshow(np.zeros((ny, nx)))
     markers = sum([ax.plot([], [], ".", c=c) for c in cc], [])
-    for index in tqdm(range(nframes)):
-        vid.set_to_frame(index)
+    for index, frame in enumerate(tqdm(vid.read_frames(range(nframes)), total=nframes)):
         imname = "frame" + str(index).zfill(strwidth)
         image_output = os.path.join(destfolder, imname + ".png")
-        frame = vid.read_frame()
         if frame is not None and not os.path.isfile(image_output):
             im.set_data(frame[:, X1:X2])
             for n, trackid in enumerate(trackids):
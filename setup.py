@@ -56,6 +56,7 @@ setuptools.setup(
             "napari-deeplabcut>=0.0.6",
         ],
         "openvino": ["openvino-dev==2022.1.0"],
+        "onnx": ["onnxruntime", "tf2onnx"],
         "docs": ["numpydoc"],
     },
     scripts=["deeplabcut/pose_estimation_tensorflow/models/pretrained/download.sh"],
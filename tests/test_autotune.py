@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+import pytest
+from deeplabcut.pose_estimation_tensorflow.core import autotune
+from deeplabcut.utils import auxiliaryfunctions
+
+
+class _FakeSession:
+    def __init__(self, max_batchsize=np.inf, error=MemoryError):
+        self.max_batchsize = max_batchsize
+        self.error = error
+        self.batch_sizes = []
+
+    def run(self, outputs, feed_dict):
+        batch = next(iter(feed_dict.values()))
+        if len(batch) > self.max_batchsize:
+            raise self.error
+        self.batch_sizes.append(len(batch))
+        return [batch.mean(axis=(1, 2, 3))]
+
+
+@pytest.fixture
+def video(tmpdir):
+    path = str(tmpdir.join("video.avi"))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (48, 32))
+    for i in range(10):
+        writer.write(np.full((32, 48, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_pick_batch_size():
+    fps = {1: 100, 2: 180, 4: 300, 8: 390, 16: 400, 32: 395}
+    results = {b: {"fps": f, "peak_memory": None} for b, f in fps.items()}
+    assert autotune.pick_batch_size(results) == 8
+    assert autotune.pick_batch_size(results, tolerance=0) == 16
+
+
+def test_benchmark_stops_when_out_of_memory():
+    sess = _FakeSession(max_batchsize=4)
+    frames = np.zeros((3, 8, 8, 3), dtype=np.uint8)
+    results = autotune.benchmark_batch_sizes(sess, None, None, frames, min_gain=-1)
+    assert list(results) == [1, 2, 4]
+
+
+def test_benchmark_stops_on_backend_errors():
+    # onnxruntime and OpenVINO raise their own exceptions when out of memory
+    frames = np.zeros((3, 8, 8, 3), dtype=np.uint8)
+    sess = _FakeSession(max_batchsize=2, error=RuntimeError("Failed to allocate"))
+    results = autotune.benchmark_batch_sizes(sess, None, None, frames, min_gain=-1)
+    assert list(results) == [1, 2]
+    sess = _FakeSession(max_batchsize=0, error=RuntimeError("Invalid model"))
+    with pytest.raises(RuntimeError, match="Invalid model"):
+        autotune.benchmark_batch_sizes(sess, None, None, frames)
+
+
+def test_batchsize_tuner_cache(tmpdir, video):
+    cache_file = str(tmpdir.join("batchsize_autotune.yaml"))
+    sess = _FakeSession()
+    tuner = autotune.BatchSizeTuner(sess, None, None, cache_file, "snapshot-0")
+    batchsize, info = tuner.tune(video, cropping=[0, 40, 0, 20])
+    assert not info["cached"]
+    assert batchsize in info["fps"]
+    assert sess.batch_sizes
+
+    cache = auxiliaryfunctions.read_plainconfig(cache_file)
+    key = f"snapshot-0|20x40|{tuner.device}"
+    assert cache[key]["batch_size"] == batchsize
+
+    sess.batch_sizes.clear()
+    batchsize_cached, info = tuner.tune(video, cropping=[0, 40, 0, 20])
+    assert info["cached"] and batchsize_cached == batchsize
+    assert not sess.batch_sizes
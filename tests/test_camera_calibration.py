@@ -0,0 +1,51 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+from deeplabcut.pose_estimation_3d import camera_calibration
+
+
+@pytest.fixture
+def chessboard(tmpdir_factory):
+    sq, rows, cols = 80, 8, 6
+    board = np.full(((rows + 3) * sq, (cols + 3) * sq), 255, np.uint8)
+    for r in range(rows + 1):
+        for c in range(cols + 1):
+            if (r + c) % 2 == 0:
+                board[(r + 1) * sq : (r + 2) * sq, (c + 1) * sq : (c + 2) * sq] = 0
+    h, w = board.shape
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    dst = src * 1.5 + np.float32([[500, 200], [560, 150], [600, 250], [450, 230]])
+    M = cv2.getPerspectiveTransform(src, dst)
+    img = cv2.warpPerspective(board, M, (2400, 1600), borderValue=150)
+    img = cv2.GaussianBlur(img, (5, 5), 1)
+    path = str(tmpdir_factory.mktemp("calibration").join("camera-1-1.jpg"))
+    cv2.imwrite(path, cv2.cvtColor(img, cv2.COLOR_GRAY2BGR))
+    return path
+
+
+def test_find_corners_coarse_to_fine(chessboard):
+    ret, corners, shape = camera_calibration._find_corners(chessboard, 8, 6)
+    assert ret
+    assert corners.shape == (48, 1, 2)
+    assert shape == (1600, 2400)
+    path_corners = os.path.dirname(chessboard)
+    ret, corners_coarse, _ = camera_calibration._find_corners(
+        chessboard, 8, 6, detection_size=800, path_corners=path_corners
+    )
+    assert ret
+    np.testing.assert_allclose(corners_coarse, corners, atol=0.01)
+    assert os.path.isfile(os.path.join(path_corners, "camera-1-1_corner.jpg"))
+
+
+def test_find_corners_not_found(tmpdir):
+    path = str(tmpdir.join("camera-1-1.jpg"))
+    cv2.imwrite(path, np.full((400, 600, 3), 128, np.uint8))
+    for detection_size in (None, 200):
+        ret, corners, _ = camera_calibration._find_corners(
+            path, 8, 6, detection_size, str(tmpdir)
+        )
+        assert not ret
+        assert corners is None
+    assert not os.path.isfile(str(tmpdir.join("camera-1-1_corner.jpg")))
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+from deeplabcut.pose_estimation_tensorflow.core import evaluate
+
+
+def test_read_images_by_shape(tmpdir):
+    rng = np.random.default_rng(0)
+    shapes = [(40, 60), (30, 50), (40, 60), (40, 60), (30, 50)]
+    folder = tmpdir.mkdir("labeled-data")
+    image_paths = []
+    for i, shape in enumerate(shapes):
+        image = rng.integers(0, 255, (*shape, 3), dtype=np.uint8)
+        cv2.imwrite(str(folder.join(f"img{i}.png")), image)
+        image_paths.append(("labeled-data", f"img{i}.png"))
+
+    images_by_shape = evaluate._read_images_by_shape(str(tmpdir), image_paths)
+    assert len(images_by_shape) == 2
+    inds, images = images_by_shape[(40, 60, 3)]
+    np.testing.assert_equal(inds, [0, 2, 3])
+    assert images.shape == (3, 40, 60, 3) and images.dtype == np.uint8
+    inds, images = images_by_shape[(30, 50, 3)]
+    np.testing.assert_equal(inds, [1, 4])
+
+    rescaled = evaluate._read_images_by_shape(str(tmpdir), image_paths, scale=0.5)
+    assert set(rescaled) == {(20, 30, 3), (15, 25, 3)}
+
+
+class _FakeSession:
+    """Scores the pixel sum of every image at the center of the score map."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def run(self, outputs, feed_dict):
+        batch = next(iter(feed_dict.values()))
+        assert len(batch) == self.batch_size
+        scmap = np.zeros((len(batch), 5, 5, 1))
+        scmap[:, 2, 2, 0] = batch.sum(axis=(1, 2, 3))
+        return [scmap]
+
+
+def test_predict_images():
+    dlc_cfg = {
+        "batch_size": 3,
+        "all_joints_names": ["bp"],
+        "location_refinement": False,
+        "stride": 8,
+    }
+    images_by_shape = {
+        (4, 4, 3): (np.array([0, 3, 4, 6]), np.arange(1, 5)[:, None, None, None]),
+        (2, 2, 3): (np.array([1, 2, 5]), np.arange(5, 8)[:, None, None, None]),
+    }
+    images_by_shape = {
+        shape: (inds, np.broadcast_to(images, (len(inds), *shape)).astype(np.uint8))
+        for shape, (inds, images) in images_by_shape.items()
+    }
+    poses = evaluate._predict_images(
+        images_by_shape, 7, dlc_cfg, _FakeSession(3), "inputs", "outputs"
+    )
+    assert poses.shape == (7, 3)
+    np.testing.assert_equal(poses[:, :2], 20)
+    np.testing.assert_equal(
+        poses[:, 2], [48, 5 * 12, 6 * 12, 2 * 48, 3 * 48, 7 * 12, 4 * 48]
+    )
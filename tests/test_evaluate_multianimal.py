@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+from deeplabcut.pose_estimation_tensorflow.core import evaluate_multianimal
+from deeplabcut.pose_estimation_tensorflow.core import (
+    predict_multianimal as predictma,
+)
+
+
+def test_batches_by_shape(tmpdir):
+    folder = tmpdir.mkdir("labeled-data")
+    shapes = [(40, 60), (30, 50), (40, 60), (40, 60), (30, 50), (40, 60)]
+    image_paths = []
+    for i, (h, w) in enumerate(shapes):
+        Image.fromarray(np.zeros((h, w, 3), dtype=np.uint8)).save(
+            str(folder.join(f"img{i}.png"))
+        )
+        image_paths.append(("labeled-data", f"img{i}.png"))
+
+    batches = evaluate_multianimal._batches_by_shape(str(tmpdir), image_paths, 3)
+    assert batches == [[0, 2, 3], [5], [1, 4]]
+    batches = evaluate_multianimal._batches_by_shape(
+        str(tmpdir), image_paths, 4, image_shape=(32, 32)
+    )
+    assert batches == [[0, 1, 2, 3], [4, 5]]
+
+
+class _FakeSession:
+    """Score maps, location refinement and PAF fields derived from the images."""
+
+    def run(self, outputs, feed_dict):
+        images = next(iter(feed_dict.values())).astype(float) / 255
+        small = images[:, ::8, ::8]
+        scmaps = np.concatenate((small, small.mean(axis=3, keepdims=True)), axis=3)
+        locrefs = np.repeat(scmaps, 2, axis=3) - 0.5
+        pafs = np.concatenate((small, 1 - small), axis=3) - 0.5
+        peaks = np.argwhere(scmaps > 0.85)
+        return [scmaps, locrefs, pafs, peaks]
+
+
+@pytest.fixture
+def annotations():
+    rng = np.random.default_rng(0)
+    columns = pd.MultiIndex.from_tuples(
+        [
+            ("me", ind, bpt, coord)
+            for ind, bpts in [
+                ("mouse1", ["nose", "tail", "ear"]),
+                ("mouse2", ["nose", "tail", "ear"]),
+                ("single", ["led"]),
+            ]
+            for bpt in bpts
+            for coord in ("x", "y")
+        ],
+        names=["scorer", "individuals", "bodyparts", "coords"],
+    )
+    index = pd.MultiIndex.from_tuples(
+        [("labeled-data", "vid", f"img{i}.png") for i in range(6)]
+    )
+    xy = np.stack(
+        (rng.uniform(4, 92, size=(6, 7)), rng.uniform(4, 60, size=(6, 7))), axis=2
+    )
+    Data = pd.DataFrame(xy.reshape((6, -1)), index=index, columns=columns)
+    Data.iloc[1, 2:4] = np.nan
+    Data.iloc[2, 6:12] = np.nan
+    Data.iloc[4, 12:] = np.nan
+    images = rng.integers(0, 256, size=(6, 64, 96, 3), dtype=np.uint8)
+    dlc_cfg = {
+        "all_joints_names": ["nose", "tail", "ear", "led"],
+        "num_joints": 4,
+        "stride": 8,
+        "locref_stdev": 7.2801,
+        "partaffinityfield_graph": [[0, 1], [1, 2], [0, 2]],
+    }
+    return Data, images, dlc_cfg
+
+
+def _evaluate_image(Data, imageindex, image, dlc_cfg, sess, all_bpts):
+    # Former per-image evaluation, based on unstack/reindex/groupby
+    joints = dlc_cfg["all_joints_names"]
+    stride = dlc_cfg["stride"]
+    GT = Data.iloc[imageindex]
+    df = GT.unstack("coords").reindex(joints, level="bodyparts")
+    groundtruthidentity = list(
+        df.index.get_level_values("individuals").to_numpy().reshape((-1, 1))
+    )
+    groundtruthcoordinates = list(df.values[:, np.newaxis])
+    for i, coords in enumerate(groundtruthcoordinates):
+        if np.isnan(coords).any():
+            groundtruthcoordinates[i] = np.empty((0, 2), dtype=float)
+            groundtruthidentity[i] = np.array([], dtype=str)
+    temp = df.reset_index(level="bodyparts").dropna()
+    temp["bodyparts"].replace(dict(zip(joints, range(len(joints)))), inplace=True)
+    temp["sample"] = 0
+    peaks_gt = temp.loc[:, ["sample", "y", "x", "bodyparts"]].to_numpy()
+    peaks_gt[:, 1:3] = (peaks_gt[:, 1:3] - stride // 2) / stride
+    pred = predictma.predict_batched_peaks_and_costs(
+        dlc_cfg, image[np.newaxis], sess, None, None, peaks_gt.astype(int)
+    )[0]
+
+    dist = np.full(len(all_bpts), np.nan)
+    conf = np.full(len(all_bpts), np.nan)
+    coords_pred = pred["coordinates"][0]
+    probs_pred = pred["confidence"]
+    for bpt, xy_gt in df.groupby(level="bodyparts"):
+        inds_gt = np.flatnonzero(np.all(~np.isnan(xy_gt), axis=1))
+        n_joint = joints.index(bpt)
+        xy = coords_pred[n_joint]
+        if inds_gt.size and xy.size:
+            xy_gt_values = xy_gt.iloc[inds_gt].values
+            neighbors = evaluate_multianimal._find_closest_neighbors(
+                xy_gt_values, xy, k=3
+            )
+            found = neighbors != -1
+            inds = np.flatnonzero(all_bpts == bpt)
+            dist[inds[inds_gt[found]]] = np.linalg.norm(
+                xy_gt_values[found] - xy[neighbors[found]], axis=1
+            )
+            conf[inds[inds_gt[found]]] = probs_pred[n_joint][neighbors[found]].squeeze()
+    return pred, groundtruthidentity, groundtruthcoordinates, dist, conf
+
+
+def _assert_equal(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            _assert_equal(a[key], b[key])
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b)
+        for a_, b_ in zip(a, b):
+            _assert_equal(a_, b_)
+    else:
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize(
+    "batch_size, batches", [(1, [[i] for i in range(6)]), (4, [[0, 2, 3, 5], [1, 4]])]
+)
+def test_evaluate_batches(annotations, batch_size, batches):
+    Data, images, dlc_cfg = annotations
+    joints = dlc_cfg["all_joints_names"]
+    all_bpts = np.asarray(2 * ["nose", "tail", "ear"] + ["led"])
+    sess = _FakeSession()
+    expected = [
+        _evaluate_image(Data, i, images[i], dlc_cfg, sess, all_bpts)
+        for i in range(len(Data))
+    ]
+
+    index_gt, row_pairs, rows_per_joint = evaluate_multianimal._ground_truth_layout(
+        Data, joints, all_bpts
+    )
+    identity_gt = index_gt.get_level_values("individuals").to_numpy()
+    bpts_gt = index_gt.get_level_values("bodyparts").to_numpy()
+    xy_all = Data.to_numpy().reshape((len(Data), -1, 2))
+    PredicteData = {}
+    for batch in batches:
+        xy_gt = xy_all[batch][:, row_pairs]
+        preds = evaluate_multianimal._predict_batch(
+            dlc_cfg, images[batch], xy_gt, bpts_gt, sess, None, None, batch_size
+        )
+        assert len(preds) == len(batch)
+        for n, pred in enumerate(preds):
+            results = evaluate_multianimal._match_to_ground_truth(
+                pred, xy_gt[n], identity_gt, rows_per_joint, len(all_bpts)
+            )
+            _assert_equal((pred, *results), expected[batch[n]])
+            PredicteData[batch[n]] = {"index": batch[n]}
+
+    PredicteData = evaluate_multianimal._in_image_order(PredicteData, Data.index)
+    assert list(PredicteData) == list(Data.index)
+    assert [v["index"] for v in PredicteData.values()] == list(range(len(Data)))
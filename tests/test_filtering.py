@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+from deeplabcut.post_processing import filtering
+from deeplabcut.utils import auxiliaryfunctions
+from scipy import signal
+from scipy.interpolate import CubicSpline
+
+
+def _spline_interp_per_column(data, max_gap=0):
+    # Former implementation, fitting one spline per column
+    nrows, ncols = data.shape
+    temp = data.copy()
+    valid = ~np.isnan(temp)
+    x = np.arange(nrows)
+    for i in range(ncols):
+        mask = valid[:, i]
+        if np.sum(mask) > 3:
+            y = CubicSpline(x[mask], temp[mask, i])(x)
+            if max_gap > 0:
+                inds = np.flatnonzero(np.r_[True, np.diff(mask), True])
+                count = np.diff(inds)
+                inds = inds[:-1]
+                to_fill = np.ones_like(mask)
+                for ind, n, is_nan in zip(inds, count, ~mask[inds]):
+                    if is_nan and n > max_gap:
+                        to_fill[ind : ind + n] = False
+                y[~to_fill] = np.nan
+            y[y == 0] = np.nan
+            temp[:, i] = y
+    return temp
+
+
+@pytest.fixture
+def data_with_gaps():
+    rng = np.random.default_rng(0)
+    data = rng.uniform(1, 100, size=(60, 6))
+    data[5:8, :2] = np.nan  # Short gap shared by x and y
+    data[20:35, :2] = np.nan  # Gap longer than max_gap
+    data[10:12, 2] = np.nan
+    data[40:, 3] = np.nan  # Trailing gap
+    data[:3, 4:] = np.nan  # Leading gap
+    data[::2, 5] = np.nan
+    return data
+
+
+def test_run_lengths():
+    mask = np.array([[1, 0], [1, 0], [0, 0], [1, 1], [1, 1]], dtype=bool)
+    expected = np.array([[2, 3], [2, 3], [1, 3], [2, 2], [2, 2]])
+    np.testing.assert_array_equal(filtering._run_lengths(mask), expected)
+
+
+@pytest.mark.parametrize("max_gap", [0, 5])
+def test_columnwise_spline_interp(data_with_gaps, max_gap):
+    interp = filtering.columnwise_spline_interp(data_with_gaps, max_gap)
+    expected = _spline_interp_per_column(data_with_gaps, max_gap)
+    np.testing.assert_array_equal(np.isnan(interp), np.isnan(expected))
+    np.testing.assert_allclose(interp, expected, rtol=1e-8)
+    if max_gap:
+        assert np.isnan(interp[20:35, :2]).all()
+        assert not np.isnan(interp[5:8, :2]).any()
+
+
+def test_columnwise_median_filter(data_with_gaps):
+    data = np.c_[data_with_gaps, np.nan_to_num(data_with_gaps)]
+    filtered = filtering.columnwise_median_filter(data, 5)
+    for i in range(data.shape[1]):
+        np.testing.assert_array_equal(filtered[:, i], signal.medfilt(data[:, i], 5))
+    with pytest.raises(ValueError):
+        filtering.columnwise_median_filter(data, 4)
+
+
+@pytest.mark.parametrize("filtertype", ["median", "savgol"])
+def test_filterpredictions(tmpdir, monkeypatch, filtertype):
+    scorer = "DLC_resnet50_testJan1shuffle1_1000"
+    columns = pd.MultiIndex.from_product(
+        [[scorer], ["head", "tail"], ["x", "y", "likelihood"]],
+        names=["scorer", "bodyparts", "coords"],
+    )
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.uniform(0, 100, size=(50, 6)), columns=columns)
+    df.iloc[10:14, 0] = np.nan  # Missing detections are kept as NaNs
+    df.to_hdf(str(tmpdir.join(f"video{scorer}.h5")), "df_with_missing")
+    video = str(tmpdir.join("video.avi"))
+    open(video, "w").close()
+    monkeypatch.setattr(
+        auxiliaryfunctions, "read_config", lambda config: {"TrainingFraction": [0.95]}
+    )
+    monkeypatch.setattr(
+        auxiliaryfunctions, "get_scorer_name", lambda *args, **kwargs: (scorer, scorer)
+    )
+
+    filtering.filterpredictions(
+        "config.yaml", video, filtertype=filtertype, windowlength=7, save_as_csv=False
+    )
+    filtered = pd.read_hdf(str(tmpdir.join(f"video{scorer}_filtered.h5")))
+    for column in df:
+        values = df[column].values
+        if column[2] == "likelihood":
+            expected = values
+        elif filtertype == "median":
+            expected = signal.medfilt(values, 7)
+        else:
+            expected = signal.savgol_filter(values, 7, 2)
+        np.testing.assert_allclose(filtered[column].values, expected)
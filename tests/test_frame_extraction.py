@@ -0,0 +1,83 @@
+import os
+import cv2
+import numpy as np
+import pytest
+from skimage import io
+from deeplabcut.generate_training_dataset import frame_extraction
+from deeplabcut.utils import auxiliaryfunctions, frameselectiontools
+
+
+@pytest.fixture
+def project(tmpdir, monkeypatch):
+    videos = []
+    for n in range(2):
+        video = str(tmpdir.join(f"video{n}.avi"))
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+        for i in range(40):
+            frame = np.full((48, 64, 3), 6 * i, dtype=np.uint8)
+            frame[:, : i + 10] = 255 - 6 * i
+            writer.write(frame)
+        writer.release()
+        videos.append(video)
+        tmpdir.join("labeled-data", f"video{n}").ensure(dir=True)
+    cfg = {
+        "numframes2pick": 4,
+        "start": 0,
+        "stop": 1,
+        "video_sets": {video: {"crop": "0, 64, 0, 48"} for video in videos},
+    }
+    config = str(tmpdir.join("config.yaml"))
+    monkeypatch.setattr(auxiliaryfunctions, "read_config", lambda config: cfg)
+    return config, videos
+
+
+def _read_frame(video, index):
+    cap = cv2.VideoCapture(video)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    _, frame = cap.read()
+    cap.release()
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+@pytest.mark.parametrize("algo", ["uniform", "kmeans"])
+def test_extract_frames(project, n_workers, algo):
+    config, videos = project
+    frame_extraction.extract_frames(
+        config, algo=algo, userfeedback=False, n_workers=n_workers
+    )
+    for video in videos:
+        folder = os.path.join(os.path.dirname(config), "labeled-data", video[-10:-4])
+        images = sorted(os.listdir(folder))
+        assert 0 < len(images) <= 4
+        for image in images:
+            assert image.startswith("img") and image.endswith(".png")
+            np.testing.assert_array_equal(
+                io.imread(os.path.join(folder, image)),
+                _read_frame(video, int(image[3:-4])),
+            )
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_extract_frames_stops_when_selection_fails(
+    project, monkeypatch, capsys, n_workers
+):
+    config, videos = project
+    uniform_frames = frameselectiontools.UniformFramescv2
+
+    def select_frames(cap, *args):
+        if cap.name == "video0":
+            return []
+        return uniform_frames(cap, *args)
+
+    monkeypatch.setattr(frameselectiontools, "UniformFramescv2", select_frames)
+    frame_extraction.extract_frames(
+        config, algo="uniform", userfeedback=False, n_workers=n_workers
+    )
+    out = capsys.readouterr().out
+    assert "Frame selection failed" in out
+    assert "successfully extracted" not in out
+    if n_workers == 1:
+        # The next video is not processed
+        folder = os.path.join(os.path.dirname(config), "labeled-data", "video1")
+        assert not os.listdir(folder)
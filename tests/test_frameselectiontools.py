@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+import pytest
+from deeplabcut.utils import frameselectiontools
+from deeplabcut.utils.auxfun_videos import VideoWriter
+
+
+@pytest.fixture
+def video(tmpdir):
+    # Four visually distinct states, each held for 20 frames
+    path = str(tmpdir.join("video.avi"))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    rng = np.random.default_rng(0)
+    for i in range(80):
+        frame = np.full((48, 64, 3), 60 * (i // 20), dtype=np.uint8)
+        frame += rng.integers(0, 10, size=frame.shape, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return VideoWriter(path)
+
+
+class _CorruptedVideo:
+    """Video whose frames in ``corrupted`` cannot be decoded."""
+
+    def __init__(self, video, corrupted):
+        self.video = video
+        self.corrupted = set(corrupted)
+
+    def __getattr__(self, attr):
+        return getattr(self.video, attr)
+
+    def __len__(self):
+        return len(self.video)
+
+    def read_frames(self, indices, *args, **kwargs):
+        frames = self.video.read_frames(indices, *args, **kwargs)
+        for ind, frame in zip(indices, frames):
+            yield None if ind in self.corrupted else frame
+
+
+def test_kmeans_frame_selection(video):
+    np.random.seed(0)
+    frames = frameselectiontools.KmeansbasedFrameselectioncv2(
+        video, 4, 0, 1, False, None, resizewidth=16, batchsize=10
+    )
+    assert len(frames) == len(set(frames)) <= 4
+    assert all(0 <= frame < len(video) for frame in frames)
+    # One frame per visual state
+    assert sorted(frame // 20 for frame in frames) == [0, 1, 2, 3]
+
+
+def test_kmeans_frame_selection_drops_undecodable_frames(video):
+    np.random.seed(0)
+    corrupted = set(range(0, 80, 3))
+    frames = frameselectiontools.KmeansbasedFrameselectioncv2(
+        _CorruptedVideo(video, corrupted), 4, 0, 1, False, None, resizewidth=16,
+        batchsize=10,
+    )
+    assert len(frames) == len(set(frames)) <= 4
+    assert not corrupted.intersection(frames)
+
+    # Too few frames left to cluster; the decodable ones are returned
+    corrupted = set(range(80)) - {5, 50}
+    frames = frameselectiontools.KmeansbasedFrameselectioncv2(
+        _CorruptedVideo(video, corrupted), 4, 0, 1, False, None, resizewidth=16,
+    )
+    assert sorted(frames) == [5, 50]
+
+
+def test_cluster_frames_early_stopping(monkeypatch):
+    n_calls = []
+
+    class MiniBatchKMeans(frameselectiontools.MiniBatchKMeans):
+        def partial_fit(self, X, *args, **kwargs):
+            n_calls.append(len(X))
+            return super().partial_fit(X, *args, **kwargs)
+
+    monkeypatch.setattr(frameselectiontools, "MiniBatchKMeans", MiniBatchKMeans)
+    np.random.seed(0)
+    rng = np.random.default_rng(0)
+    centers = np.array([20, 120, 220])
+    features = (
+        np.repeat(centers, 50)[:, None] + rng.integers(0, 5, size=(150, 8))
+    ).astype(np.uint8)
+    max_iter = 100
+    labels = frameselectiontools._cluster_frames(features, 3, 25, max_iter)
+    n_epochs = (len(n_calls) - 1) / 6  # Minus the initialization
+    assert n_epochs == int(n_epochs) and n_epochs < max_iter
+    # Well separated clusters are recovered
+    assert len(np.unique(labels)) == 3
+    for i in range(3):
+        assert len(np.unique(labels[i * 50 : (i + 1) * 50])) == 1
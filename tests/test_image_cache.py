@@ -0,0 +1,42 @@
+import cv2
+import os
+import numpy as np
+from deeplabcut.pose_estimation_tensorflow.datasets.image_cache import ImageCache
+
+
+def _make_images(tmpdir, n_images=3):
+    folder = tmpdir.mkdir("labeled-data").mkdir("video")
+    paths = []
+    for i in range(n_images):
+        path = os.path.join("labeled-data", "video", f"img{i}.png")
+        cv2.imwrite(str(tmpdir.join(path)), np.full((20, 30, 3), 10 * i, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def test_image_cache(tmpdir):
+    paths = _make_images(tmpdir)
+    project_path = str(tmpdir)
+    cache_file = str(tmpdir.join("dataset.imagecache"))
+    cache = ImageCache(project_path, paths, cache_file, max_size=1)
+    assert all(path in cache for path in paths)
+    image = cache.read(paths[2])
+    assert image.shape == (20, 30, 3) and image.dtype == np.uint8
+    np.testing.assert_array_equal(image, 20)
+
+    # The cache file is reused, unless the images change
+    mtime = os.path.getmtime(cache.blob_file)
+    cache = ImageCache(project_path, paths, cache_file, max_size=1)
+    assert os.path.getmtime(cache.blob_file) == mtime
+    cv2.imwrite(str(tmpdir.join(paths[2])), np.full((10, 10, 3), 5, dtype=np.uint8))
+    cache = ImageCache(project_path, paths, cache_file, max_size=1)
+    np.testing.assert_array_equal(cache.read(paths[2]), 5)
+
+
+def test_image_cache_size(tmpdir):
+    paths = _make_images(tmpdir)
+    cache_file = str(tmpdir.join("dataset.imagecache"))
+    # Room for two images only
+    cache = ImageCache(str(tmpdir), paths, cache_file, max_size=4000 / 1024 ** 2)
+    assert [path in cache for path in paths] == [True, True, False]
+    np.testing.assert_array_equal(cache.read(paths[2]), 20)
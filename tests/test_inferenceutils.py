@@ -171,6 +171,31 @@ def test_assembler(tmpdir_factory, real_assemblies):
     ass.to_pickle(str(output_name).replace("h5", "pickle"))
 
 
+def test_assembler_cached_links():
+    with open(os.path.join(TEST_DATA_DIR, "trimouse_full.pickle"), "rb") as file:
+        data = pickle.load(file)
+    ass = inferenceutils.Assembler(data, max_n_individuals=3, n_multibodyparts=12)
+    graphs = [list(range(11)), list(range(0, 66, 2)), list(range(66))[::-1]]
+    expected = []
+    for paf_inds in graphs:
+        ass.paf_inds = paf_inds
+        ass.assemble(chunk_size=0)
+        expected.append({k: [a.data for a in v] for k, v in ass.assemblies.items()})
+
+    # Assemblies are unchanged when reusing the links of a larger set of edges
+    ass.cache_links(set().union(*graphs[:2]))
+    for paf_inds, assemblies in zip(graphs, expected):
+        ass.paf_inds = paf_inds
+        ass.assemble(chunk_size=0)
+        assert ass.assemblies.keys() == assemblies.keys()
+        for k, v in ass.assemblies.items():
+            np.testing.assert_equal([a.data for a in v], assemblies[k])
+
+    ass.window_size = 1
+    with pytest.raises(ValueError):
+        ass.cache_links()
+
+
 def test_assembler_with_single_bodypart(real_assemblies):
     with open(os.path.join(TEST_DATA_DIR, "trimouse_full.pickle"), "rb") as file:
         temp = pickle.load(file)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from deeplabcut.pose_estimation_tensorflow.datasets.loader import BatchLoader
+from deeplabcut.pose_estimation_tensorflow.datasets.pose_base import BasePoseDataset
+
+
+class _RandomDataset(BasePoseDataset):
+    """Batches of random size and content, as with scale jitter and augmentation."""
+
+    def load_dataset(self):
+        pass
+
+    def next_batch(self):
+        if self.cfg.get("fail"):
+            raise ValueError("Corrupted image")
+        size = np.random.randint(4, 16)
+        return {
+            "inputs": np.random.rand(2, size, size, 3),
+            "targets": np.random.rand(2, size // 2, size // 2, 1),
+            "data_item": ["not an array"],
+        }
+
+
+def _collect(loader, n_batches):
+    return [loader.next_batch() for _ in range(n_batches)]
+
+
+def test_batch_loader_is_reproducible():
+    batches = []
+    for _ in range(2):
+        loader = BatchLoader(_RandomDataset({}), ["inputs", "targets"], 3, seed=42)
+        batches.append(_collect(loader, 10))
+        loader.close()
+    for batch1, batch2 in zip(*batches):
+        assert batch1.keys() == {"inputs", "targets"}
+        assert batch1["inputs"].dtype == np.float32
+        np.testing.assert_array_equal(batch1["inputs"], batch2["inputs"])
+        np.testing.assert_array_equal(batch1["targets"], batch2["targets"])
+    # Workers are seeded differently
+    first = batches[0]
+    assert not np.array_equal(first[0]["inputs"][0, 0], first[1]["inputs"][0, 0])
+    assert loader.n_batches == 10
+
+
+def test_batch_loader_error():
+    loader = BatchLoader(_RandomDataset({"fail": True}), ["inputs"], 2)
+    with pytest.raises(RuntimeError, match="Corrupted image"):
+        loader.next_batch()
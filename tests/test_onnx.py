@@ -0,0 +1,99 @@
+import os
+import numpy as np
+import pytest
+import tensorflow as tf
+import deeplabcut
+from deeplabcut.pose_estimation_tensorflow.config import load_config
+from deeplabcut.pose_estimation_tensorflow.core import predict
+from deeplabcut.pose_estimation_tensorflow.nnets.factory import PoseNetFactory
+
+pytest.importorskip("tf2onnx")
+pytest.importorskip("onnxruntime")
+
+
+def _make_snapshot(tmpdir, multi_animal, positive_backbone=False):
+    cfg = load_config(
+        os.path.join(os.path.dirname(deeplabcut.__file__), "pose_cfg.yaml")
+    )
+    cfg.update(
+        net_type="mobilenet_v2_0.35",
+        num_joints=3,
+        all_joints=[[0], [1], [2]],
+        all_joints_names=["a", "b", "c"],
+        location_refinement=True,
+        batch_size=2,
+    )
+    if multi_animal:
+        cfg.update(
+            dataset_type="multi-animal-imgaug",
+            partaffinityfield_predict=True,
+            partaffinityfield_graph=[[0, 1], [1, 2]],
+            num_limbs=2,
+            num_idchannel=0,
+        )
+    tf.compat.v1.reset_default_graph()
+    inputs = tf.compat.v1.placeholder(tf.float32, shape=[None, None, None, 3])
+    PoseNetFactory.create(cfg).test(inputs)
+    with tf.compat.v1.Session() as sess:
+        sess.run(tf.compat.v1.global_variables_initializer())
+        if positive_backbone:
+            # With weights of random signs, the activations of an untrained network
+            # are noise-like, and quantization errors compound from layer to layer.
+            # Non-negative backbone weights keep them smooth, as in a trained model.
+            for var in tf.compat.v1.trainable_variables("MobilenetV2"):
+                if "weights" in var.op.name:
+                    var.load(np.abs(sess.run(var)), sess)
+        saver = tf.compat.v1.train.Saver()
+        cfg["init_weights"] = saver.save(sess, str(tmpdir.join("snapshot-0")))
+    return cfg
+
+
+@pytest.mark.parametrize("multi_animal", [False, True])
+def test_onnx_parity(tmpdir, sample_image, multi_animal):
+    cfg = _make_snapshot(tmpdir, multi_animal)
+    images = np.stack([sample_image[..., :3]] * 2)
+    if multi_animal:
+        sess, inputs, outputs = predict.setup_pose_prediction(cfg)
+    else:
+        sess, inputs, outputs = predict.setup_GPUpose_prediction(cfg)
+    expected = sess.run(outputs, feed_dict={inputs: images})
+    sess.close()
+
+    sess, inputs, outputs = predict.setup_onnx_pose_prediction(
+        cfg, intra_op_threads=2
+    )
+    assert os.path.isfile(cfg["init_weights"] + ".onnx")
+    results = sess.run(outputs, feed_dict={inputs: images})
+    assert len(results) == len(expected)
+    for result, exp in zip(results, expected):
+        if np.issubdtype(exp.dtype, np.integer):
+            # Peak indices may differ where maxima are (nearly) tied
+            peaks, peaks_exp = set(map(tuple, result)), set(map(tuple, exp))
+            assert len(peaks & peaks_exp) / len(peaks | peaks_exp) > 0.9
+        else:
+            np.testing.assert_allclose(result, exp, rtol=1e-3, atol=1e-3)
+
+
+def test_onnx_int8(tmpdir, sample_image):
+    from skimage import io
+
+    cfg = _make_snapshot(tmpdir, True, positive_backbone=True)
+    cfg["project_path"] = str(tmpdir)
+    folder = tmpdir.mkdir("labeled-data").mkdir("video")
+    io.imsave(str(folder.join("img000.png")), sample_image[..., :3])
+    images = sample_image[np.newaxis, ..., :3]
+
+    sess, inputs, outputs = predict.setup_onnx_pose_prediction(cfg)
+    expected = sess.run(outputs, feed_dict={inputs: images})
+    sess, inputs, outputs = predict.setup_onnx_pose_prediction(
+        cfg, precision="int8"
+    )
+    assert os.path.isfile(cfg["init_weights"] + "_int8.onnx")
+    results = sess.run(outputs, feed_dict={inputs: images})
+    # Score maps, location refinement and part affinity fields (but not the peaks,
+    # whose argmax flips between nearly tied maxima) stay within 5% of the
+    # range of the float32 outputs, and are strongly correlated with them.
+    for result, exp in zip(results[:3], expected[:3]):
+        assert result.shape == exp.shape
+        np.testing.assert_allclose(result, exp, atol=0.05 * np.ptp(exp))
+        assert np.corrcoef(result.ravel(), exp.ravel())[0, 1] > 0.99
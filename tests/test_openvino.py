@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import pytest
+import tensorflow as tf
+from deeplabcut.pose_estimation_tensorflow.core.openvino import session as ov_session
+
+
+class _FakeOutput:
+    def __init__(self, name):
+        self.name = name
+
+    def get_names(self):
+        return {f"{self.name}:0"}
+
+
+class _FakeModel:
+    def __init__(self, xml_path):
+        self.xml_path = xml_path
+        self.inputs = ["input"]
+        self.shapes = []
+
+    def reshape(self, shapes):
+        self.shapes.append(shapes["input"])
+
+
+class _FakeCompiledModel:
+    def __init__(self, output_names):
+        self.outputs = [_FakeOutput(name) for name in output_names]
+
+    def create_infer_request(self):
+        return object()
+
+    def get_property(self, name):
+        return 2
+
+
+class _FakeCore:
+    def __init__(self):
+        self.models = []
+
+    def read_model(self, xml_path):
+        self.models.append(_FakeModel(xml_path))
+        return self.models[-1]
+
+    def set_property(self, device, properties):
+        pass
+
+    def compile_model(self, model, device, config):
+        return _FakeCompiledModel(["scmaps", "peaks"])
+
+
+@pytest.fixture
+def frozen_graph(tmpdir):
+    # Multi-animal graph frozen by a former evaluation, with a custom input name
+    snapshot = str(tmpdir.join("snapshot-100"))
+    graph = tf.Graph()
+    with graph.as_default():
+        inputs = tf.compat.v1.placeholder(tf.float32, [None, None, None, 3], "images")
+        tf.identity(inputs * 2, name="scmaps")
+        tf.identity(inputs + 1, name="peaks")
+    with open(snapshot + "_multianimal.pb", "wb") as file:
+        file.write(graph.as_graph_def().SerializeToString())
+    return snapshot
+
+
+def test_openvino_session_cache(frozen_graph, monkeypatch):
+    conversions = []
+
+    def run(cmd, check):
+        conversions.append(cmd)
+        output_dir = cmd[cmd.index("--output_dir") + 1]
+        model_name = cmd[cmd.index("--model_name") + 1]
+        open(os.path.join(output_dir, model_name + ".xml"), "w").close()
+
+    monkeypatch.setattr(ov_session, "Core", _FakeCore, raising=False)
+    monkeypatch.setattr(
+        ov_session, "AsyncInferQueue", lambda model, n: object(), raising=False
+    )
+    monkeypatch.setattr(ov_session.subprocess, "run", run)
+    cfg = {
+        "init_weights": frozen_graph,
+        "dataset_type": "multi-animal-imgaug",
+        "location_refinement": True,
+        "partaffinityfield_predict": True,
+    }
+    sess = ov_session.OpenVINOSession(cfg, "CPU")
+    assert sess.input_name == "images"
+    assert sess.output_names == ["scmaps", "peaks"]
+
+    sess._init_model(32, 48, batch_size=4)
+    sess._init_model(32, 48, batch_size=4)  # Nothing to do
+    sess._init_model(32, 48, batch_size=8)  # Only reshaped
+    assert len(conversions) == 1
+    assert conversions[0][conversions[0].index("--input_shape") + 1] == "[1, 32, 48, 3]"
+    assert conversions[0][conversions[0].index("--output") + 1] == "scmaps,peaks"
+    model = sess.core.models[0]
+    assert model.xml_path == frozen_graph + "_multianimal_32x48.xml"
+    assert model.shapes == [[4, 32, 48, 3], [8, 32, 48, 3]]
+
+    sess._init_model(64, 48, batch_size=8)  # New resolution
+    assert len(conversions) == 2
+    assert sess.core.models[-1].xml_path == frozen_graph + "_multianimal_64x48.xml"
+
+    # IRs are cached on disk across sessions
+    sess = ov_session.OpenVINOSession(cfg, "CPU")
+    sess._init_model(32, 48, batch_size=2)
+    assert len(conversions) == 2
+    assert sess.core.models[0].shapes == [[2, 32, 48, 3]]
+
+
+def test_openvino_session_stale_graph(frozen_graph, monkeypatch):
+    monkeypatch.setattr(ov_session, "Core", _FakeCore, raising=False)
+    cfg = {"init_weights": frozen_graph, "dataset_type": "imgaug"}
+    # A single animal graph was expected, but the multi-animal one was found
+    os.rename(frozen_graph + "_multianimal.pb", frozen_graph + ".pb")
+    with pytest.raises(ValueError, match=r"snapshot-100\.pb lacks .*concat_1"):
+        ov_session.OpenVINOSession(cfg, "CPU")
+
+    graph = tf.Graph()
+    with graph.as_default():
+        inputs = tf.compat.v1.placeholder(tf.float32, [None, None, None, 3], "images")
+        tf.identity(inputs, name="scmaps")
+    with open(frozen_graph + "_multianimal.pb", "wb") as file:
+        file.write(graph.as_graph_def().SerializeToString())
+    cfg["dataset_type"] = "multi-animal-imgaug"
+    with pytest.raises(ValueError, match="lacks the output\\(s\\) peaks"):
+        ov_session.OpenVINOSession(cfg, "CPU")
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from deeplabcut.refine_training_dataset import outlier_frames
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    t = np.arange(120)
+    X = np.c_[np.sin(t / 10), np.cos(t / 15)] * 20 + rng.normal(size=(120, 2))
+    P = rng.uniform(0.5, 1, size=X.shape)
+    P[30:35, 0] = 0  # Missing data
+    return X, P
+
+
+def test_fit_sarimax_models_pool(series):
+    X, P = series
+    kwargs = dict(pcutoff=0.6, alpha=0.01, ARdegree=3, MAdegree=1)
+    for window in (None, 50):
+        means, CIs = outlier_frames.FitSARIMAXModels(
+            X, P, n_processes=1, window=window, **kwargs
+        )
+        means_pool, CIs_pool = outlier_frames.FitSARIMAXModels(
+            X, P, n_processes=2, window=window, **kwargs
+        )
+        np.testing.assert_array_equal(means, means_pool)
+        np.testing.assert_array_equal(CIs, CIs_pool)
+        assert means.shape == X.shape and CIs.shape == (*X.shape, 2)
+
+
+def test_fit_sarimax_models_windows(series):
+    X, P = series
+    kwargs = dict(pcutoff=0.6, alpha=0.01, ARdegree=3, MAdegree=1)
+    means, CIs = outlier_frames.FitSARIMAXModels(X, P, window=None, **kwargs)
+    # A window spanning the whole series is a single fit
+    means_full, CIs_full = outlier_frames.FitSARIMAXModels(X, P, window=120, **kwargs)
+    np.testing.assert_array_equal(means, means_full)
+    np.testing.assert_array_equal(CIs, CIs_full)
+    for i in range(X.shape[1]):
+        mean, CI = outlier_frames.FitSARIMAXModel(X[:, i], P[:, i], **kwargs)
+        np.testing.assert_array_equal(means[:, i], mean)
+        np.testing.assert_array_equal(CIs[:, i], CI)
+
+    # Windows of 50 frames overlap by 5 frames; the burn-in predictions are dropped
+    means, CIs = outlier_frames.FitSARIMAXModels(X, P, window=50, **kwargs)
+    assert np.isfinite(means).all()
+    for start, first, last in [(0, 0, 50), (50, 45, 100), (100, 95, 120)]:
+        for i in range(X.shape[1]):
+            mean, CI = outlier_frames.FitSARIMAXModel(
+                X[first:last, i], P[first:last, i], **kwargs
+            )
+            np.testing.assert_array_equal(means[start:last, i], mean[start - first :])
+            np.testing.assert_array_equal(CIs[start:last, i], CI[start - first :])
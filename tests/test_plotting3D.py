@@ -0,0 +1,101 @@
+import os
+import shutil
+import cv2
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from deeplabcut.pose_estimation_3d import plotting3D
+from deeplabcut.utils.auxfun_videos import VideoReader
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which(matplotlib.rcParams["animation.ffmpeg_path"]) is None,
+    reason="ffmpeg is not available",
+)
+
+
+def _write_video(filename, n_frames, size=(64, 48)):
+    writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    for i in range(n_frames):
+        writer.write(np.full((size[1], size[0], 3), 10 * i, dtype=np.uint8))
+    writer.release()
+
+
+def _count_frames(filename):
+    reader = VideoReader(filename)
+    n_frames = 0
+    while reader.read_frame() is not None:
+        n_frames += 1
+    reader.close()
+    return n_frames
+
+
+def _render_kwargs(tmpdir, n_frames, n_points):
+    videos = [str(tmpdir.join(f"camera-{i}.avi")) for i in (1, 2)]
+    for video in videos:
+        _write_video(video, n_frames)
+    return dict(
+        videos=videos,
+        colors=matplotlib.cm.viridis(np.linspace(0, 1, n_points)),
+        ind_links=((0, 1), (1, 2)),
+        trailpoints=2,
+        draw_skeleton=True,
+        skeleton_color="k",
+        marker_size=5,
+        alpha=0.5,
+        figsize=(4, 2),
+        xlim=(-1, 1),
+        ylim=(-1, 1),
+        zlim=(-1, 1),
+        view=(-113, -270),
+        fps=30,
+        dpi=50,
+        progress=False,
+    )
+
+
+@requires_ffmpeg
+def test_render_segments(tmpdir):
+    n_frames, n_points = 12, 3
+    kwargs = _render_kwargs(tmpdir, n_frames, n_points)
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 48, (n_frames, n_points, 3))
+    xyz = rng.uniform(-1, 1, (n_frames, n_points, 3))
+    xyz[3, 1] = np.nan
+    # Two segments with their trailing points, as rendered in parallel
+    segments = []
+    for n, (first, last) in enumerate([(0, 5), (6, 11)]):
+        offset = max(first - 2, 0)
+        segments.append(str(tmpdir.join(f"segment{n}.mp4")))
+        plotting3D._render_frames(
+            segments[-1],
+            frames=list(range(first, last + 1)),
+            offset=offset,
+            xy1=xy[offset : last + 1],
+            xy2=xy[offset : last + 1],
+            xyz=xyz[offset : last + 1],
+            **kwargs,
+        )
+    assert [_count_frames(segment) for segment in segments] == [6, 6]
+    output = str(tmpdir.join("video.mp4"))
+    plotting3D._concatenate_videos(segments, output)
+    assert _count_frames(output) == n_frames
+    assert not os.path.exists(str(tmpdir.join("segments.txt")))
+
+
+def test_render_frames_without_ffmpeg(tmpdir, monkeypatch):
+    monkeypatch.setitem(
+        matplotlib.rcParams, "animation.ffmpeg_path", str(tmpdir.join("no_ffmpeg"))
+    )
+    xy = np.zeros((2, 3, 3))
+    with pytest.raises(OSError):
+        plotting3D._render_frames(
+            str(tmpdir.join("video.mp4")),
+            frames=[0, 1],
+            offset=0,
+            xy1=xy,
+            xy2=xy,
+            xyz=xy,
+            **_render_kwargs(tmpdir, 2, 3),
+        )
+    assert not plt.get_fignums()
@@ -4,9 +4,11 @@ import pytest
 from conftest import TEST_DATA_DIR
 from deeplabcut.pose_estimation_tensorflow.datasets import (
     Batch,
-    pose_multianimal_imgaug,
+    MAImgaugPoseDataset,
+    pose_base,
     PoseDatasetFactory,
 )
+from deeplabcut.pose_estimation_tensorflow.datasets.utils import DataItem
 from deeplabcut.utils import read_plainconfig
 
 
@@ -14,7 +16,7 @@ def mock_imread(path, mode):
     return (np.random.rand(400, 400, 3) * 255).astype(np.uint8)
 
 
-pose_multianimal_imgaug.imread = mock_imread
+pose_base.imread = mock_imread
 
 
 @pytest.fixture()
@@ -92,3 +94,67 @@ def test_get_targetmaps(ma_dataset, num_idchannel):
 def test_batching(ma_dataset):
     for _ in range(10):
         batch = ma_dataset.next_batch()
+
+
+@pytest.mark.parametrize("weigh_only_present_joints", [False, True])
+def test_compute_target_part_scoremap(weigh_only_present_joints):
+    cfg = {
+        "stride": 8.0,
+        "pos_dist_thresh": 17,
+        "num_joints": 3,
+        "num_idchannel": 2,
+        "locref_stdev": 7.2801,
+        "num_limbs": 2,
+        "partaffinityfield_graph": [[0, 1], [1, 2]],
+        "pafwidth": 20,
+        "weigh_only_present_joints": weigh_only_present_joints,
+    }
+    dataset = object.__new__(MAImgaugPoseDataset)
+    dataset.cfg = cfg
+    # The second animal misses its last bodypart, and its first one overlaps
+    # with the first animal's.
+    joint_id = [np.array([0, 1, 2]), np.array([0, 1])]
+    coords = np.array([[100, 100], [200, 100], [200, 250], [104, 100], [100, 300]])
+    data_item = DataItem()
+    data_item.joints = {0: None, 1: None}
+    size = 40, 40
+    scale = 0.8
+    (
+        scmap,
+        weights,
+        locref_map,
+        locref_mask,
+        paf_map,
+        paf_mask,
+    ) = dataset.compute_target_part_scoremap_numpy(
+        joint_id, coords, data_item, size, scale
+    )
+    assert scmap.dtype == paf_map.dtype == np.float32
+
+    # Reference computation over the whole grid
+    y, x = np.mgrid[:40, :40] * 8.0 + 4
+    near = [(x - cx) ** 2 + (y - cy) ** 2 <= (17 * scale) ** 2 for cx, cy in coords]
+    np.testing.assert_equal(scmap[..., 0], near[0] | near[3])
+    np.testing.assert_equal(scmap[..., 3], near[0] | near[1] | near[2])
+    np.testing.assert_equal(scmap[..., 4], near[3] | near[4])
+    # The last animal wins where both have the same bodypart
+    np.testing.assert_allclose(
+        locref_map[near[3], 0], (104 - x[near[3]]) / 7.2801, rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        locref_map[near[0] & ~near[3], 0], (100 - x[near[0] & ~near[3]]) / 7.2801
+    )
+
+    # Second limb of the first animal, from (200, 100) to (200, 250)
+    in_field = (y >= 100) & (y <= 250) & (np.abs(x - 200) * scale / 20 <= 1)
+    np.testing.assert_equal(paf_map[..., 3] > 0, in_field)
+    np.testing.assert_allclose(
+        paf_map[in_field, 3], 1 - np.abs(x[in_field] - 200) * scale / 20, rtol=1e-6
+    )
+    np.testing.assert_equal(paf_map[..., 2], 0)
+    if weigh_only_present_joints:
+        np.testing.assert_equal(paf_mask[..., 3], in_field)
+        np.testing.assert_equal(locref_mask[..., 2], scmap[..., 1])
+        np.testing.assert_equal(weights[..., :3], 1)
+    else:
+        np.testing.assert_equal(paf_mask, 1)
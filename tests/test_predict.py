@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from deeplabcut.pose_estimation_tensorflow.core import predict
+
+
+def _loop_pose_predict(scmap, locref, stride, num_outputs):
+    Y, X = predict.get_top_values(scmap, num_outputs)
+    batchsize, _, _, num_joints = scmap.shape
+    pose = np.empty((batchsize, num_joints, num_outputs, 3))
+    for m in range(num_outputs):
+        for l in range(batchsize):
+            for k in range(num_joints):
+                x, y = X[m, l, k], Y[m, l, k]
+                pose[l, k, m, :2] = (
+                    np.array([x, y]) * stride + 0.5 * stride + locref[l, y, x, k]
+                )
+                pose[l, k, m, 2] = scmap[l, y, x, k]
+    return pose.reshape((batchsize, -1))
+
+
+@pytest.mark.parametrize("num_outputs", [1, 3])
+def test_batched_pose_predict(num_outputs):
+    rng = np.random.default_rng(42)
+    scmap = rng.random((4, 20, 30, 6))
+    locref = rng.normal(size=(4, 20, 30, 6, 2))
+    pose = predict.batched_pose_predict(scmap, locref, 8, num_outputs)
+    assert pose.shape == (4, 6 * num_outputs * 3)
+    np.testing.assert_allclose(
+        pose, _loop_pose_predict(scmap, locref, 8, num_outputs)
+    )
+    # Peaks are sorted by decreasing confidence
+    conf = pose[:, 2::3].reshape((4, 6, num_outputs))
+    assert np.all(np.diff(conf, axis=2) <= 0)
+
+
+def test_multi_pose_predict():
+    rng = np.random.default_rng(42)
+    scmap = rng.random((20, 30, 6))
+    locref = rng.normal(size=(20, 30, 6, 2))
+    pose = predict.multi_pose_predict(scmap, locref, 8, 2)
+    assert pose.shape == (6, 6)
+    np.testing.assert_allclose(
+        pose.ravel(),
+        _loop_pose_predict(scmap[None], locref[None], 8, 2).ravel(),
+        rtol=1e-6,
+    )
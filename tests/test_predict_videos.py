@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+from deeplabcut.pose_estimation_tensorflow import predict_videos
+
+
+class _FakeCapture:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.frames:
+            frame = self.frames.pop(0)
+            return frame is not None, frame
+        return False, None
+
+    def get(self, prop):
+        height, width = 32, 48
+        return {cv2.CAP_PROP_FRAME_HEIGHT: height, cv2.CAP_PROP_FRAME_WIDTH: width}.get(
+            prop, 0
+        )
+
+    def release(self):
+        pass
+
+
+class _FakeSession:
+    """Return a single body part, whose coordinates encode the frame brightness."""
+
+    def __init__(self):
+        self.n_inferred = 0
+
+    def run(self, tensor, feed_dict):
+        frames = next(iter(feed_dict.values()))
+        self.n_inferred += len(frames)
+        brightness = frames.mean(axis=(1, 2, 3))
+        return np.c_[brightness, brightness, np.ones_like(brightness)]
+
+
+def _make_frames(brightness):
+    return [np.full((32, 48, 3), b, dtype=np.uint8) for b in brightness]
+
+
+def test_motion_gate():
+    gate = predict_videos.MotionGate(threshold=2, audit_interval=3)
+    frames = _make_frames([10, 10, 11, 10, 10, 10, 50, 50])
+    skipped = [gate.skip(frame, i) for i, frame in enumerate(frames)]
+    # Every 3rd static frame is audited, and motion triggers a new reference
+    assert skipped == [False, True, True, False, True, True, False, False]
+    assert gate.sources == {1: 0, 2: 0, 4: 0, 5: 0}
+    assert gate.audits == {3: 0, 7: 6}
+
+    data = np.arange(8 * 3, dtype=float).reshape((8, 3))
+    mask = gate.fill(data)
+    np.testing.assert_array_equal(mask, skipped)
+    np.testing.assert_array_equal(data[[1, 2, 4, 5]], data[[0] * 4])
+    np.testing.assert_allclose(gate.estimated_error(data), 6 * np.sqrt(2))
+
+
+def test_getposef_gtf_motion_gating():
+    cfg = {"cropping": False}
+    dlc_cfg = {"all_joints_names": ["a"]}
+    brightness = [10] * 5 + [100] * 5 + [200]
+    nframes = len(brightness)
+    sess = _FakeSession()
+    gate = predict_videos.MotionGate(threshold=1)
+    data, _ = predict_videos.GetPoseF_GTF(
+        cfg, dlc_cfg, sess, None, [None], _FakeCapture(_make_frames(brightness)),
+        nframes, 2, gate,
+    )
+    assert sess.n_inferred == 4  # Three analyzed frames, padded to full batches
+    mask, stats = gate.report(data)
+    assert mask.sum() == 8
+    assert stats["skip_rate"] == 8 / nframes
+    np.testing.assert_allclose(data[:, 0], brightness)
+
+
+def test_prefetching_capture():
+    cfg = {"cropping": False}
+    dlc_cfg = {"all_joints_names": ["a"]}
+    brightness = list(range(10, 200, 10))
+    nframes = len(brightness)
+    frames = _make_frames(brightness)
+    frames[5] = None  # A frame that cannot be decoded
+    data = []
+    for prefetch in (False, True):
+        cap = _FakeCapture(frames)
+        if prefetch:
+            cap = predict_videos.PrefetchingCapture(cap, nframes, buffer_size=2)
+        data.append(
+            predict_videos.GetPoseF_GTF(
+                cfg, dlc_cfg, _FakeSession(), None, [None], cap, nframes, 4
+            )[0]
+        )
+        if prefetch:
+            assert cap.read() == (False, None)
+            cap.release()
+    np.testing.assert_array_equal(data[0], data[1])
+    assert data[1][5, 2] == 0
+    np.testing.assert_allclose(data[1][6:, 0], brightness[6:])
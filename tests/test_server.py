@@ -0,0 +1,113 @@
+import os
+import threading
+from multiprocessing import AuthenticationError
+import numpy as np
+import pytest
+import tensorflow as tf
+import deeplabcut
+from deeplabcut.pose_estimation_tensorflow import server
+from deeplabcut.pose_estimation_tensorflow.config import load_config
+from deeplabcut.pose_estimation_tensorflow.nnets.factory import PoseNetFactory
+
+
+class _FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_cache_lru():
+    cache = server.SessionCache(capacity=2)
+    sessions = {key: (_FakeSession(), None, None) for key in "abc"}
+    cache.get("a", lambda: sessions["a"])
+    cache.get("b", lambda: sessions["b"])
+    assert cache.get("a", lambda: None) is sessions["a"]
+    cache.get("c", lambda: sessions["c"])  # Evicts b, the least recently used
+    assert cache.keys() == ["a", "c"]
+    assert sessions["b"][0].closed
+    assert not sessions["a"][0].closed
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.clear()
+    assert len(cache) == 0
+    assert sessions["a"][0].closed and sessions["c"][0].closed
+    with pytest.raises(ValueError):
+        server.SessionCache(capacity=0)
+
+
+@pytest.fixture
+def running_server(tmpdir):
+    model_server = server.ModelServer(str(tmpdir.join("dlc.sock")), capacity=1)
+    address = model_server.start()
+    thread = threading.Thread(target=model_server.serve_forever, daemon=True)
+    thread.start()
+    yield model_server, server.ModelClient(address)
+    model_server.close()
+
+
+def test_server_commands(running_server):
+    model_server, client = running_server
+    assert client.ping()
+    assert client.status()["models"] == []
+    with pytest.raises(RuntimeError, match="Unknown command"):
+        client.request("train_network")
+    client.shutdown()
+    model_server._stopped.wait(5)
+    assert model_server._stopped.is_set()
+
+
+def test_server_socket_permissions(running_server):
+    model_server, client = running_server
+    assert os.stat(model_server.address).st_mode & 0o777 == 0o600
+
+
+def test_server_tcp_requires_authkey():
+    with pytest.raises(ValueError, match="authkey"):
+        server.ModelServer(("localhost", 0))
+    with pytest.raises(ValueError, match="authkey"):
+        server.ModelClient(("localhost", 6000))
+    model_server = server.ModelServer(("localhost", 0), authkey="secret")
+    address = model_server.start()
+    thread = threading.Thread(target=model_server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert server.ModelClient(address, authkey="secret").ping()
+        with pytest.raises(AuthenticationError):
+            server.ModelClient(address, authkey="wrong").ping()
+    finally:
+        model_server.close()
+
+
+def test_server_predict_frames(tmpdir, running_server, monkeypatch):
+    # A randomly initialized network stands in for a trained project
+    cfg = load_config(
+        os.path.join(os.path.dirname(deeplabcut.__file__), "pose_cfg.yaml")
+    )
+    cfg.update(
+        net_type="mobilenet_v2_0.35",
+        num_joints=2,
+        all_joints=[[0], [1]],
+        all_joints_names=["a", "b"],
+        location_refinement=True,
+        batch_size=None,
+    )
+    tf.compat.v1.reset_default_graph()
+    inputs = tf.compat.v1.placeholder(tf.float32, shape=[None, None, None, 3])
+    PoseNetFactory.create(cfg).test(inputs)
+    with tf.compat.v1.Session() as sess:
+        sess.run(tf.compat.v1.global_variables_initializer())
+        saver = tf.compat.v1.train.Saver()
+        cfg["init_weights"] = saver.save(sess, str(tmpdir.join("snapshot-0")))
+    monkeypatch.setattr(server, "load_pose_config", lambda *args: cfg)
+
+    model_server, client = running_server
+    frames = np.random.randint(0, 255, size=(3, 64, 96, 3), dtype=np.uint8)
+    poses = client.predict_frames("config.yaml", frames)
+    assert poses.shape == (3, 6)
+    np.testing.assert_allclose(
+        client.predict_frames("config.yaml", frames), poses, rtol=1e-5
+    )
+    status = client.status()
+    assert len(status["models"]) == 1
+    assert (status["hits"], status["misses"]) == (1, 1)
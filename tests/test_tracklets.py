@@ -0,0 +1,42 @@
+import numpy as np
+from deeplabcut.refine_training_dataset.tracklets import TrackletManager
+from deeplabcut.utils import auxiliaryfunctions
+
+
+def test_find_swapping_bodypart_pairs(tmpdir):
+    config = str(tmpdir.join("config.yaml"))
+    auxiliaryfunctions.write_plainconfig(config, {"individuals": ["a", "b"]})
+    manager = TrackletManager(config, min_swap_len=1)
+    rng = np.random.default_rng(0)
+    manager.nframes = 500
+    manager.xy = rng.integers(0, 3, (6, manager.nframes, 2)).astype(float)
+    manager.xy[rng.random(manager.xy.shape[:2]) < 0.2] = np.nan
+    manager.xy[0, :300] = np.nan
+    manager.xy[1, 200:] = np.nan
+    manager.tracklet2id = [0, 0, 0, 1, 1, 1]
+    manager.find_swapping_bodypart_pairs()
+
+    # Frames at which both coordinates of two tracklets cross each other
+    def swaps(i, j):
+        diff = manager.xy[i] - manager.xy[j]
+        valid = ~np.isnan(diff).any(axis=1)
+        crossed = (np.diff(diff > 0, axis=0) != 0).all(axis=1)
+        return np.flatnonzero(crossed & valid[1:] & valid[:-1])
+
+    expected = [
+        (i, j)
+        for i in range(6)
+        for j in range(i)
+        if manager.tracklet2id[i] != manager.tracklet2id[j] and len(swaps(i, j)) > 1
+    ]
+    assert expected and manager.swapping_pairs == expected
+    assert manager.swapping_bodyparts == np.unique(expected).tolist()
+    for i in range(6):
+        for j in range(i):
+            np.testing.assert_equal(manager.get_swap_indices(i, j), swaps(i, j))
+            np.testing.assert_equal(manager.get_swap_indices(j, i), swaps(i, j))
+    assert not manager.get_swap_indices(1, 0).size
+
+    inds = manager.get_swap_indices(4, 2)
+    manager.invert_swaps(2, 4, [inds[0], 499])
+    np.testing.assert_equal(manager.get_swap_indices(4, 2), [*inds[1:], 499])
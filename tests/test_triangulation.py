@@ -1,7 +1,9 @@
+import cv2
 import numpy as np
 import pandas as pd
 import pytest
 from deeplabcut.pose_estimation_3d import triangulation
+from deeplabcut.utils import auxiliaryfunctions, auxiliaryfunctions_3d
 
 
 @pytest.fixture(scope="session")
@@ -44,3 +46,208 @@ def test_undistort_views(n_view_pairs, is_multi, stereo_params):
     assert len(dfs) == n_view_pairs
     assert all(len(pair) == 2 for pair in dfs)
     assert len(dfs[0][0].columns.levels) == (4 if is_multi else 3)
+
+
+def _camera(rvec, tvec, f=800):
+    K = np.array([[f, 0, 320], [0, f, 240], [0, 0, 1.0]])
+    return K, cv2.Rodrigues(np.asarray(rvec, dtype=float))[0], np.asarray(tvec, float)
+
+
+def _project(K, R, t, points_3d):
+    points = (points_3d @ R.T + t) @ K.T
+    return points[..., :2] / points[..., 2:]
+
+
+@pytest.fixture(scope="module")
+def rig():
+    rng = np.random.default_rng(0)
+    cameras = [_camera([0, 0, 0], [0, 0, 0])] + [
+        _camera(rng.normal(0, 0.2, 3), rng.normal(0, 0.5, 3)) for _ in range(3)
+    ]
+    points_3d = rng.normal(0, 1, (50, 3)) + [0, 0, 10]
+    return cameras, points_3d
+
+
+def test_triangulate_views(rig):
+    cameras, points_3d = rig
+    P = np.stack([K @ np.c_[R, t] for K, R, t in cameras])
+    points = np.stack([_project(K, R, t, points_3d) for K, R, t in cameras])
+    rng = np.random.default_rng(1)
+    noisy = points + rng.normal(0, 0.5, points.shape)
+
+    # Same as OpenCV for a camera pair
+    X = cv2.triangulatePoints(P[0], P[1], noisy[0].T, noisy[1].T)
+    np.testing.assert_allclose(
+        auxiliaryfunctions_3d.triangulate_views(P[:2], noisy[:2]),
+        (X[:3] / X[3]).T,
+        atol=1e-8,
+    )
+
+    points_3d_ = auxiliaryfunctions_3d.triangulate_views(
+        P, points.reshape((4, 5, 10, 2))
+    )
+    assert points_3d_.shape == (5, 10, 3)
+    np.testing.assert_allclose(points_3d_.reshape((-1, 3)), points_3d, atol=1e-6)
+    errors = auxiliaryfunctions_3d.reprojection_errors(
+        P, points_3d_, points.reshape((4, 5, 10, 2))
+    )
+    assert errors.shape == (4, 5, 10)
+    np.testing.assert_allclose(errors, 0, atol=1e-6)
+
+    # A view off by a lot has little influence if its weight is small
+    noisy[3] += 20
+    weights = np.ones(noisy.shape[:2])
+    weights[3] = 0.01
+    weighted = auxiliaryfunctions_3d.triangulate_views(P, noisy, weights)
+    unweighted = auxiliaryfunctions_3d.triangulate_views(P, noisy)
+    assert np.linalg.norm(weighted - points_3d, axis=1).mean() < np.linalg.norm(
+        unweighted - points_3d, axis=1
+    ).mean()
+
+    # Points seen from less than two views cannot be triangulated
+    points[1:, 0] = np.nan
+    points[2:, 1] = np.nan
+    points_3d_ = auxiliaryfunctions_3d.triangulate_views(P, points)
+    assert np.isnan(points_3d_[0]).all()
+    np.testing.assert_allclose(points_3d_[1:], points_3d[1:], atol=1e-6)
+
+
+def test_undistort_views_points(tmpdir, rig):
+    cameras, points_3d = rig
+    (K1, _, _), others = cameras[0], cameras[1:]
+    stereo_params = {}
+    for i, (K, R, t) in enumerate(others, start=2):
+        dist = np.zeros((1, 5))
+        R1, R2, P1, P2, *_ = cv2.stereoRectify(K1, dist, K, dist, (640, 480), R, t)
+        stereo_params[f"camera-1-camera-{i}"] = {
+            "cameraMatrix1": K1,
+            "cameraMatrix2": K,
+            "distCoeffs1": dist,
+            "distCoeffs2": dist,
+            "R": R,
+            "T": t.reshape((3, 1)),
+            "F": np.eye(3),
+            "R1": R1,
+            "R2": R2,
+            "P1": P1,
+            "P2": P2,
+        }
+    tmpdir.mkdir("camera_matrix")
+    auxiliaryfunctions.write_pickle(
+        str(tmpdir.join("camera_matrix", "stereo_params.pickle")), stereo_params
+    )
+    config = str(tmpdir.join("config.yaml"))
+    auxiliaryfunctions.write_plainconfig(config, {"project_path": str(tmpdir)})
+
+    cam_names = [f"camera-{i}" for i in range(1, 5)]
+    columns = pd.MultiIndex.from_product(
+        [["DLC"], [f"bp{i}" for i in range(len(points_3d))], ["x", "y", "likelihood"]],
+        names=["scorer", "bodyparts", "coords"],
+    )
+    filenames = []
+    for cam, (K, R, t) in zip(cam_names, cameras):
+        points = _project(K, R, t, points_3d)
+        data = np.c_[points, np.ones(len(points))].reshape((1, -1))
+        filename = str(tmpdir.join(f"{cam}.h5"))
+        pd.DataFrame(data, columns=columns).to_hdf(filename, "df_with_missing")
+        filenames.append(filename)
+
+    dfs, P, stereo_file, _ = triangulation.undistort_views_points(
+        config, filenames, cam_names
+    )
+    assert len(dfs) == 4 and P.shape == (4, 3, 4)
+    points = np.stack([df.to_numpy().reshape((-1, 3))[:, :2] for df in dfs])
+    # 3D points are in the rectified frame of the first camera pair
+    expected = points_3d @ stereo_file["camera-1-camera-2"]["R1"].T
+    for views in ([0, 1], [0, 2, 3], [0, 1, 2, 3]):
+        np.testing.assert_allclose(
+            auxiliaryfunctions_3d.triangulate_views(P[views], points[views]),
+            expected,
+            atol=1e-4,
+        )
+
+
+def test_cross_view_match():
+    rng = np.random.default_rng(0)
+    K = np.array([[800, 0, 320], [0, 800, 240], [0, 0, 1]], dtype=float)
+    R, t = cv2.Rodrigues(np.array([0, 0.4, 0]))[0], np.array([-2, 0.3, 0.5])
+    tx = np.array([[0, -t[2], t[1]], [t[2], 0, -t[0]], [-t[1], t[0], 0]])
+    # Matched points satisfy x1 F x2 = 0
+    F = (np.linalg.inv(K).T @ tx @ R @ np.linalg.inv(K)).T
+    n_frames, n_individuals, n_bodyparts = 200, 3, 5
+    centers = rng.uniform(-2, 2, (1, n_individuals, 1, 3)) + [0, 0, 20]
+    points_3d = centers + rng.normal(0, 0.3, (n_frames, n_individuals, n_bodyparts, 3))
+    points1 = _project(K, np.eye(3), np.zeros(3), points_3d)
+    points2 = _project(K, R, t, points_3d)[:, [2, 0, 1]]
+    points2[100:] = points2[100:, [1, 0, 2]]  # Identity swap in the second view
+    for points in (points1, points2):
+        points[rng.random(points.shape[:3]) < 0.3] = np.nan
+
+    costs = auxiliaryfunctions_3d.epipolar_costs(points1, points2, F, window=100)
+    assert costs.shape == (2, n_individuals, n_individuals)
+    np.testing.assert_allclose(costs[0, [0, 1, 2], [1, 2, 0]], 0, atol=1e-10)
+    matches = auxiliaryfunctions_3d.cross_view_match(
+        points1, points2, F, window=50, chunk_size=30
+    )
+    assert matches.shape == (n_frames, n_individuals)
+    assert (matches[:100] == [1, 2, 0]).all()
+    assert (matches[100:] == [0, 2, 1]).all()
+    # Frame by frame, individuals with too few body parts detected may be mismatched
+    matches = auxiliaryfunctions_3d.cross_view_match(points1, points2, F, window=1)
+    assert (matches[:100] == [1, 2, 0]).all(axis=1).mean() > 0.9
+
+
+def test_triangulate_filters_every_view_with_its_model(tmpdir, monkeypatch):
+    from deeplabcut.pose_estimation_tensorflow import predict_videos
+    from deeplabcut.post_processing import filtering
+
+    cam_names = ["camera-1", "camera-2"]
+    configs = {
+        "config.yaml": {
+            "camera_names": cam_names,
+            "pcutoff": 0.4,
+            "scorername_3d": "DLC_3D",
+        }
+    }
+    for cam, shuffle in zip(cam_names, (1, 3)):
+        config_2d = str(tmpdir.join(f"config_{cam}.yaml"))
+        open(config_2d, "w").close()
+        configs[config_2d] = {"TrainingFraction": [0.8, 0.95]}
+        configs["config.yaml"].update(
+            {
+                f"config_file_{cam}": config_2d,
+                f"shuffle_{cam}": shuffle,
+                f"trainingsetindex_{cam}": shuffle // 3,
+            }
+        )
+    monkeypatch.setattr(auxiliaryfunctions, "read_config", configs.__getitem__)
+
+    def analyze_videos(config, videos, shuffle, trainingsetindex, **kwargs):
+        return f"DLC_shuffle{shuffle}"
+
+    filtered = []
+
+    def filterpredictions(config, video, shuffle, trainingsetindex, **kwargs):
+        filtered.append((config, video, shuffle, trainingsetindex))
+
+    class Undistorted(Exception):
+        pass
+
+    def undistort_views_points(config, dataname, cam_names):
+        raise Undistorted(dataname)
+
+    monkeypatch.setattr(predict_videos, "analyze_videos", analyze_videos)
+    monkeypatch.setattr(filtering, "filterpredictions", filterpredictions)
+    monkeypatch.setattr(triangulation, "undistort_views_points", undistort_views_points)
+
+    videos = [str(tmpdir.join(f"vid-{cam}.avi")) for cam in cam_names]
+    with pytest.raises(Undistorted) as e:
+        triangulation.triangulate("config.yaml", [videos], destfolder=str(tmpdir))
+    assert filtered == [
+        (configs["config.yaml"]["config_file_camera-1"], videos[0], 1, 0),
+        (configs["config.yaml"]["config_file_camera-2"], videos[1], 3, 1),
+    ]
+    assert e.value.args[0] == [
+        str(tmpdir.join(f"vid-{cam}DLC_shuffle{shuffle}_filtered.h5"))
+        for cam, shuffle in zip(cam_names, (1, 3))
+    ]
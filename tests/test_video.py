@@ -1,7 +1,8 @@
+import numpy as np
 import os
 import pytest
 from conftest import TEST_DATA_DIR
-from deeplabcut.utils.auxfun_videos import VideoWriter
+from deeplabcut.utils.auxfun_videos import FrameCache, VideoWriter
 
 
 POS_FRAMES = 1  # Equivalent to cv2.CAP_PROP_POS_FRAMES
@@ -73,6 +74,35 @@ def test_reader_read_frame(video_clip, shrink, crop):
     assert width == video_clip.width // shrink
 
 
+@pytest.mark.parametrize("max_gap", [0, 5, None])
+def test_reader_read_frames(video_clip, max_gap):
+    inds = [100, 3, 50, 3, 51, 255]
+    frames = list(video_clip.read_frames(inds, max_gap=max_gap))
+    assert len(frames) == len(inds)
+    for ind, frame in zip(inds, frames):
+        video_clip.set_to_frame(ind)
+        np.testing.assert_equal(frame, video_clip.read_frame())
+
+
+def test_frame_cache(video_clip):
+    cache = FrameCache(
+        video_clip.video_path, n_ahead=4, n_behind=2, max_frames=8, proxy_shrink=2
+    )
+    for ind in [0, 1, 100, 99, 98, 3, 255]:
+        video_clip.set_to_frame(ind)
+        frame = video_clip.read_frame()
+        np.testing.assert_equal(cache.read(ind), frame)
+        assert ind in cache and len(cache._frames) <= 8
+        assert cache._proxies[ind].shape == (
+            frame.shape[0] // 2,
+            frame.shape[1] // 2,
+            3,
+        )
+    assert cache.read(len(video_clip)) is None
+    cache.close()
+    assert not cache._thread.is_alive()
+
+
 def test_writer_bbox(video_clip):
     bbox = 0, 100, 0, 100
     video_clip.set_bbox(*bbox)